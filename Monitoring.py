@@ -1,9 +1,24 @@
 import pandas as pd
 import datetime
+import os
 import json
-from evidently.report import Report
-from evidently.metric_preset import DataDriftPreset, TargetDriftPreset
-from evidently import ColumnMapping
+from stage_scheduler import Stage, run_stages
+from result_store import append_results
+from sampling import sample_for_drift, annotate_report
+from instrumentation import measure, write_metrics
+
+# Evidently takes seconds to import, so it is imported by the report functions that use it;
+# importing this module (e.g. from the monitor.py CLI) stays fast.
+
+# When to render the (large) HTML reports:
+#   'always'   - every run, as before;
+#   'on_drift' - only when the report detects drift;
+#   'never'    - metrics only;
+#   'summary'  - metrics plus one small summary_report.html built from binned aggregates
+#                (see report_renderer.py) instead of the Evidently HTML.
+# When the HTML is skipped, the report's metric state is saved as an Evidently snapshot
+# (<name>.snapshot.json) so the HTML can be rendered later with render_report_html.
+HTML_MODES = ('always', 'on_drift', 'never', 'summary')
 
 # Function to get metadata
 def get_metadata(event_type, source_system, user, model_version, reference, current):
@@ -20,44 +35,109 @@ def get_metadata(event_type, source_system, user, model_version, reference, curr
     return metadata
 
 # Function to calculate statistical summary for numerical features
-def calculate_statistics(numerical_features, reference, current):
+def calculate_statistics(numerical_features, reference, current, reference_profile=None):
     statistics = {}
+    reference_moments = reference_profile["moments"] if reference_profile else {}
     for feature in numerical_features:
+        # Reuse the precomputed reference moments instead of rescanning the reference data
+        if feature in reference_moments:
+            moments = reference_moments[feature]
+        else:
+            reference_column = reference[feature].astype('float64')
+            moments = {
+                'mean': float(reference_column.mean()),
+                'std': float(reference_column.std()),
+                'var': float(reference_column.var())
+            }
+        # Reduce in float64 whatever the column dtype (e.g. compact float32)
+        current_column = current[feature].astype('float64')
         stats = {
-            'mean_reference': reference[feature].mean(),
-            'std_reference': reference[feature].std(),
-            'var_reference': reference[feature].var(),
-            'mean_current': current[feature].mean(),
-            'std_current': current[feature].std(),
-            'var_current': current[feature].var()
+            'mean_reference': moments['mean'],
+            'std_reference': moments['std'],
+            'var_reference': moments['var'],
+            'mean_current': float(current_column.mean()),
+            'std_current': float(current_column.std()),
+            'var_current': float(current_column.var())
         }
         statistics[feature] = stats
     
     return statistics
 
+# Function to compute drift and statistics per segment (segmented_drift loads SciPy, so it is imported here)
+def calculate_segmented_drift(reference, current, segments, numerical_features, categorical_features,
+                              reference_profile=None):
+    from segmented_drift import segmented_drift, segmented_drift_records
+
+    return segmented_drift_records(segmented_drift(reference, current, segments, numerical_features,
+                                                   categorical_features, reference_profile=reference_profile))
+
+# Function to check whether any metric of a report dictionary detected drift
+def report_has_drift(report_results):
+    for metric in report_results.get('metrics', []):
+        result = metric.get('result', {})
+        if result.get('dataset_drift') or result.get('drift_detected'):
+            return True
+    return False
+
+# Function to write a report as HTML or, when the HTML is not needed now, as a snapshot
+def save_report(report, report_results, output_dir, name, html_mode='always'):
+    if html_mode not in HTML_MODES:
+        raise ValueError(f"Unknown html_mode '{html_mode}', expected one of {HTML_MODES}")
+
+    if html_mode == 'always' or (html_mode == 'on_drift' and report_has_drift(report_results)):
+        report.save_html(os.path.join(output_dir, f'{name}.html'))
+    else:
+        report.save(os.path.join(output_dir, f'{name}.snapshot.json'))
+
+# Function to list the numerical columns plotted in the summary report
+def summary_features(reference, current, column_mapping):
+    columns = list(column_mapping.numerical_features or [])
+    for column in (column_mapping.target, column_mapping.prediction):
+        if isinstance(column, str) and column in reference and column in current and column not in columns \
+                and pd.api.types.is_numeric_dtype(reference[column]):
+            columns.append(column)
+    return columns
+
+# Function to render the HTML of a report saved as a snapshot
+def render_report_html(snapshot_path, html_path=None):
+    from evidently.report import Report
+
+    if html_path is None:
+        html_path = snapshot_path.replace('.snapshot.json', '.html')
+    Report.load(snapshot_path).save_html(html_path)
+    return html_path
+
 # Function to generate a data drift report
-def generate_data_drift_report(reference, current, column_mapping):
+def generate_data_drift_report(reference, current, column_mapping, output_dir='.', html_mode='always'):
+    from evidently.report import Report
+    from evidently.metric_preset import DataDriftPreset
+
     data_drift_report = Report(metrics=[DataDriftPreset()])
     data_drift_report.run(reference_data=reference, current_data=current, column_mapping=column_mapping)
-    data_drift_report.save_html('data_drift_report.html')
-    return data_drift_report.as_dict()
+    data_drift_results = data_drift_report.as_dict()
+    save_report(data_drift_report, data_drift_results, output_dir, 'data_drift_report', html_mode)
+    return data_drift_results
 
 # Function to generate target drift report
-def generate_target_drift_report(reference, current, column_mapping):
+def generate_target_drift_report(reference, current, column_mapping, output_dir='.', html_mode='always'):
+    from evidently.report import Report
+    from evidently.metric_preset import TargetDriftPreset
+
     target_drift_report = Report(metrics=[TargetDriftPreset()])
     target_drift_report.run(reference_data=reference, current_data=current, column_mapping=column_mapping)
-    target_drift_report.save_html('target_drift_report.html')
-    return target_drift_report.as_dict()
+    target_drift_results = target_drift_report.as_dict()
+    save_report(target_drift_report, target_drift_results, output_dir, 'target_drift_report', html_mode)
+    return target_drift_results
 
 # Function to save results as JSON and Excel files
-def save_results_as_files(final_results):
+def save_results_as_files(final_results, output_dir='.'):
     # Save as JSON file
-    with open('monitoring_results.json', 'w') as json_file:
+    with open(os.path.join(output_dir, 'monitoring_results.json'), 'w') as json_file:
         json.dump(final_results, json_file, indent=4)
 
     # Prepare data for Excel export
     # Flatten metadata, data drift, and target drift for easier export to Excel
-    metadata_df = pd.DataFrame([final_results['metadata']])
+    metadata_df = pd.json_normalize(final_results['metadata'])
 
     # Flatten data drift metrics and target drift metrics (if needed, adjust the structure)
     data_drift_df = pd.json_normalize(final_results['data_drift_metrics'])
@@ -65,16 +145,56 @@ def save_results_as_files(final_results):
 
     # Convert statistical summary to DataFrame
     statistics_df = pd.DataFrame(final_results['statistical_summary']).T
+    segmented = final_results.get('segmented_drift_metrics')
+    screening = final_results.get('screening')
 
     # Create a writer to save multiple DataFrames to different sheets in Excel
-    with pd.ExcelWriter('monitoring_results.xlsx') as writer:
+    with pd.ExcelWriter(os.path.join(output_dir, 'monitoring_results.xlsx')) as writer:
         metadata_df.to_excel(writer, sheet_name='Metadata', index=False)
         data_drift_df.to_excel(writer, sheet_name='Data Drift Metrics', index=False)
         target_drift_df.to_excel(writer, sheet_name='Target Drift Metrics', index=False)
         statistics_df.to_excel(writer, sheet_name='Statistical Summary', index=True)
+        if segmented:
+            pd.DataFrame(segmented['numerical']).to_excel(writer, sheet_name='Segmented Drift', index=False)
+            pd.DataFrame(segmented['categorical']).to_excel(writer, sheet_name='Segmented New Classes', index=False)
+        if screening:
+            screening_df = pd.DataFrame({**screening['candidates'], **screening['skipped']}).T
+            screening_df.to_excel(writer, sheet_name='Screening', index=True)
 
 # Main function to execute and collect metadata, drift reports, and statistics
-def monitor_model_data(reference, current, column_mapping, source_system, user, model_version):
+def monitor_model_data(reference, current, column_mapping, source_system, user, model_version,
+                       reference_profile=None, executor='sequential', max_workers=None, output_dir='.',
+                       html_mode='always', result_store=None, sampling=None, load_timing=None, metrics_file=None,
+                       segments=None, tiered=None, summary_byte_budget=None):
+    """Run the monitoring stages and save the results.
+
+    sampling (opt-in) runs the drift reports on samples of the reference and current data,
+    e.g. {"method": "reservoir", "error_bound": 0.01, "confidence": 0.95, "seed": 42} or
+    {"method": "stratified", "strata": ["season"]}; see sampling.py. The statistics stay exact.
+
+    segments (opt-in) lists segment columns, e.g. ["season", "workingday"]: drift (PSI, KS,
+    Wasserstein), moments and new classes per segment are then computed in one grouped pass
+    over the full data (see segmented_drift.py) and returned as "segmented_drift_metrics".
+
+    tiered (opt-in; True or a dict of screening thresholds, e.g. {"psi": 0.2}) screens every
+    feature first with PSI on the reference bins and moment shifts (see screening.py). Only
+    the drift candidates, plus the target and prediction, go on to the data drift report;
+    when there is none the report (and its HTML) is skipped. The report's share of drifted
+    columns is then a share of the tested columns. The scores of candidate and skipped
+    features are returned as "screening".
+
+    html_mode='summary' saves the reports as snapshots and writes summary_report.html, a
+    report of the drift scores and reference/current histograms kept within
+    summary_byte_budget bytes (report_renderer.DEFAULT_BYTE_BUDGET by default).
+
+    metadata["stage_timings"] holds the wall time, CPU time, peak RSS and rows/sec of every
+    stage (see instrumentation.py), including load_timing (a measure() timing of the caller's
+    load step) when given. The 'save' timing is only known after the results are written, so
+    it is in the returned results and in metrics_file (a Prometheus text file, or OpenMetrics
+    for a .om path) but not in the saved JSON.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
     # Get Metadata
     metadata = get_metadata(
         event_type='model run',
@@ -85,15 +205,56 @@ def monitor_model_data(reference, current, column_mapping, source_system, user,
         current=current
     )
 
-    # Generate Data Drift Report
-    data_drift_results = generate_data_drift_report(reference, current, column_mapping)
+    # The drift reports and the statistics are independent, so they can run concurrently
+    # ('thread' or 'process' executor); per-stage timings are kept in the metadata
+    numerical_features = column_mapping.numerical_features
+    drift_reference, drift_current = reference, current
+    if sampling:
+        with measure(rows=len(reference) + len(current)) as sampling_timing:
+            drift_reference, drift_current, sampling_summary = sample_for_drift(reference, current, column_mapping,
+                                                                                sampling)
+        metadata["sampling"] = sampling_summary
+    drift_mapping = column_mapping
+    if tiered:
+        # screening.py loads SciPy through drift_engine, so it is only imported in tiered mode
+        from screening import screen_features, candidate_column_mapping, screening_summary
 
-    # Generate Target Drift Report
-    target_drift_results = generate_target_drift_report(reference, current, column_mapping)
+        thresholds = None if tiered is True else tiered
+        with measure(rows=len(reference) + len(current)) as screening_timing:
+            screening_scores = screen_features(reference, current, column_mapping, reference_profile, thresholds)
+        screening = screening_summary(screening_scores, thresholds)
+        drift_mapping = candidate_column_mapping(column_mapping, screening_scores)
+    run_data_drift = not tiered or bool(screening["candidates"])
+    stages = [
+        Stage('target_drift', generate_target_drift_report, drift_reference, drift_current, column_mapping,
+              output_dir, html_mode),
+        Stage('statistics', calculate_statistics, numerical_features, reference, current, reference_profile),
+    ]
+    if run_data_drift:
+        stages.insert(0, Stage('data_drift', generate_data_drift_report, drift_reference, drift_current, drift_mapping,
+                               output_dir, html_mode))
+    if segments:
+        stages.append(Stage('segmented_drift', calculate_segmented_drift, reference, current, segments,
+                            numerical_features, column_mapping.categorical_features or [], reference_profile))
+    stage_results, stage_timings = run_stages(stages, executor=executor, max_workers=max_workers)
+    if tiered:
+        stage_timings = {"screening": screening_timing, **stage_timings}
+    if sampling:
+        stage_timings = {"sampling": sampling_timing, **stage_timings}
+    if load_timing:
+        stage_timings = {"load": load_timing, **stage_timings}
+    metadata["stage_timings"] = stage_timings
 
-    # Calculate statistics for numerical features
-    numerical_features = column_mapping.numerical_features
-    statistics = calculate_statistics(numerical_features, reference, current)
+    # Early exit: with no drift candidate the data drift report is not run at all
+    data_drift_results = stage_results['data_drift'] if run_data_drift else \
+        {"metrics": [], "skipped": "no drift candidates after screening"}
+    target_drift_results = stage_results['target_drift']
+    statistics = stage_results['statistics']
+
+    # Sampled drift scores carry their sample sizes and confidence intervals
+    if sampling:
+        for report_results in (data_drift_results, target_drift_results):
+            annotate_report(report_results, drift_reference, drift_current, sampling_summary)
 
     # Compile all metrics into a single dictionary
     final_results = {
@@ -102,38 +263,42 @@ def monitor_model_data(reference, current, column_mapping, source_system, user,
         "target_drift_metrics": target_drift_results,
         "statistical_summary": statistics
     }
+    if segments:
+        final_results["segmented_drift_metrics"] = stage_results['segmented_drift']
+    if tiered:
+        final_results["screening"] = screening
 
-    # Save the results as JSON and Excel files
-    save_results_as_files(final_results)
-
-    return final_results
-
-# Example usage
-if __name__ == "__main__":
-    # Load data
-    data = pd.read_csv('sample_data.csv')
+    # The summary report only needs bin counts, so it is rendered from binned aggregates
+    if html_mode == 'summary':
+        from report_renderer import binned_aggregates, save_summary, DEFAULT_BYTE_BUDGET
 
-    # Define the data and column mapping
-    target = 'cnt'
-    prediction = 'prediction'
-    numerical_features = ['temp', 'atemp', 'hum', 'windspeed', 'hr', 'weekday']
-    categorical_features = ['season', 'holiday', 'workingday']
+        summary_path = os.path.join(output_dir, 'summary_report.html')
+        with measure(rows=len(reference) + len(current)) as summary_timing:
+            aggregates = binned_aggregates(reference, current, summary_features(reference, current, column_mapping),
+                                           reference_profile)
+            summary_bytes = save_summary(final_results, aggregates, summary_path,
+                                         summary_byte_budget or DEFAULT_BYTE_BUDGET)
+        metadata["summary_report"] = {"path": summary_path, "bytes": summary_bytes}
+        stage_timings["summary_report"] = summary_timing
 
-    reference = data.iloc[:12000]  
-    current = data.iloc[12000:17379]
+    # Append the results to the result store (JSON/Excel export is then an offline step),
+    # or save them as JSON and Excel files
+    with measure() as save_timing:
+        if result_store:
+            append_results(final_results, result_store)
+        else:
+            save_results_as_files(final_results, output_dir)
+    stage_timings["save"] = save_timing
 
-    column_mapping = ColumnMapping()
-    column_mapping.target = target
-    column_mapping.prediction = prediction
-    column_mapping.numerical_features = numerical_features
-    column_mapping.categorical_features = categorical_features
+    if metrics_file:
+        write_metrics(metadata, metrics_file)
 
-    # Define metadata details
-    source_system = 'ECR'
-    user = 'admin_user'
-    model_version = '1.0.0'
+    return final_results
 
-    # Call the monitoring function
-    final_results = monitor_model_data(reference, current, column_mapping, source_system, user, model_version)
+# Example usage
+if __name__ == "__main__":
+    # Example usage: the sample configuration through the CLI, i.e.
+    # python monitor.py run --config monitor_config_example.json
+    from monitor import main
 
-    print("\nFinal Monitoring Results Saved as JSON and Excel Files.")
+    main(['run', '--config', 'monitor_config_example.json'])
@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import time
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+
+# Batch runner for monitoring many models / segments.
+#
+# A manifest lists jobs of (model_version, source_system, reference, current, column_mapping).
+# Jobs that share a reference are grouped into the same task so the reference is loaded
+# once, tasks run across a process pool, and every job writes into its own output directory
+# (<output_root>/<job_id>/) so concurrent runs never overwrite each other's files.
+# Submission is throttled by the number of pending tasks and by an estimate of the memory
+# the in-flight tasks need. Workers keep recently read source files in a cache bounded in
+# bytes; FRAME_CACHE_SHARE of the memory budget is set aside for these caches (split
+# across the workers) and only the rest admits in-flight tasks, so cached frames count
+# against the budget too.
+DEFAULT_OUTPUT_ROOT = 'batch_output'
+DEFAULT_MEMORY_BUDGET = 4 * 1024 ** 3
+# Rough ratio of in-memory DataFrame size to file size, used for memory admission
+MEMORY_EXPANSION = 4
+DEFAULT_JOBS_PER_TASK = 8
+# Share of the memory budget set aside for the workers' frame caches
+FRAME_CACHE_SHARE = 0.25
+
+# Per-worker cache of loaded source files, keyed by (path, mtime), with their in-memory sizes
+_FRAME_CACHE = OrderedDict()
+
+# Function to load a manifest file
+def load_manifest(path):
+    """Read a JSON manifest: a list of jobs, or an object with a "jobs" list."""
+    with open(path) as json_file:
+        manifest = json.load(json_file)
+    return manifest["jobs"] if isinstance(manifest, dict) else manifest
+
+# Function to normalise a data source spec ("path" or {"path": ..., "rows": [start, stop]})
+def normalize_source(source):
+    if isinstance(source, str):
+        source = {"path": source}
+    rows = source.get("rows")
+    return {"path": os.path.abspath(source["path"]), "rows": None if rows is None else list(rows)}
+
+# Function to validate and complete the jobs of a manifest
+def normalize_jobs(jobs):
+    normalized = []
+    seen_ids = set()
+    for index, job in enumerate(jobs):
+        for key in ("model_version", "source_system", "reference", "current", "column_mapping"):
+            if key not in job:
+                raise ValueError(f"Job {index} in the manifest is missing '{key}'")
+        job_id = job.get("job_id") or f"{index:04d}_{job['model_version']}_{job['source_system']}"
+        job_id = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(job_id))
+        if job_id in seen_ids:
+            raise ValueError(f"Duplicate job_id '{job_id}' in the manifest")
+        seen_ids.add(job_id)
+        normalized.append({
+            "job_id": job_id,
+            "model_version": job["model_version"],
+            "source_system": job["source_system"],
+            "user": job.get("user", "batch_runner"),
+            "reference": normalize_source(job["reference"]),
+            "current": normalize_source(job["current"]),
+            "column_mapping": job["column_mapping"],
+        })
+    return normalized
+
+# Function to estimate the memory a task needs from the sizes of the files it reads
+def estimate_task_bytes(task):
+    paths = {job["reference"]["path"] for job in task} | {job["current"]["path"] for job in task}
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path)) * MEMORY_EXPANSION
+
+# Function to group jobs by reference into tasks of at most jobs_per_task jobs
+def plan_tasks(jobs, jobs_per_task=DEFAULT_JOBS_PER_TASK):
+    groups = OrderedDict()
+    for job in jobs:
+        key = (job["reference"]["path"], tuple(job["reference"]["rows"] or ()))
+        groups.setdefault(key, []).append(job)
+    tasks = []
+    for group in groups.values():
+        for start in range(0, len(group), jobs_per_task):
+            tasks.append(group[start:start + jobs_per_task])
+    return tasks
+
+# Function to read a whole source file, reusing the worker's cache
+def read_source_file(path, cache_bytes=0):
+    """Return the file's frame; the worker's cache keeps at most cache_bytes of frames."""
+    key = (path, os.stat(path).st_mtime_ns)
+    if key in _FRAME_CACHE:
+        _FRAME_CACHE.move_to_end(key)
+        return _FRAME_CACHE[key][0]
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        data = pd.read_parquet(path)
+    elif extension in ('.xlsx', '.xls'):
+        data = pd.read_excel(path)
+    else:
+        data = pd.read_csv(path)
+
+    # Evict the least recently used frames (possibly this one) until the cache fits
+    _FRAME_CACHE[key] = (data, int(data.memory_usage(index=True, deep=True).sum()))
+    while _FRAME_CACHE and sum(size for _, size in _FRAME_CACHE.values()) > cache_bytes:
+        _FRAME_CACHE.popitem(last=False)
+    return data
+
+# Function to load the rows of a data source
+def load_source(source, cache_bytes=0):
+    data = read_source_file(source["path"], cache_bytes)
+    if source["rows"] is None:
+        return data
+    start, stop = source["rows"]
+    return data.iloc[start:stop]
+
+# Function to build an Evidently ColumnMapping from a manifest entry
+def build_column_mapping(spec):
+    from evidently import ColumnMapping
+
+    column_mapping = ColumnMapping()
+    column_mapping.target = spec.get("target")
+    column_mapping.prediction = spec.get("prediction")
+    column_mapping.numerical_features = spec.get("numerical_features")
+    column_mapping.categorical_features = spec.get("categorical_features")
+    return column_mapping
+
+# Function to summarise one job's results
+def summarize_results(final_results):
+    summary = {}
+    for metric in final_results["data_drift_metrics"].get("metrics", []):
+        if metric["metric"] == "DatasetDriftMetric":
+            result = metric["result"]
+            summary["dataset_drift"] = result["dataset_drift"]
+            summary["number_of_drifted_columns"] = result["number_of_drifted_columns"]
+            summary["share_of_drifted_columns"] = result["share_of_drifted_columns"]
+    summary["record_count_reference"] = final_results["metadata"]["record_count_reference"]
+    summary["record_count_current"] = final_results["metadata"]["record_count_current"]
+    # Largest process RSS seen during the job, for sizing the workers
+    stage_timings = final_results["metadata"].get("stage_timings", {}).values()
+    summary["peak_rss_mb"] = max((timing["peak_rss_mb"] for timing in stage_timings if "peak_rss_mb" in timing),
+                                 default=None)
+    return summary
+
+# Function executed by workers: run every job of a task
+def run_task(task, output_root, html_mode='always', result_store=None, cache_bytes=0):
+    from Monitoring import monitor_model_data
+    from reference_profile import load_or_build_reference_profile, file_fingerprint
+    from instrumentation import measure
+
+    summaries = []
+    for job in task:
+        output_dir = os.path.join(output_root, job["job_id"])
+        start = time.perf_counter()
+        summary = {"job_id": job["job_id"], "model_version": job["model_version"],
+                   "source_system": job["source_system"], "output_dir": output_dir}
+        try:
+            with measure() as load_timing:
+                reference = load_source(job["reference"], cache_bytes)
+                current = load_source(job["current"], cache_bytes)
+                load_timing["rows"] = len(reference) + len(current)
+            column_mapping = build_column_mapping(job["column_mapping"])
+
+            rows = job["reference"]["rows"]
+            reference_profile = load_or_build_reference_profile(
+                reference, column_mapping, job["model_version"],
+                cache_dir=os.path.join(output_root, 'reference_profiles'),
+                fingerprint=file_fingerprint(job["reference"]["path"], None if rows is None else slice(*rows)))
+
+            final_results = monitor_model_data(reference, current, column_mapping, job["source_system"],
+                                               job["user"], job["model_version"], reference_profile,
+                                               output_dir=output_dir, html_mode=html_mode,
+                                               result_store=result_store, load_timing=load_timing,
+                                               metrics_file=os.path.join(output_dir, 'monitoring_metrics.prom'))
+            summary.update(status="succeeded", **summarize_results(final_results))
+        except Exception as error:
+            summary.update(status="failed", error=f"{type(error).__name__}: {error}")
+        summary["seconds"] = time.perf_counter() - start
+        summaries.append(summary)
+    return summaries
+
+# Function to write the consolidated summary
+def save_summary(summaries, output_root):
+    with open(os.path.join(output_root, 'summary.json'), 'w') as json_file:
+        json.dump(summaries, json_file, indent=4)
+    pd.DataFrame(summaries).to_csv(os.path.join(output_root, 'summary.csv'), index=False)
+
+# Main function to run all jobs of a manifest
+def run_batch(jobs, output_root=DEFAULT_OUTPUT_ROOT, max_workers=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+              max_pending=None, jobs_per_task=DEFAULT_JOBS_PER_TASK, html_mode='always', result_store=None):
+    """Run the jobs across a process pool and return the consolidated summary (one entry per job).
+
+    At most `max_pending` tasks (default: twice the worker count) are submitted at a time, and a
+    task is only submitted while the estimated memory of all in-flight tasks stays within
+    the part of `memory_budget` bytes not set aside for the workers' frame caches; a task
+    larger than that runs on its own.
+    """
+    jobs = normalize_jobs(jobs)
+    os.makedirs(output_root, exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    cache_bytes = int(memory_budget * FRAME_CACHE_SHARE) // max_workers
+    task_budget = memory_budget - cache_bytes * max_workers
+
+    summaries = []
+    pending = {}
+    in_flight_bytes = 0
+
+    def collect(futures):
+        nonlocal in_flight_bytes
+        for future in futures:
+            in_flight_bytes -= pending.pop(future)
+            summaries.extend(future.result())
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for task in plan_tasks(jobs, jobs_per_task):
+            task_bytes = estimate_task_bytes(task)
+            # Backpressure: wait for running tasks to finish before admitting more work
+            while pending and (len(pending) >= max_pending or in_flight_bytes + task_bytes > task_budget):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = pool.submit(run_task, task, output_root, html_mode, result_store, cache_bytes)
+            pending[future] = task_bytes
+            in_flight_bytes += task_bytes
+        collect(list(pending))
+
+    # Report jobs in manifest order whatever order they completed in
+    order = {job["job_id"]: index for index, job in enumerate(jobs)}
+    summaries.sort(key=lambda summary: order[summary["job_id"]])
+    save_summary(summaries, output_root)
+    return summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run monitor_model_data for every job of a manifest.")
+    parser.add_argument('manifest', help="JSON manifest of monitoring jobs")
+    parser.add_argument('--output-root', default=DEFAULT_OUTPUT_ROOT)
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_MEMORY_BUDGET // 1024 ** 2)
+    parser.add_argument('--max-pending', type=int, default=None)
+    parser.add_argument('--jobs-per-task', type=int, default=DEFAULT_JOBS_PER_TASK)
+    parser.add_argument('--html-mode', choices=['always', 'on_drift', 'never', 'summary'], default='always',
+                        help="When to render the HTML reports (otherwise a snapshot is saved)")
+    parser.add_argument('--result-store', default=None,
+                        help="Append results to this SQLite store instead of writing JSON/Excel per job")
+    args = parser.parse_args()
+
+    summaries = run_batch(load_manifest(args.manifest), args.output_root, args.max_workers,
+                          args.memory_budget_mb * 1024 ** 2, args.max_pending, args.jobs_per_task,
+                          args.html_mode, args.result_store)
+    failed = [summary for summary in summaries if summary["status"] != "succeeded"]
+    print(f"\n{len(summaries) - len(failed)} of {len(summaries)} jobs succeeded. "
+          f"Summary saved to {os.path.join(args.output_root, 'summary.json')}.")
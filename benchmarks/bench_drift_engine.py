@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drift_engine import compute_drift
+from streaming import psi_from_counts
+
+# Benchmark of the vectorized drift engine against the per-column loop version
+# (calculate_statistics + check_for_new_classes + per-column PSI/KS/Wasserstein).
+
+# Function to generate reference/current frames with n numerical and a few categorical features
+def generate_frames(n_features, n_rows, n_categorical=3, seed=42):
+    rng = np.random.default_rng(seed)
+    numerical_features = [f"num_{i}" for i in range(n_features)]
+    categorical_features = [f"cat_{i}" for i in range(n_categorical)]
+
+    def frame(shift, n_classes):
+        data = {feature: rng.normal(shift, 1.0, n_rows) for feature in numerical_features}
+        data.update({feature: rng.integers(0, n_classes, n_rows) for feature in categorical_features})
+        return pd.DataFrame(data)
+
+    return frame(0.0, 4), frame(0.1, 5), numerical_features, categorical_features
+
+# Function with the loop-based computation the engine replaces
+def loop_drift(reference, current, numerical_features, categorical_features, bins=10):
+    from monitoring_new_class import calculate_statistics, check_for_new_classes
+
+    statistics = calculate_statistics(numerical_features, reference, current)
+    new_class_flag, new_class_details = check_for_new_classes(
+        reference, current, numerical_features + categorical_features)
+    drift = {}
+    for feature in numerical_features:
+        reference_counts, bin_edges = np.histogram(reference[feature], bins=bins)
+        current_counts = np.histogram(np.clip(current[feature], bin_edges[0], bin_edges[-1]), bins=bin_edges)[0]
+        drift[feature] = {
+            "psi": psi_from_counts(reference_counts, current_counts),
+            "ks": stats.ks_2samp(reference[feature], current[feature], method='asymp'),
+            "wasserstein": stats.wasserstein_distance(reference[feature], current[feature]),
+        }
+    return statistics, new_class_flag, new_class_details, drift
+
+# Function to time a callable, keeping the best of several repeats
+def best_time(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark drift_engine.compute_drift against the loop version.")
+    parser.add_argument('--features', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for n_features in args.features:
+        reference, current, numerical_features, categorical_features = generate_frames(n_features, args.rows)
+        loop_seconds = best_time(
+            lambda: loop_drift(reference, current, numerical_features, categorical_features), args.repeats)
+        engine_seconds = best_time(
+            lambda: compute_drift(reference, current, numerical_features, categorical_features), args.repeats)
+        result = {
+            "features": n_features,
+            "rows": args.rows,
+            "loop_seconds": loop_seconds,
+            "engine_seconds": engine_seconds,
+            "speedup": loop_seconds / engine_seconds,
+        }
+        results.append(result)
+        print(f"{n_features:>5} features: loop {loop_seconds:.3f}s, engine {engine_seconds:.3f}s, "
+              f"speedup {result['speedup']:.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import-time budget of the monitoring entry points.
+#
+# Each target is imported in a fresh interpreter (so nothing is cached in sys.modules) and
+# the wall time of the import is measured; the median of --repeat runs is compared with
+# the target's budget. No target may load any of the heavy packages: they are imported
+# by the functions that use them, so the metrics-only path (monitor.py metrics ->
+# stat_metrics) loads NumPy and pandas only. Exits with status 1 when a budget is
+# exceeded or a heavy package is loaded, so it can run as a CI check.
+HEAVY_PACKAGES = ('evidently', 'sklearn', 'matplotlib', 'seaborn', 'scipy')
+# (name, statement, budget in seconds)
+TARGETS = (
+    ("cli", "import monitor", 0.2),
+    ("metrics_path", "import monitor, stat_metrics", 1.0),
+    # The monitoring pipelines load Evidently only when a report runs
+    ("monitoring_pipeline", "import monitor, Monitoring", 1.0),
+    ("new_class_pipeline", "import monitor, monitoring_new_class", 1.0),
+)
+
+# Code run in the child interpreter: time the statement and list the heavy packages it loaded
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+exec({statement!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+# Function to time one import statement in a fresh interpreter
+def time_import(statement):
+    code = CHILD.format(statement=statement, heavy=HEAVY_PACKAGES)
+    output = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the monitoring entry points.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget (slow machines)")
+    parser.add_argument('--output', default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for name, statement, budget in TARGETS:
+        runs = [time_import(statement) for _ in range(args.repeat)]
+        seconds = statistics.median(run["seconds"] for run in runs)
+        unexpected = sorted(set().union(*(run["loaded"] for run in runs)))
+        passed = seconds <= budget * args.scale and not unexpected
+        results.append({"target": name, "statement": statement, "seconds": seconds, "budget": budget * args.scale,
+                        "heavy_packages_loaded": unexpected, "passed": passed})
+        status = "ok" if passed else "OVER BUDGET" if not unexpected else f"LOADED {', '.join(unexpected)}"
+        print(f"{name:>20}: {seconds:.3f}s (budget {budget * args.scale:.2f}s) {status}")
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
+    return 0 if all(result["passed"] for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import json
+import resource
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from new_class_detector import detect_new_classes
+
+# Benchmark of new_class_detector.detect_new_classes against check_for_new_classes on
+# large categorical columns: low-cardinality integers, short strings and high-cardinality
+# integer IDs. Each run happens in a forked child so its peak memory can be measured as
+# the growth of the child's RSS during the run.
+
+# Function to generate reference/current frames with a few unseen classes in the current one
+def generate_frames(n_rows, n_ids, seed=42):
+    rng = np.random.default_rng(seed)
+    labels = np.array([f"store_{i:03d}" for i in range(200)])
+
+    def frame(n_codes, n_labels, n_id_values):
+        return pd.DataFrame({
+            "channel": rng.integers(0, n_codes, n_rows),
+            "store": labels[rng.integers(0, n_labels, n_rows)],
+            "customer_id": rng.integers(0, n_id_values, n_rows),
+        })
+
+    return frame(8, 190, n_ids), frame(9, 200, n_ids + n_ids // 100), ["channel", "store", "customer_id"]
+
+# Function to read the current resident set size of this process in kilobytes
+def current_rss_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+# Function executed in the forked child: run one implementation and report time and peak memory
+def _measure(name, reference, current, features, queue):
+    from monitoring_new_class import check_for_new_classes
+
+    baseline_kb = current_rss_kb()
+    start = time.perf_counter()
+    if name == "check_for_new_classes":
+        flag, _ = check_for_new_classes(reference, current, features)
+    else:
+        flag, _, _ = detect_new_classes(reference, current, features)
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({"implementation": name, "seconds": seconds, "peak_memory_mb": (peak_kb - baseline_kb) / 1024,
+               "new_class_detected": flag})
+
+# Function to run one implementation in a forked child
+def measure(name, reference, current, features):
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(name, reference, current, features, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detect_new_classes against check_for_new_classes.")
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--ids', type=int, default=1_000_000, help="Distinct customer IDs in the reference")
+    parser.add_argument('--output', default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    reference, current, features = generate_frames(args.rows, args.ids)
+    results = []
+    for name in ("check_for_new_classes", "detect_new_classes"):
+        result = measure(name, reference, current, features)
+        result["rows"] = args.rows
+        results.append(result)
+        print(f"{name:>22}: {result['seconds']:.2f}s, peak +{result['peak_memory_mb']:.0f} MB")
+    print(f"speedup {results[0]['seconds'] / results[1]['seconds']:.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import shutil
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from service import MonitoringService, MonitoringClient, ServiceError, start_server
+
+# Load test of the monitoring service.
+#
+# Starts the service in this process on a free port (or targets --url), registers the
+# model of a run configuration, writes --windows current windows of the configuration's
+# data as Arrow IPC files, then sends --requests /metrics requests from --concurrency
+# client threads. Reports latency percentiles, throughput and the 503 (busy) answers;
+# --runs adds full /run requests (Evidently reports) for comparison. The cold baseline is
+# a separate `python monitor.py run` process per window.
+
+# Function to write current windows as Arrow IPC files
+def write_windows(config, n_windows, directory):
+    import pyarrow as pa
+
+    source = config["current"]
+    path, rows = (source, None) if isinstance(source, str) else (source["path"], source.get("rows"))
+    data = pd.read_csv(os.path.join(REPO_ROOT, path) if not os.path.isabs(path) else path)
+    if rows is not None:
+        data = data.iloc[rows[0]:rows[1]]
+    paths = []
+    for index, window in enumerate(np.array_split(np.arange(len(data)), n_windows)):
+        table = pa.Table.from_pandas(data.iloc[window], preserve_index=False)
+        window_path = os.path.join(directory, f"window_{index:03d}.arrow")
+        with pa.OSFile(window_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        paths.append(window_path)
+    return paths
+
+# Function to send requests from several client threads and collect the latencies
+def run_load(client, model_id, windows, n_requests, concurrency, endpoint='metrics'):
+    latencies, busy, errors = [], [0], []
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            start = time.perf_counter()
+            try:
+                if endpoint == 'metrics':
+                    client.metrics(model_id, windows[index % len(windows)])
+                else:
+                    client.run(model_id, windows[index % len(windows)], {"html_mode": "never"})
+            except ServiceError as error:
+                with lock:
+                    if error.status == 503:
+                        busy[0] += 1
+                    else:
+                        errors.append(str(error))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "endpoint": endpoint, "requests": n_requests, "concurrency": concurrency, "seconds": seconds,
+        "succeeded": len(latencies), "busy": busy[0], "errors": len(errors),
+        "throughput_per_second": len(latencies) / seconds if seconds else None,
+        **({f"p{q}_ms": float(np.percentile(latencies, q)) for q in (50, 95, 99)} if len(latencies) else {}),
+        "first_error": errors[0] if errors else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the monitoring service.")
+    parser.add_argument('--config', default=os.path.join(REPO_ROOT, 'monitor_config_example.json'))
+    parser.add_argument('--url', default=None, help="Target a running service instead of starting one")
+    parser.add_argument('--windows', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--max-pending', type=int, default=64)
+    parser.add_argument('--runs', type=int, default=0, help="Also send this many full /run requests")
+    parser.add_argument('--output', default=None, help="Optional JSON file for the results")
+    parser.add_argument('--windows-dir', default=None,
+                        help="Directory for the current windows (default: a temporary directory)")
+    args = parser.parse_args()
+
+    with open(args.config) as json_file:
+        config = json.load(json_file)
+    # Paths of the configuration are relative to the repo
+    os.chdir(REPO_ROOT)
+
+    # A running service (--url) must have this directory among its --data-root directories
+    directory = args.windows_dir or tempfile.mkdtemp(prefix='service-load-test-windows-')
+    server = None
+    if args.url is None:
+        service = MonitoringService(args.max_workers, args.max_pending,
+                                    output_root=tempfile.mkdtemp(prefix='service-load-test-'),
+                                    data_roots=(REPO_ROOT, directory))
+        server = start_server(service, port=0, background=True)
+        args.url = f"http://127.0.0.1:{server.server_address[1]}"
+    client = MonitoringClient(args.url)
+
+    try:
+        windows = write_windows(config, args.windows, directory)
+        start = time.perf_counter()
+        model = client.register({key: value for key, value in config.items() if key != 'current'})
+        print(f"registered {model['model_id']} ({model['record_count_reference']} reference rows) "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        results = [run_load(client, model["model_id"], windows, args.requests, args.concurrency)]
+        if args.runs:
+            results.append(run_load(client, model["model_id"], windows, args.runs, min(args.concurrency, args.runs),
+                                    endpoint='run'))
+    finally:
+        if args.windows_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    for result in results:
+        print(f"/{result['endpoint']}: {result['succeeded']}/{result['requests']} ok, {result['busy']} busy, "
+              f"{result['errors']} errors, {result['throughput_per_second']:.1f} req/s, "
+              f"p50 {result.get('p50_ms', float('nan')):.1f} ms, p95 {result.get('p95_ms', float('nan')):.1f} ms, "
+              f"p99 {result.get('p99_ms', float('nan')):.1f} ms")
+        if result["first_error"]:
+            print(f"  first error: {result['first_error']}")
+    print(client.health())
+
+    if server is not None:
+        server.shutdown()
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import datetime
+import itertools
+import contextlib
+import subprocess
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Benchmark suite for the monitoring pipeline.
+#
+# Synthetic data is generated in the shape of the repo's inputs and cached on disk:
+#   - 'pipeline':   hourly data shaped like sample_data.csv (season/holiday/workingday,
+#                   numerical features, cnt target) run through the stages of
+#                   monitor_model_data: load, new-class check, data drift, target drift,
+#                   statistics and save;
+#   - 'components': scores shaped like "stats metrics/input_data.csv" (features,
+#                   predicted_probability, target) run through calculate_psi,
+#                   compute_metrics and DriftMetrics.
+# Every (suite, rows, features) case runs in a fresh forked process so its peak RSS is
+# not inflated by earlier cases. Results are appended as JSON lines, one per case, tagged
+# with the git commit, so runs of different commits can be compared with --compare.
+DEFAULT_ROWS = [10_000, 100_000]
+DEFAULT_FEATURES = [10, 100]
+DEFAULT_DATA_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'data')
+DEFAULT_OUTPUT = os.path.join(REPO_ROOT, 'benchmarks', 'results.jsonl')
+SUITES = ('pipeline', 'components')
+PIPELINE_STAGES = ('load', 'new_classes', 'data_drift', 'target_drift', 'statistics', 'save')
+COMPONENT_STAGES = ('load', 'calculate_psi', 'compute_metrics', 'drift_metrics')
+CATEGORICAL_FEATURES = ['season', 'holiday', 'workingday']
+TARGET = 'cnt'
+
+# Function to generate a frame shaped like sample_data.csv
+def generate_monitoring_frame(n_rows, n_features, seed=42, shift=0.0, new_class_share=0.0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2011-01-01', periods=n_rows, freq='h', name='')
+    data = {
+        'season': rng.integers(1, 5, n_rows),
+        'holiday': rng.choice([0, 1], n_rows, p=[0.97, 0.03]),
+        'workingday': rng.choice([0, 1], n_rows, p=[0.32, 0.68]),
+    }
+    if new_class_share:
+        # A holiday code the reference never contains, to exercise the new-class check
+        data['holiday'][rng.random(n_rows) < new_class_share] = 2
+    for i in range(n_features):
+        data[f'num_{i}'] = rng.beta(2.0, 2.0, n_rows) + shift * (i % 2)
+    data[TARGET] = rng.poisson(190.0 * (1.0 + shift), n_rows)
+    return pd.DataFrame(data, index=index)
+
+# Function to generate a frame shaped like "stats metrics/input_data.csv"
+def generate_scores_frame(n_rows, n_features, seed=42, shift=0.0):
+    rng = np.random.default_rng(seed)
+    target = rng.integers(0, 2, n_rows)
+    # Overlapping score distributions so AUC/KS are not trivially 1
+    predicted_probability = np.clip(rng.normal(0.35 + 0.3 * target + shift, 0.2), 0.0, 1.0)
+    data = {f'feature{i + 1}': rng.standard_normal(n_rows) for i in range(n_features)}
+    data['predicted_probability'] = predicted_probability
+    data['target'] = target
+    return pd.DataFrame(data)
+
+# Function to generate (once) the reference and current files of a case
+def ensure_case_files(suite, n_rows, n_features, data_dir=DEFAULT_DATA_DIR, file_format='csv', seed=42):
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {}
+    for role, role_seed, shift in (('reference', seed, 0.0), ('current', seed + 1, 0.05)):
+        path = os.path.join(data_dir, f'{suite}_{n_rows}x{n_features}_{role}_{seed}.{file_format}')
+        if not os.path.exists(path):
+            if suite == 'pipeline':
+                frame = generate_monitoring_frame(n_rows, n_features, role_seed, shift,
+                                                  new_class_share=0.001 if role == 'current' else 0.0)
+            else:
+                frame = generate_scores_frame(n_rows, n_features, role_seed, shift)
+            # Write to a temporary name first so an interrupted run never leaves a partial file
+            partial = path + '.partial'
+            if file_format == 'parquet':
+                frame.to_parquet(partial)
+            else:
+                frame.to_csv(partial, index=suite == 'pipeline')
+            os.replace(partial, path)
+        paths[role] = path
+    return paths
+
+# Function to read a case file the way the repo's scripts read their inputs
+def read_case_file(path, suite):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if suite == 'pipeline':
+        return pd.read_csv(path, index_col=0, parse_dates=True)
+    return pd.read_csv(path)
+
+# Function to read the peak resident set size of this process in megabytes
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+class StageTimer:
+    '''Collect wall time, CPU time and peak RSS of consecutive stages.'''
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        peak_before = peak_rss_mb()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        yield
+        peak_after = peak_rss_mb()
+        self.stages[name] = {
+            "seconds": time.perf_counter() - wall_start,
+            "cpu_seconds": time.process_time() - cpu_start,
+            "peak_rss_mb": peak_after,
+            # Growth of the process high-water mark during the stage
+            "peak_rss_growth_mb": peak_after - peak_before,
+        }
+
+    def run(self, name, func, *args, **kwargs):
+        '''Run func as stage `name` unless it is skipped; return its result.'''
+        if name in self.skip:
+            return None
+        with self.stage(name):
+            return func(*args, **kwargs)
+
+# Function to run the monitor_model_data stages on one case
+def run_pipeline_case(paths, n_features, timer, html_mode='never'):
+    from evidently import ColumnMapping
+    from Monitoring import (get_metadata, generate_data_drift_report, generate_target_drift_report,
+                            calculate_statistics, save_results_as_files)
+    from new_class_detector import detect_new_classes
+
+    with timer.stage('load'):
+        reference = read_case_file(paths['reference'], 'pipeline')
+        current = read_case_file(paths['current'], 'pipeline')
+
+    column_mapping = ColumnMapping()
+    column_mapping.target = TARGET
+    column_mapping.numerical_features = [f'num_{i}' for i in range(n_features)]
+    column_mapping.categorical_features = CATEGORICAL_FEATURES
+
+    output_dir = tempfile.mkdtemp(prefix='monitoring-benchmark-')
+    try:
+        new_classes = timer.run('new_classes', detect_new_classes, reference, current, CATEGORICAL_FEATURES)
+        data_drift = timer.run('data_drift', generate_data_drift_report, reference, current, column_mapping,
+                               output_dir, html_mode)
+        target_drift = timer.run('target_drift', generate_target_drift_report, reference, current, column_mapping,
+                                 output_dir, html_mode)
+        statistics = timer.run('statistics', calculate_statistics, column_mapping.numerical_features,
+                               reference, current)
+
+        metadata = get_metadata('benchmark', 'benchmark', 'benchmark', 'benchmark', reference, current)
+        if new_classes is not None:
+            metadata["new_class_detected"], metadata["new_class_details"] = new_classes[:2]
+        final_results = {
+            "metadata": metadata,
+            "data_drift_metrics": data_drift or {},
+            "target_drift_metrics": target_drift or {},
+            "statistical_summary": statistics or {},
+        }
+        timer.run('save', save_results_as_files, final_results, output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+# Function to run calculate_psi, compute_metrics and DriftMetrics on one case
+def run_components_case(paths, timer):
+    from stat_metrics import calculate_psi, compute_metrics
+    from sample_drift_metrics import DriftMetrics
+
+    with timer.stage('load'):
+        reference = read_case_file(paths['reference'], 'components')
+        current = read_case_file(paths['current'], 'components')
+
+    timer.run('calculate_psi', calculate_psi, reference['predicted_probability'], current['predicted_probability'])
+    timer.run('compute_metrics', compute_metrics, current, 'target', 'predicted_probability')
+    timer.run('drift_metrics', lambda: DriftMetrics(reference, 'predicted_probability').evaluate(current))
+
+# Function executed in the forked child: run one case and send back its stage measurements
+def _run_case(suite, paths, n_features, skip, html_mode, queue):
+    timer = StageTimer(skip)
+    try:
+        if suite == 'pipeline':
+            run_pipeline_case(paths, n_features, timer, html_mode)
+        else:
+            run_components_case(paths, timer)
+        queue.put({"status": "succeeded", "stages": timer.stages})
+    except Exception as error:
+        queue.put({"status": "failed", "error": f"{type(error).__name__}: {error}", "stages": timer.stages})
+
+# Function to run one case in a fresh forked process
+def run_case(suite, paths, n_features, skip=(), html_mode='never'):
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(suite, paths, n_features, skip, html_mode, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+# Function to describe the code and environment the benchmark ran on
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+# Function to append benchmark records to a JSON-lines file
+def save_records(records, path=DEFAULT_OUTPUT):
+    with open(path, 'a') as output_file:
+        for record in records:
+            output_file.write(json.dumps(record) + '\n')
+
+# Function to load benchmark records from a JSON-lines file
+def load_records(path):
+    with open(path) as input_file:
+        return [json.loads(line) for line in input_file if line.strip()]
+
+# Function to compare stage timings against the latest baseline record of each case
+def compare_records(records, baseline_records):
+    """Return a DataFrame of (case, stage) rows with baseline and current seconds and their ratio."""
+    baseline = {}
+    for record in baseline_records:
+        baseline[(record["suite"], record["rows"], record["features"])] = record
+    rows = []
+    for record in records:
+        base = baseline.get((record["suite"], record["rows"], record["features"]))
+        if base is None:
+            continue
+        for stage, measurement in record["stages"].items():
+            if stage in base["stages"]:
+                base_seconds = base["stages"][stage]["seconds"]
+                rows.append({"suite": record["suite"], "rows": record["rows"], "features": record["features"],
+                             "stage": stage, "baseline_seconds": base_seconds, "seconds": measurement["seconds"],
+                             "ratio": measurement["seconds"] / base_seconds if base_seconds else np.nan,
+                             "baseline_peak_rss_mb": base["stages"][stage]["peak_rss_mb"],
+                             "peak_rss_mb": measurement["peak_rss_mb"]})
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the monitoring pipeline on synthetic data.")
+    parser.add_argument('--suite', choices=SUITES, nargs='+', default=list(SUITES))
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Rows of the reference and of the current data (10k to 50M)")
+    parser.add_argument('--features', type=int, nargs='+', default=DEFAULT_FEATURES,
+                        help="Numerical features per frame (10 to 1000)")
+    parser.add_argument('--skip', nargs='*', default=[], choices=sorted(set(PIPELINE_STAGES + COMPONENT_STAGES) - {'load'}),
+                        help="Stages to skip, e.g. the Evidently reports on very large cases")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Format of the generated inputs")
+    parser.add_argument('--html-mode', choices=['always', 'on_drift', 'never'], default='never')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON-lines file the results are appended to")
+    parser.add_argument('--compare', default=None, help="JSON-lines file of a baseline run to compare against")
+    args = parser.parse_args()
+
+    environment = environment_info()
+    records = []
+    for suite, n_rows, n_features in itertools.product(args.suite, args.rows, args.features):
+        paths = ensure_case_files(suite, n_rows, n_features, args.data_dir, args.format)
+        result = run_case(suite, paths, n_features, args.skip, args.html_mode)
+        record = {"timestamp": datetime.datetime.now().isoformat(), "suite": suite, "rows": n_rows,
+                  "features": n_features, "format": args.format, **result, **environment}
+        records.append(record)
+        stages = ", ".join(f"{name} {stage['seconds']:.2f}s/{stage['peak_rss_mb']:.0f}MB"
+                           for name, stage in result["stages"].items())
+        print(f"{suite:>10} {n_rows:>10} rows x {n_features:>4} features [{result['status']}]: {stages}")
+        if result["status"] != "succeeded":
+            print(f"{'':>10} {result['error']}")
+
+    save_records(records, args.output)
+    print(f"\nResults appended to {args.output}")
+
+    if args.compare:
+        comparison = compare_records(records, load_records(args.compare))
+        print(comparison.to_string(index=False) if len(comparison) else "No matching baseline cases.")
+
+if __name__ == "__main__":
+    main()
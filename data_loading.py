@@ -0,0 +1,168 @@
+import os
+import numpy as np
+import pandas as pd
+from reference_profile import file_fingerprint
+
+# Columnar input layer.
+#
+# Only the columns a ColumnMapping uses (features, target, prediction, optional index) are
+# read, with compact dtypes: float32 for numerical features, category for categorical
+# features and the smallest integer type for integer columns. Parquet files are read with
+# column projection and row-range pushdown (only the row groups overlapping the requested
+# rows are decoded), optionally memory-mapped; Arrow IPC files are memory-mapped and
+# sliced without copying. CSV and Excel inputs are converted once to a cached Parquet file
+# (keyed by path, size and mtime), so later runs get the same fast path.
+DEFAULT_CACHE_DIR = 'input_cache'
+ROW_GROUP_SIZE = 65_536
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+
+# Function to list the columns a column mapping uses
+def required_columns(column_mapping, extra=()):
+    columns = []
+
+    def add(value):
+        if value is None:
+            return
+        for column in ([value] if isinstance(value, str) else value):
+            if column not in columns:
+                columns.append(column)
+
+    add(column_mapping.target)
+    add(column_mapping.prediction)
+    add(column_mapping.numerical_features)
+    add(column_mapping.categorical_features)
+    add(getattr(column_mapping, 'datetime', None))
+    add(getattr(column_mapping, 'id', None))
+    add(list(extra))
+    return columns
+
+# Function to derive compact dtypes from a column mapping
+def compact_dtypes(column_mapping, float_dtype='float32'):
+    """{column: dtype} for the features; integer columns are downcast after loading instead."""
+    dtypes = {column: float_dtype for column in column_mapping.numerical_features or []}
+    dtypes.update({column: 'category' for column in column_mapping.categorical_features or []})
+    return dtypes
+
+# Function to convert the columns of a frame to compact dtypes
+def compact_frame(df, dtypes):
+    for column in df.columns:
+        dtype = dtypes.get(column)
+        if dtype == 'category':
+            df[column] = df[column].astype('category')
+        elif pd.api.types.is_integer_dtype(df[column]):
+            # Integers (codes, counts, hours) keep exact values in the smallest integer type
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif dtype is not None:
+            df[column] = df[column].astype(dtype)
+    return df
+
+# Function to get the path of the cached Parquet copy of a CSV/Excel file
+def cached_parquet_path(path, cache_dir=DEFAULT_CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{file_fingerprint(path)[:16]}.parquet")
+
+# Function to convert a CSV or Excel file to a cached Parquet file (once)
+def ensure_parquet(path, cache_dir=DEFAULT_CACHE_DIR, row_group_size=ROW_GROUP_SIZE):
+    """Return the path of a Parquet copy of the file, converting it on the first call."""
+    cache_path = cached_parquet_path(path, cache_dir)
+    if os.path.exists(cache_path):
+        return cache_path
+
+    extension = os.path.splitext(path)[1].lower()
+    data = pd.read_excel(path) if extension in EXCEL_EXTENSIONS else pd.read_csv(path)
+    # Integer columns are stored in their smallest type; floats keep full precision in the cache
+    for column in data.columns:
+        if pd.api.types.is_integer_dtype(data[column]):
+            data[column] = pd.to_numeric(data[column], downcast='integer')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary name first so concurrent or interrupted runs never see a partial file
+    partial = f"{cache_path}.{os.getpid()}.partial"
+    data.to_parquet(partial, index=False, row_group_size=row_group_size)
+    os.replace(partial, cache_path)
+    return cache_path
+
+# Function to read a Parquet file with column projection and row-range pushdown
+def read_parquet_rows(path, columns=None, rows=None, memory_map=False):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path, memory_map=memory_map)
+    if columns is not None:
+        available = set(parquet_file.schema_arrow.names)
+        columns = [column for column in columns if column in available]
+    if rows is None:
+        return parquet_file.read(columns=columns).to_pandas()
+
+    start, stop = rows
+    metadata = parquet_file.metadata
+    sizes = np.array([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+    group_starts = np.concatenate([[0], np.cumsum(sizes)])
+    stop = min(stop, int(group_starts[-1]))
+    # Only the row groups that overlap [start, stop) are read and decoded
+    groups = [i for i in range(len(sizes)) if group_starts[i] < stop and group_starts[i + 1] > start]
+    if not groups:
+        return parquet_file.schema_arrow.empty_table().select(columns or parquet_file.schema_arrow.names).to_pandas()
+    table = parquet_file.read_row_groups(groups, columns=columns)
+    offset = start - int(group_starts[groups[0]])
+    return table.slice(offset, stop - start).to_pandas()
+
+# Function to read an Arrow IPC file memory-mapped, with projection and a zero-copy row slice
+def read_arrow_rows(path, columns=None, rows=None):
+    import pyarrow as pa
+
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([column for column in columns if column in table.column_names])
+    if rows is not None:
+        table = table.slice(rows[0], rows[1] - rows[0])
+    return table.to_pandas()
+
+# Main function to load the columns of a column mapping from any supported file
+def load_frame(path, column_mapping=None, rows=None, columns=None, index_col=None, compact=True,
+               memory_map=False, cache_dir=DEFAULT_CACHE_DIR):
+    """Load rows [start, stop) of the columns the column mapping uses.
+
+    CSV and Excel files are converted to a cached Parquet file on the first call
+    (cache_dir=None reads them directly instead). Columns of the mapping that the file does
+    not contain (e.g. an absent prediction) are skipped. index_col names a column to use as
+    the index (datetime strings are parsed).
+    """
+    if columns is None and column_mapping is not None:
+        columns = required_columns(column_mapping, [index_col] if index_col else [])
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in ARROW_EXTENSIONS:
+        data = read_arrow_rows(path, columns, rows)
+    elif extension in PARQUET_EXTENSIONS or cache_dir is not None:
+        parquet_path = path if extension in PARQUET_EXTENSIONS else ensure_parquet(path, cache_dir)
+        data = read_parquet_rows(parquet_path, columns, rows, memory_map)
+    else:
+        skip, count = (None, None) if rows is None else (range(1, rows[0] + 1), rows[1] - rows[0])
+        if extension in EXCEL_EXTENSIONS:
+            data = pd.read_excel(path, skiprows=skip, nrows=count)
+        else:
+            data = pd.read_csv(path, skiprows=skip, nrows=count)
+        if columns is not None:
+            data = data[[column for column in columns if column in data.columns]]
+
+    if rows is not None:
+        # Keep the row positions of the file, as data.iloc[start:stop] would
+        data.index = pd.RangeIndex(rows[0], rows[0] + len(data))
+    if index_col:
+        index = data.pop(index_col)
+        if index.dtype == object or pd.api.types.is_string_dtype(index):
+            index = pd.to_datetime(index)
+        data.index = pd.Index(index, name=None)
+    if compact and column_mapping is not None:
+        data = compact_frame(data, compact_dtypes(column_mapping))
+    return data
+
+# Function to load the reference and current slices of one file
+def load_reference_and_current(path, column_mapping, reference_rows, current_rows, **kwargs):
+    """Each slice is read with row-range pushdown; only the needed columns are decoded."""
+    reference = load_frame(path, column_mapping, rows=reference_rows, **kwargs)
+    current = load_frame(path, column_mapping, rows=current_rows, **kwargs)
+    return reference, current
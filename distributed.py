@@ -0,0 +1,648 @@
+import os
+import glob
+import datetime
+from fractions import Fraction
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from streaming import iter_chunks, DEFAULT_CHUNKSIZE
+
+# Out-of-core drift computation by partition-wise aggregation (map/reduce).
+#
+# The driver builds a plan from the reference (which fits on one box, with its cached
+# reference profile): the features, the reference bin edges, reference cells and class
+# vocabularies. The map step runs aggregate_partition on every current partition (Parquet
+# or CSV files, read in bounded chunks) through a PartitionExecutor; each returns a
+# PartitionAggregate of additive state. The reducer merges the aggregates and derives the
+# same final_results structure monitor_model_data returns (metadata, a data drift block
+# with DatasetDriftMetric and DataDriftTable over the target, prediction, numerical and
+# categorical features as in the Evidently report, a target drift block of ColumnDriftMetric
+# entries, statistical summary, new classes), which is then saved as JSON/Excel or appended
+# to the result store.
+#
+# Results are deterministic regardless of how the rows are partitioned: every partial is
+# an integer (counts, histogram and cell counts, class counts), an exact min/max, or an
+# ExactSum. ExactSum keeps a sum of float64 values exactly as an integer mantissa times a
+# power of two (np.frexp splits every value into an integer mantissa and exponent), so
+# merging in any order gives the same sum; means and variances are then derived with
+# rationals and rounded once. Sums are taken over (x - reference mean) and its square,
+# which are computed value by value and do not depend on the partitioning either.
+#   - PSI uses the reference profile's bins;
+#   - KS and Wasserstein use the reference cells: the distinct reference values and the
+#     open intervals between them (2r+1 cells, which gives the exact KS statistic) when
+#     the reference has at most MAX_EXACT_VALUES distinct values, else FINE_BINS reference
+#     quantiles. Current values inside an open cell are placed at its midpoint for
+#     Wasserstein, so it is exact only on discrete data, but it is still a function of the
+#     integer counts.
+#   - categorical columns (and a non-numeric target or prediction) keep full class counts
+#     per stripped label, against the reference class counts of the plan.
+#   - numerical columns whose reference has at most MAX_DISCRETE_VALUES distinct values
+#     also keep their current value counts, until reference and current together have
+#     more distinct values (the cutoff does not depend on how the rows are split).
+# Every column gets the stat test Evidently picks by default: numerical columns with at
+# most MAX_DISCRETE_VALUES distinct values, and categorical columns, get
+# drift_engine.categorical_drift on their value/class counts (Jensen-Shannon, chi-square
+# or Z-test); other numerical columns get K-S p-values when the reference has at most
+# drift_engine.LARGE_SAMPLE_ROWS values, else Wasserstein distance (normed).
+# The target drift block holds one ColumnDriftMetric per target/prediction column, like
+# the first metrics of Evidently's TargetDriftPreset; the preset's plots, correlations and
+# TargetByFeaturesTable need raw rows and are not produced.
+# New classes are counted per label outside the reference vocabulary (missing values are
+# not classes); at most MAX_NEW_CLASSES labels per feature are kept, the smallest ones in
+# string order, which is again independent of the partitioning (the smallest labels of
+# the union are among the smallest labels of every partition holding them).
+# The optional KLL sketches (include_sketches) are excluded from the guarantee: a sketch
+# depends on the order of its compactions. Aggregates are merged in partition order, so
+# the same partitions always give the same sketches.
+#
+# The executor is pluggable: anything with map(func, tasks) -> results in task order
+# (e.g. a cluster backend wrapping client.map / gather) can replace the local process pool.
+MAX_EXACT_VALUES = 2048
+MAX_NEW_CLASSES = 1000
+FINE_BINS = 1000
+# Evidently's default threshold and floor for Wasserstein distance (normed)
+WASSERSTEIN_THRESHOLD = 0.1
+MIN_NORM = 0.001
+DRIFT_SHARE = 0.5
+# Evidently tests numerical columns with at most this many distinct values as discrete
+MAX_DISCRETE_VALUES = 5
+P_VALUE_THRESHOLD = 0.05
+# Mantissas are split in two halves so per-exponent sums of a chunk (up to 2^36 values) stay within int64
+MANTISSA_BITS = 53
+LOW_BITS = 26
+
+class ExactSum:
+    '''Exact, mergeable sum of float64 values: mantissa * 2**exponent with an integer mantissa.'''
+
+    def __init__(self, mantissa=0, exponent=0, non_finite=0.0):
+        self.mantissa = int(mantissa)
+        self.exponent = int(exponent)
+        # inf/-inf/nan terms; their sum does not depend on the order
+        self.non_finite = float(non_finite)
+
+    def _add(self, mantissa, exponent):
+        if exponent < self.exponent:
+            self.mantissa <<= self.exponent - exponent
+            self.exponent = exponent
+        self.mantissa += mantissa << (exponent - self.exponent)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        finite = np.isfinite(values)
+        if not finite.all():
+            self.non_finite += float(np.sum(values[~finite]))
+            values = values[finite]
+        values = values[values != 0]
+        if len(values) == 0:
+            return self
+        fractions, exponents = np.frexp(values)
+        mantissas = (fractions * 2.0 ** MANTISSA_BITS).astype(np.int64)
+        exponents = exponents.astype(np.int64) - MANTISSA_BITS
+        # Sum the mantissas per exponent, as two int64 halves (arithmetic shift keeps the sign)
+        order = np.argsort(exponents, kind='stable')
+        exponents, mantissas = exponents[order], mantissas[order]
+        starts = np.flatnonzero(np.r_[True, exponents[1:] != exponents[:-1]])
+        high = np.add.reduceat(mantissas >> LOW_BITS, starts)
+        low = np.add.reduceat(mantissas & ((1 << LOW_BITS) - 1), starts)
+        for exponent, high_sum, low_sum in zip(exponents[starts].tolist(), high.tolist(), low.tolist()):
+            self._add((high_sum << LOW_BITS) + low_sum, exponent)
+        return self
+
+    def merge(self, other):
+        self.non_finite += other.non_finite
+        self._add(other.mantissa, other.exponent)
+        return self
+
+    def fraction(self):
+        return Fraction(self.mantissa) * Fraction(2) ** self.exponent
+
+    def to_float(self):
+        return float(self.fraction()) + self.non_finite
+
+    def to_dict(self):
+        return {"mantissa": self.mantissa, "exponent": self.exponent, "non_finite": self.non_finite}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["mantissa"], state["exponent"], state["non_finite"])
+
+
+# Function to compute the reference cells of one numerical feature
+def reference_cells(values, max_exact_values=MAX_EXACT_VALUES, fine_bins=FINE_BINS):
+    '''Return (cell points, exact): the distinct reference values, or its quantiles.'''
+    values = values[~np.isnan(values)]
+    points = np.unique(values)
+    if len(points) <= max_exact_values:
+        return points, True
+    return np.unique(np.quantile(values, np.linspace(0, 1, fine_bins + 1))), False
+
+# Function to assign values to the 2r+1 cells around r points
+def cell_codes(values, points):
+    '''Cell 2i+1 holds values equal to points[i]; cell 2i the open interval below it.'''
+    index = np.searchsorted(points, values, side='left')
+    equal = (index < len(points)) & (points[np.minimum(index, len(points) - 1)] == values)
+    return 2 * index + equal
+
+# Function to count the classes of a column, keyed on their stripped string form
+def class_counts(values):
+    '''{label: count} of the non-missing values, labels normalised as in check_for_new_classes.'''
+    raw_counts = values.value_counts()
+    labels = raw_counts.index.astype(str).str.strip()
+    return {label: int(count) for label, count in raw_counts.groupby(labels).sum().items()}
+
+# Function to build the plan that every worker applies to its partitions
+def build_plan(reference, column_mapping, reference_profile, chunksize=DEFAULT_CHUNKSIZE, include_sketches=False,
+               max_exact_values=MAX_EXACT_VALUES, fine_bins=FINE_BINS):
+    '''Plain dicts and arrays only, so the plan pickles cheaply to every task.'''
+    numerical_features = list(column_mapping.numerical_features or [])
+    categorical_features = list(column_mapping.categorical_features or [])
+    # A numeric target/prediction has a profile histogram; any other one is tested on its classes
+    target_columns = [column for column in (column_mapping.target, column_mapping.prediction)
+                      if isinstance(column, str) and column in reference.columns]
+    numerical_targets = [column for column in target_columns if column in reference_profile["histograms"]]
+    drift_columns = numerical_features + numerical_targets
+    class_columns = categorical_features + [column for column in target_columns if column not in numerical_targets]
+
+    columns = {}
+    for column in drift_columns:
+        values = reference[column].to_numpy(dtype=float)
+        points, exact = reference_cells(values, max_exact_values, fine_bins)
+        valid = values[~np.isnan(values)]
+        histogram = reference_profile["histograms"][column]
+        columns[column] = {
+            "center": float(np.mean(valid)) if len(valid) else 0.0,
+            "bin_edges": np.asarray(histogram["bin_edges"], dtype=float),
+            "reference_bin_counts": np.asarray(histogram["counts"], dtype=np.int64),
+            "points": points,
+            "exact": exact,
+            # Few enough values that Evidently may test the column on its value counts
+            "discrete": exact and len(points) <= MAX_DISCRETE_VALUES,
+            "reference_cell_counts": np.bincount(cell_codes(valid, points), minlength=2 * len(points) + 1),
+            "moments": reference_profile["moments"].get(column) or {
+                "mean": float(np.mean(valid)), "std": float(np.std(valid, ddof=1)),
+                "var": float(np.var(valid, ddof=1))},
+        }
+    return {
+        "numerical_features": numerical_features,
+        "categorical_features": categorical_features,
+        "target_columns": target_columns,
+        "columns": columns,
+        "class_columns": {column: class_counts(reference[column]) for column in class_columns},
+        "class_features": numerical_features + categorical_features,
+        "class_vocabularies": reference_profile["class_vocabularies"],
+        "record_count_reference": reference_profile["record_count"],
+        "chunksize": chunksize,
+        "include_sketches": include_sketches,
+    }
+
+
+class ColumnAggregate:
+    '''Additive state of one numerical column of the current data.'''
+
+    def __init__(self, spec):
+        self.count = 0
+        self.total = ExactSum()
+        self.total_squares = ExactSum()
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.bin_counts = np.zeros(len(spec["bin_edges"]) - 1, dtype=np.int64)
+        self.cell_counts = np.zeros(2 * len(spec["points"]) + 1, dtype=np.int64)
+        # {value: count} while the column has at most MAX_DISCRETE_VALUES distinct values, else None
+        self.value_counts = {} if spec["discrete"] else None
+
+    def _add_value_counts(self, values, counts):
+        for value, count in zip(values, counts):
+            self.value_counts[value] = self.value_counts.get(value, 0) + count
+        if len(self.value_counts) > MAX_DISCRETE_VALUES:
+            self.value_counts = None
+
+    def update(self, values, spec):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        shifted = values - spec["center"]
+        self.total.update(shifted)
+        self.total_squares.update(shifted * shifted)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        # Same binning as FixedBinHistogram: out-of-range values go to the end bins
+        n_bins = len(self.bin_counts)
+        bins = np.clip(np.searchsorted(spec["bin_edges"], values, side='right') - 1, 0, n_bins - 1)
+        self.bin_counts += np.bincount(bins, minlength=n_bins)
+        self.cell_counts += np.bincount(cell_codes(values, spec["points"]), minlength=len(self.cell_counts))
+        if self.value_counts is not None:
+            distinct, counts = np.unique(values, return_counts=True)
+            self._add_value_counts(distinct.tolist(), counts.tolist())
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.total.merge(other.total)
+        self.total_squares.merge(other.total_squares)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.bin_counts += other.bin_counts
+        self.cell_counts += other.cell_counts
+        if self.value_counts is not None and other.value_counts is not None:
+            self._add_value_counts(list(other.value_counts), list(other.value_counts.values()))
+        else:
+            self.value_counts = None
+        return self
+
+    def moments(self, center):
+        '''Mean, std and variance (ddof=1), derived exactly and rounded once.'''
+        if self.count == 0:
+            return {"mean": float('nan'), "std": float('nan'), "var": float('nan')}
+        total, total_squares = self.total.fraction(), self.total_squares.fraction()
+        mean = float(Fraction(center) + total / self.count) + self.total.non_finite
+        if self.count < 2:
+            var = float('nan')
+        else:
+            var = float((total_squares - total * total / self.count) / (self.count - 1)) + self.total_squares.non_finite
+        return {"mean": mean, "std": float(np.sqrt(var)), "var": var}
+
+    def to_dict(self):
+        return {"count": self.count, "total": self.total.to_dict(), "total_squares": self.total_squares.to_dict(),
+                "min": self.min, "max": self.max, "bin_counts": self.bin_counts.tolist(),
+                "cell_counts": self.cell_counts.tolist(),
+                "value_counts": None if self.value_counts is None else sorted(self.value_counts.items())}
+
+    @classmethod
+    def from_dict(cls, state):
+        aggregate = cls.__new__(cls)
+        aggregate.count = state["count"]
+        aggregate.total = ExactSum.from_dict(state["total"])
+        aggregate.total_squares = ExactSum.from_dict(state["total_squares"])
+        aggregate.min, aggregate.max = state["min"], state["max"]
+        aggregate.bin_counts = np.asarray(state["bin_counts"], dtype=np.int64)
+        aggregate.cell_counts = np.asarray(state["cell_counts"], dtype=np.int64)
+        aggregate.value_counts = None if state["value_counts"] is None else dict(state["value_counts"])
+        return aggregate
+
+
+class PartitionAggregate:
+    '''Mergeable partial aggregates of one or more current partitions.'''
+
+    def __init__(self, plan, partitions=()):
+        self.partitions = list(partitions)
+        self.row_count = 0
+        self.columns = {column: ColumnAggregate(spec) for column, spec in plan["columns"].items()}
+        # Counts of the classes outside the reference vocabulary, keyed on the stripped string
+        # form (as check_for_new_classes), and the number of rows holding any of them
+        self.new_class_counts = {feature: {} for feature in plan["class_features"]}
+        self.new_class_rows = {feature: 0 for feature in plan["class_features"]}
+        # Full class counts of the categorical columns, for their drift tests
+        self.class_counts = {column: {} for column in plan["class_columns"]}
+        self._vocabularies = None
+        self.sketches = None
+        if plan["include_sketches"]:
+            from quantile_sketch import FeatureSketches
+
+            self.sketches = FeatureSketches(list(plan["columns"]))
+
+    def update(self, chunk, plan):
+        self.row_count += len(chunk)
+        for column, aggregate in self.columns.items():
+            aggregate.update(chunk[column].to_numpy(dtype=float), plan["columns"][column])
+        if self._vocabularies is None:
+            self._vocabularies = {feature: set(plan["class_vocabularies"].get(feature, []))
+                                  for feature in self.new_class_counts}
+        chunk_counts = {column: class_counts(chunk[column])
+                        for column in set(self.new_class_counts) | set(self.class_counts)}
+        for feature, counts in self.new_class_counts.items():
+            for label, count in chunk_counts[feature].items():
+                if label not in self._vocabularies[feature]:
+                    counts[label] = counts.get(label, 0) + count
+                    self.new_class_rows[feature] += count
+            self._cap_new_classes(feature)
+        for column, counts in self.class_counts.items():
+            for label, count in chunk_counts[column].items():
+                counts[label] = counts.get(label, 0) + count
+        if self.sketches is not None:
+            self.sketches.update(chunk)
+        return self
+
+    def _cap_new_classes(self, feature):
+        counts = self.new_class_counts[feature]
+        if len(counts) > MAX_NEW_CLASSES:
+            self.new_class_counts[feature] = {label: counts[label] for label in sorted(counts)[:MAX_NEW_CLASSES]}
+
+    def merge(self, other):
+        self.partitions += other.partitions
+        self.row_count += other.row_count
+        for column, aggregate in self.columns.items():
+            aggregate.merge(other.columns[column])
+        for feature, counts in self.new_class_counts.items():
+            for label, count in other.new_class_counts[feature].items():
+                counts[label] = counts.get(label, 0) + count
+            self.new_class_rows[feature] += other.new_class_rows[feature]
+            self._cap_new_classes(feature)
+        for column, counts in self.class_counts.items():
+            for label, count in other.class_counts[column].items():
+                counts[label] = counts.get(label, 0) + count
+        if self.sketches is not None and other.sketches is not None:
+            self.sketches.merge(other.sketches)
+        return self
+
+    def to_dict(self):
+        return {"partitions": self.partitions, "row_count": self.row_count,
+                "columns": {column: aggregate.to_dict() for column, aggregate in self.columns.items()},
+                "new_class_counts": self.new_class_counts, "new_class_rows": self.new_class_rows,
+                "class_counts": self.class_counts,
+                "sketches": None if self.sketches is None else self.sketches.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state, plan):
+        aggregate = cls(dict(plan, include_sketches=False), state["partitions"])
+        aggregate.row_count = state["row_count"]
+        aggregate.columns = {column: ColumnAggregate.from_dict(column_state)
+                             for column, column_state in state["columns"].items()}
+        aggregate.new_class_counts = {feature: dict(counts) for feature, counts in state["new_class_counts"].items()}
+        aggregate.new_class_rows = dict(state["new_class_rows"])
+        aggregate.class_counts = {column: dict(counts) for column, counts in state["class_counts"].items()}
+        if state.get("sketches") is not None:
+            from quantile_sketch import FeatureSketches
+
+            aggregate.sketches = FeatureSketches.from_dict(state["sketches"])
+        return aggregate
+
+
+# Function executed by the workers: aggregate one partition in bounded chunks
+def aggregate_partition(task):
+    plan, path = task
+    columns = sorted(set(plan["columns"]) | set(plan["class_features"]) | set(plan["class_columns"]))
+    aggregate = PartitionAggregate(plan, [path])
+    for chunk in iter_chunks(path, columns, plan["chunksize"]):
+        aggregate.update(chunk, plan)
+    return aggregate
+
+
+class PartitionExecutor:
+    '''Interface of the map step: map(func, tasks) returns [func(task) for task in tasks], in order.
+
+    A cluster backend implements map (and close); func and the tasks are picklable.
+    '''
+    name = 'base'
+
+    def map(self, func, tasks):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SequentialExecutor(PartitionExecutor):
+    '''Aggregate the partitions one after another in the calling process.'''
+    name = 'sequential'
+
+    def map(self, func, tasks):
+        return [func(task) for task in tasks]
+
+
+class LocalProcessExecutor(PartitionExecutor):
+    '''Aggregate the partitions on a local process pool (the default).'''
+    name = 'process'
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+    def map(self, func, tasks):
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(func, tasks))
+
+
+EXECUTORS = {'sequential': SequentialExecutor, 'process': LocalProcessExecutor}
+
+# Function to resolve an executor name or instance
+def get_executor(executor='process', max_workers=None):
+    if isinstance(executor, PartitionExecutor):
+        return executor
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}', expected one of {tuple(EXECUTORS)} or a PartitionExecutor")
+    return LocalProcessExecutor(max_workers) if executor == 'process' else SequentialExecutor()
+
+# Function to list the partition files of a path, directory or glob pattern
+def resolve_partitions(partitions):
+    if isinstance(partitions, str):
+        if os.path.isdir(partitions):
+            partitions = os.path.join(partitions, '*.parquet')
+        partitions = sorted(glob.glob(partitions)) if glob.has_magic(partitions) else [partitions]
+    partitions = [os.path.abspath(path) for path in partitions]
+    if not partitions:
+        raise ValueError("No current partitions to aggregate")
+    return partitions
+
+# Function to merge the partial aggregates of all partitions
+def reduce_aggregates(aggregates):
+    '''Merged in partition order, so the result does not depend on the order the map step returns.'''
+    aggregates = sorted(aggregates, key=lambda aggregate: aggregate.partitions)
+    merged = aggregates[0]
+    for aggregate in aggregates[1:]:
+        merged.merge(aggregate)
+    return merged
+
+# Function to test a categorical column from its reference and current class counts
+def categorical_column_drift(column, reference_counts, current_counts):
+    from drift_engine import categorical_drift
+
+    labels = sorted(set(reference_counts) | set(current_counts))
+    return {"column_name": column,
+            **categorical_drift([reference_counts.get(label, 0) for label in labels],
+                                [current_counts.get(label, 0) for label in labels])}
+
+# Function to test a numerical column from its reference and current cell counts
+def numerical_column_drift(column, spec, column_aggregate):
+    from ks_engine import ks_from_counts
+    from segmented_drift import wasserstein_from_counts
+    from drift_engine import block_psi, categorical_drift, LARGE_SAMPLE_ROWS
+
+    points = spec["points"]
+    reference_counts, current_counts = spec["reference_cell_counts"], column_aggregate.cell_counts
+    if len(points) == 0 or column_aggregate.count == 0:
+        return {"column_name": column, "column_type": "num", "drift_score": float('nan'), "drift_detected": False}
+    ks_statistic, ks_p_value = ks_from_counts(reference_counts, current_counts)
+    # Cell positions: the points, and the midpoints of the open cells (the outer ones reach the current min/max)
+    lower, upper = min(column_aggregate.min, points[0]), max(column_aggregate.max, points[-1])
+    bounds = np.concatenate([[lower], points, [upper]])
+    positions = np.empty(len(current_counts))
+    positions[1::2] = points
+    positions[0::2] = (bounds[:-1] + bounds[1:]) / 2
+    wasserstein = float(wasserstein_from_counts(reference_counts, current_counts, positions))
+
+    # Evidently's default test for the column: at most MAX_DISCRETE_VALUES distinct values in
+    # reference and current together are tested on their value counts, like categories
+    values = None if column_aggregate.value_counts is None else sorted(set(points) | set(column_aggregate.value_counts))
+    if values is not None and len(values) <= MAX_DISCRETE_VALUES:
+        reference_value_counts = dict(zip(points.tolist(), reference_counts[1::2].tolist()))
+        test = categorical_drift([reference_value_counts.get(value, 0) for value in values],
+                                 [column_aggregate.value_counts.get(value, 0) for value in values])
+        stattest_name, threshold = test["stattest_name"], test["stattest_threshold"]
+        drift_score, drift_detected = test["drift_score"], test["drift_detected"]
+    elif reference_counts.sum() <= LARGE_SAMPLE_ROWS:
+        stattest_name, threshold, drift_score = "K-S p_value", P_VALUE_THRESHOLD, float(ks_p_value)
+        drift_detected = drift_score < threshold
+    else:
+        stattest_name, threshold = "Wasserstein distance (normed)", WASSERSTEIN_THRESHOLD
+        drift_score = wasserstein / max(spec["moments"]["std"], MIN_NORM)
+        drift_detected = drift_score >= threshold
+    return {
+        "column_name": column,
+        "column_type": "num",
+        "stattest_name": stattest_name,
+        "stattest_threshold": threshold,
+        "drift_score": drift_score,
+        "drift_detected": bool(drift_detected),
+        "psi": float(block_psi(spec["reference_bin_counts"], column_aggregate.bin_counts)),
+        "ks_statistic": float(ks_statistic),
+        "ks_p_value": float(ks_p_value),
+        "wasserstein": wasserstein,
+        "exact_cells": spec["exact"],
+    }
+
+# Function to test one column from the merged aggregates
+def column_drift(plan, aggregate, column):
+    if column in plan["class_columns"]:
+        return categorical_column_drift(column, plan["class_columns"][column], aggregate.class_counts[column])
+    return numerical_column_drift(column, plan["columns"][column], aggregate.columns[column])
+
+# Function to derive a drift block (DataDriftTable, and optionally DatasetDriftMetric) from merged aggregates
+def drift_block(plan, aggregate, columns, dataset_metric=False):
+    drift_by_columns = {column: column_drift(plan, aggregate, column) for column in columns}
+
+    number_of_drifted_columns = sum(column["drift_detected"] for column in drift_by_columns.values())
+    share_of_drifted_columns = number_of_drifted_columns / len(drift_by_columns) if drift_by_columns else 0.0
+    summary = {
+        "number_of_columns": len(drift_by_columns),
+        "number_of_drifted_columns": number_of_drifted_columns,
+        "share_of_drifted_columns": share_of_drifted_columns,
+        "dataset_drift": share_of_drifted_columns >= DRIFT_SHARE,
+    }
+    metrics = [{"metric": "DataDriftTable", "result": {**summary, "drift_by_columns": drift_by_columns}}]
+    if dataset_metric:
+        metrics.insert(0, {"metric": "DatasetDriftMetric", "result": {"drift_share": DRIFT_SHARE, **summary}})
+    return {"metrics": metrics}
+
+# Function to build final_results from the merged aggregates
+def results_from_aggregate(plan, aggregate, source_system, user, model_version):
+    statistics = {}
+    for feature in plan["numerical_features"]:
+        reference_moments = plan["columns"][feature]["moments"]
+        current_moments = aggregate.columns[feature].moments(plan["columns"][feature]["center"])
+        statistics[feature] = {
+            'mean_reference': reference_moments['mean'],
+            'std_reference': reference_moments['std'],
+            'var_reference': reference_moments['var'],
+            'mean_current': current_moments['mean'],
+            'std_current': current_moments['std'],
+            'var_current': current_moments['var']
+        }
+
+    new_classes_detected = {feature: sorted(counts) for feature, counts in aggregate.new_class_counts.items() if counts}
+
+    metadata = {
+        "event_timestamp": datetime.datetime.now().isoformat(),
+        "event_type": 'model run',
+        "load_date": datetime.date.today().isoformat(),
+        "record_count_reference": plan["record_count_reference"],
+        "record_count_current": aggregate.row_count,
+        "source_system": source_system,
+        "user": user,
+        "model_version": model_version,
+        "new_class_detected": "yes" if new_classes_detected else "no",
+        "new_class_details": ", ".join(f"{feature}: {classes}" for feature, classes in new_classes_detected.items())
+        if new_classes_detected else "None",
+        "new_class_rows": {feature: rows for feature, rows in aggregate.new_class_rows.items() if rows},
+        "partitions": len(aggregate.partitions),
+    }
+    final_results = {
+        "metadata": metadata,
+        # Like the Evidently report: target and prediction, numerical, then categorical features
+        "data_drift_metrics": drift_block(plan, aggregate, plan["target_columns"] + plan["numerical_features"]
+                                          + plan["categorical_features"], dataset_metric=True),
+        # One ColumnDriftMetric per target/prediction column, as TargetDriftPreset starts with
+        "target_drift_metrics": {"metrics": [
+            {"metric": "ColumnDriftMetric", "result": column_drift(plan, aggregate, column)}
+            for column in plan["target_columns"]]},
+        "statistical_summary": statistics,
+    }
+    if aggregate.sketches is not None:
+        final_results["current_sketches"] = aggregate.sketches.to_dict()
+    return final_results
+
+# Main function to monitor a current window stored as partitions
+def monitor_partitions(reference, partitions, column_mapping, source_system, user, model_version,
+                       reference_profile=None, executor='process', max_workers=None, output_dir='.',
+                       result_store=None, chunksize=DEFAULT_CHUNKSIZE, include_sketches=False, metrics_file=None):
+    """Map/reduce counterpart of monitor_model_data for a current window that does not fit in memory.
+
+    partitions is a list of Parquet/CSV files, a directory of Parquet files or a glob
+    pattern. Every partition is aggregated in chunks of `chunksize` rows by the executor
+    ('process', 'sequential' or a PartitionExecutor); the results are saved like
+    monitor_model_data's (JSON and Excel, or the result store) and returned. The target
+    drift block only has the ColumnDriftMetric entries of Evidently's TargetDriftPreset.
+    """
+    from Monitoring import save_results_as_files
+    from instrumentation import measure, write_metrics
+    from reference_profile import build_reference_profile
+
+    os.makedirs(output_dir, exist_ok=True)
+    if reference_profile is None:
+        reference_profile = build_reference_profile(reference, column_mapping, model_version)
+    partitions = resolve_partitions(partitions)
+    executor = get_executor(executor, max_workers)
+
+    stage_timings = {}
+    with measure(rows=len(reference)) as stage_timings["plan"]:
+        plan = build_plan(reference, column_mapping, reference_profile, chunksize, include_sketches)
+    with measure() as stage_timings["map"]:
+        aggregates = executor.map(aggregate_partition, [(plan, path) for path in partitions])
+    with measure() as stage_timings["reduce"]:
+        aggregate = reduce_aggregates(aggregates)
+        final_results = results_from_aggregate(plan, aggregate, source_system, user, model_version)
+    stage_timings["map"]["rows"] = aggregate.row_count
+    final_results["metadata"]["executor"] = executor.name
+    final_results["metadata"]["stage_timings"] = stage_timings
+
+    with measure() as save_timing:
+        if result_store:
+            from result_store import append_results
+
+            append_results(final_results, result_store)
+        else:
+            save_results_as_files(final_results, output_dir)
+    stage_timings["save"] = save_timing
+    if metrics_file:
+        write_metrics(final_results["metadata"], metrics_file)
+    return final_results
+
+
+# Example usage
+if __name__ == "__main__":
+    import json
+    import tempfile
+    from batch_runner import build_column_mapping
+    from reference_profile import build_reference_profile
+
+    with open('monitor_config_example.json') as json_file:
+        config = json.load(json_file)
+    column_mapping = build_column_mapping(config["column_mapping"])
+    data = pd.read_csv('sample_data.csv')
+    reference, current = data.iloc[:12000], data.iloc[12000:17379]
+    reference_profile = build_reference_profile(reference, column_mapping, '1.0.0')
+
+    # The same current rows split into 1, 3 and 7 Parquet partitions give identical results
+    outputs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n_partitions in (1, 3, 7):
+            partition_dir = os.path.join(directory, f"partitions_{n_partitions}")
+            os.makedirs(partition_dir)
+            for index, rows in enumerate(np.array_split(np.arange(len(current)), n_partitions)):
+                current.iloc[rows].to_parquet(os.path.join(partition_dir, f"part_{index:03d}.parquet"), index=False)
+            results = monitor_partitions(reference, partition_dir, column_mapping, 'ECR', 'admin_user', '1.0.0',
+                                         reference_profile, output_dir=os.path.join(directory, 'output'),
+                                         chunksize=1000)
+            outputs.append(json.dumps({key: value for key, value in results.items() if key != 'metadata'}))
+            print(f"{n_partitions} partition(s): {results['metadata']['stage_timings']['map']['seconds']:.2f}s map")
+    print("Identical across partitionings:", len(set(outputs)) == 1)
+    print(json.dumps(results["statistical_summary"]["temp"], indent=4))
@@ -0,0 +1,334 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.spatial import distance
+
+# Columnar drift engine.
+#
+# All numerical features are handled as one 2-D float block (rows x features) and
+# every statistic is computed with a handful of batched array operations instead of
+# a Python loop with separate pandas reductions per column. Categorical features go
+# through factorized integer codes and are tested on their class counts with the test
+# Evidently picks by default (Jensen-Shannon distance above LARGE_SAMPLE_ROWS reference
+# rows, chi-square or Z-test p-values below). Numerical columns get Evidently's defaults
+# too: Wasserstein distance normed by the reference std (floored at MIN_NORM), the K-S
+# p-value for references of at most LARGE_SAMPLE_ROWS values, and the categorical test
+# on the value counts for columns with at most MAX_DISCRETE_VALUES distinct values.
+# compute_drift returns the same pieces that
+# monitor_model_data puts in its results (statistical summary, new-class flag and
+# details, a DataDriftTable-shaped drift block); the drift block covers the features it
+# is given, so unlike the Evidently report it has no row for the target or prediction.
+DEFAULT_BINS = 10
+PSI_EPSILON = 1e-10
+WASSERSTEIN_THRESHOLD = 0.1  # Evidently's default threshold for "Wasserstein distance (normed)"
+JENSEN_SHANNON_THRESHOLD = 0.1  # Evidently's default threshold for "Jensen-Shannon distance"
+P_VALUE_THRESHOLD = 0.05
+LARGE_SAMPLE_ROWS = 1000  # Evidently uses distances above this many reference rows, p-values below
+DRIFT_SHARE = 0.5
+MIN_NORM = 0.001  # Evidently's floor on the reference std of the normed Wasserstein distance
+MAX_DISCRETE_VALUES = 5  # Evidently tests numerical columns with at most this many values like categories
+
+# Function to convert feature columns into a 2-D float block
+def to_block(df, features):
+    return df[list(features)].to_numpy(dtype=float)
+
+# Function to compute the moments of every column of a block
+def block_moments(block):
+    """NaN-aware count, mean, std and variance per column (ddof=1, like pandas)."""
+    count = np.sum(~np.isnan(block), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(block, axis=0) / count
+        var = np.nansum((block - mean) ** 2, axis=0) / (count - 1)
+    var = np.where(count > 1, var, np.nan)
+    return {"count": count, "mean": mean, "std": np.sqrt(var), "var": var}
+
+# Function to compute equal-width bin edges for every column of a block
+def block_bin_edges(block, bins=DEFAULT_BINS):
+    """(features x bins+1) edges spanning each column's range, like np.histogram(bins=int)."""
+    lo = np.nanmin(block, axis=0)
+    hi = np.nanmax(block, axis=0)
+    # np.histogram widens a zero-width range by 0.5 on each side
+    same = lo == hi
+    lo = np.where(same, lo - 0.5, lo)
+    hi = np.where(same, hi + 0.5, hi)
+    return lo[:, None] + (hi - lo)[:, None] * np.linspace(0, 1, bins + 1)[None, :]
+
+# Function to assign every value of a block to a bin of its column's fixed edges
+def block_bin_codes(block, bin_edges):
+    """Bin index per value (rows x features); out-of-range values go to the end bins, NaN gets -1.
+
+    A value's bin is the number of interior edges it reaches (a right-sided searchsorted per
+    column), which matches np.histogram (last bin closed). Binning column by column keeps the
+    temporaries at one column's size, however many features and bins there are.
+    """
+    codes = np.empty(block.shape, dtype=np.int64)
+    for j in range(block.shape[1]):
+        codes[:, j] = np.searchsorted(bin_edges[j, 1:-1], block[:, j], side='right')
+    codes[np.isnan(block)] = -1
+    return codes
+
+# Function to histogram every column of a block on its own fixed edges
+def block_histograms(block, bin_edges):
+    """Counts (features x bins) using per-column edges, binning one column at a time to bound memory."""
+    n_features, n_edges = bin_edges.shape
+    n_bins = n_edges - 1
+    counts = np.zeros((n_features, n_bins), dtype=np.int64)
+    for j in range(n_features):
+        column = block[:, j]
+        column = column[~np.isnan(column)]
+        codes = np.searchsorted(bin_edges[j, 1:-1], column, side='right')
+        counts[j] = np.bincount(codes, minlength=n_bins)
+    return counts
+
+# Function to compute PSI for every feature from aligned histograms (bins on the last axis)
+def block_psi(expected_counts, actual_counts, epsilon=PSI_EPSILON):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = expected_counts / expected_counts.sum(axis=-1, keepdims=True)
+        actual = actual_counts / actual_counts.sum(axis=-1, keepdims=True)
+
+    # Add epsilon to prevent log(0) and division by zero
+    expected = np.where(expected == 0, epsilon, expected)
+    actual = np.where(actual == 0, epsilon, actual)
+    return np.sum((expected - actual) * np.log(expected / actual), axis=-1)
+
+# Function to compute KS and Wasserstein distance for every column at once
+def block_ks_wasserstein(reference_block, current_block):
+    """Two-sample KS statistic, asymptotic p-value and Wasserstein-1 distance per column.
+
+    One batched argsort over the stacked reference and current data gives both empirical
+    CDFs; the statistics match scipy's ks_2samp / wasserstein_distance. Columns containing
+    NaNs have differing sample sizes and are computed separately after dropping the NaNs.
+    """
+    n_ref, n_cur = len(reference_block), len(current_block)
+    n_features = reference_block.shape[1]
+    ks = np.full(n_features, np.nan)
+    wasserstein = np.full(n_features, np.nan)
+
+    has_nan = np.isnan(reference_block).any(axis=0) | np.isnan(current_block).any(axis=0)
+    dense = np.flatnonzero(~has_nan)
+    if len(dense) and n_ref and n_cur:
+        stacked = np.concatenate([reference_block[:, dense], current_block[:, dense]], axis=0)
+        order = np.argsort(stacked, axis=0, kind='stable')
+        values = np.take_along_axis(stacked, order, axis=0)
+        from_reference = order < n_ref
+        cdf_gap = np.cumsum(from_reference, axis=0) / n_ref - np.cumsum(~from_reference, axis=0) / n_cur
+
+        # The CDFs are only compared after the last of a run of tied values
+        run_end = np.ones_like(values, dtype=bool)
+        run_end[:-1] = values[1:] != values[:-1]
+        ks[dense] = np.max(np.where(run_end, np.abs(cdf_gap), 0.0), axis=0)
+        wasserstein[dense] = np.sum(np.abs(cdf_gap[:-1]) * np.diff(values, axis=0), axis=0)
+
+    for j in np.flatnonzero(has_nan):
+        ref = reference_block[:, j][~np.isnan(reference_block[:, j])]
+        cur = current_block[:, j][~np.isnan(current_block[:, j])]
+        if len(ref) and len(cur):
+            ks[j] = stats.ks_2samp(ref, cur, method='asymp').statistic
+            wasserstein[j] = stats.wasserstein_distance(ref, cur)
+
+    # Asymptotic p-value from the limiting Kolmogorov distribution. It is vectorized, unlike
+    # kstwo.sf used by ks_2samp(method='asymp'), and agrees with it closely for large samples.
+    en = n_ref * n_cur / (n_ref + n_cur) if n_ref and n_cur else np.nan
+    ks_p_value = stats.kstwobign.sf(ks * np.sqrt(en))
+    return ks, ks_p_value, wasserstein
+
+# Function to factorize categorical columns into codes shared by reference and current
+def factorize_columns(reference, current, features):
+    """Per-feature integer codes over a shared vocabulary, normalised like check_for_new_classes.
+
+    Values are factorized on their raw representation; only the unique values of non-numeric
+    columns are turned into stripped strings, so no per-row string is ever allocated. Numeric
+    columns keep their raw uniques as labels (their string form is already unique and unpadded).
+    """
+    factorized = {}
+    for feature in features:
+        values = pd.concat([reference[feature], current[feature]], ignore_index=True)
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        if pd.api.types.is_numeric_dtype(values):
+            factorized[feature] = (codes, np.asarray(uniques))
+            continue
+        # Merge raw uniques that collapse to the same stripped string (e.g. ' a' and 'a')
+        canonical_codes, labels = pd.factorize(pd.Index(uniques).astype(str).str.strip(), use_na_sentinel=False)
+        factorized[feature] = (canonical_codes[codes], np.asarray(labels))
+    return factorized
+
+# Function to count the classes of categorical columns in reference and current
+def class_counts(reference, current, features):
+    """{feature: (labels, reference_counts, current_counts)} over the shared vocabulary, NaN excluded."""
+    n_ref = len(reference)
+    counts = {}
+    for feature, (codes, labels) in factorize_columns(reference, current, features).items():
+        present = ~pd.isna(labels)
+        reference_counts = np.bincount(codes[:n_ref], minlength=len(labels))[present]
+        current_counts = np.bincount(codes[n_ref:], minlength=len(labels))[present]
+        counts[feature] = (labels[present], reference_counts, current_counts)
+    return counts
+
+# Function to test a categorical column for drift from its class counts
+def categorical_drift(reference_counts, current_counts):
+    """Evidently's default categorical test from aligned class counts (NaN excluded).
+
+    Jensen-Shannon distance of the class shares when the reference has more than
+    LARGE_SAMPLE_ROWS rows; otherwise the chi-square p-value (more than two classes) or the
+    two-proportion Z-test p-value. Returns the drift_by_columns fields of the test.
+    """
+    reference_counts = np.asarray(reference_counts, dtype=float)
+    current_counts = np.asarray(current_counts, dtype=float)
+    n_ref, n_cur = reference_counts.sum(), current_counts.sum()
+    if not n_ref or not n_cur:
+        score = np.nan
+        stattest_name, threshold = "Jensen-Shannon distance", JENSEN_SHANNON_THRESHOLD
+    elif n_ref > LARGE_SAMPLE_ROWS:
+        stattest_name, threshold = "Jensen-Shannon distance", JENSEN_SHANNON_THRESHOLD
+        score = float(distance.jensenshannon(reference_counts / n_ref, current_counts / n_cur))
+    elif np.count_nonzero(reference_counts + current_counts) > 2:
+        stattest_name, threshold = "chi-square p_value", P_VALUE_THRESHOLD
+        observed = reference_counts + current_counts > 0
+        score = float(stats.chisquare(current_counts[observed], reference_counts[observed] * n_cur / n_ref)[1])
+    else:
+        stattest_name, threshold = "Z-test p_value", P_VALUE_THRESHOLD
+        if np.count_nonzero(reference_counts + current_counts) < 2:
+            score = 1.0
+        else:
+            first = np.flatnonzero(reference_counts + current_counts)[0]
+            p_ref, p_cur = reference_counts[first] / n_ref, current_counts[first] / n_cur
+            pooled = (reference_counts[first] + current_counts[first]) / (n_ref + n_cur)
+            z = (p_ref - p_cur) / np.sqrt(pooled * (1 - pooled) * (1 / n_ref + 1 / n_cur))
+            score = float(2 * stats.norm.sf(abs(z)))
+    is_distance = stattest_name == "Jensen-Shannon distance"
+    return {
+        "column_type": "cat",
+        "stattest_name": stattest_name,
+        "stattest_threshold": threshold,
+        "drift_score": score,
+        "drift_detected": bool(score >= threshold if is_distance else score < threshold),
+    }
+
+# Function to test a numerical column for drift with Evidently's default test
+def numerical_drift(reference_values, current_values, wasserstein, reference_std):
+    """drift_by_columns test fields for one numerical column (NaN dropped from both samples).
+
+    Columns with at most MAX_DISCRETE_VALUES distinct values are tested on their value
+    counts like categorical_drift; otherwise the K-S p-value when the reference has at most
+    LARGE_SAMPLE_ROWS values, and the Wasserstein distance normed by the reference std above.
+    """
+    values = np.unique(np.concatenate([reference_values, current_values]))
+    if 0 < len(values) <= MAX_DISCRETE_VALUES:
+        reference_counts = np.bincount(np.searchsorted(values, reference_values), minlength=len(values))
+        current_counts = np.bincount(np.searchsorted(values, current_values), minlength=len(values))
+        return {**categorical_drift(reference_counts, current_counts), "column_type": "num"}
+    if 0 < len(reference_values) <= LARGE_SAMPLE_ROWS and len(current_values):
+        score = float(stats.ks_2samp(reference_values, current_values).pvalue)
+        return {"column_type": "num", "stattest_name": "K-S p_value", "stattest_threshold": P_VALUE_THRESHOLD,
+                "drift_score": score, "drift_detected": bool(score < P_VALUE_THRESHOLD)}
+    score = float(wasserstein / np.maximum(reference_std, MIN_NORM))
+    return {"column_type": "num", "stattest_name": "Wasserstein distance (normed)",
+            "stattest_threshold": WASSERSTEIN_THRESHOLD, "drift_score": score,
+            "drift_detected": bool(score >= WASSERSTEIN_THRESHOLD)}
+
+# Function to find classes in the current data that the reference has never seen
+def block_new_classes(reference, current, features):
+    """Return (flag, details, counts) with the same flag/details as check_for_new_classes."""
+    n_ref = len(reference)
+    if not features:
+        return "no", "None", {}
+    factorized = factorize_columns(reference, current, features)
+
+    # One bincount over all features: shift each feature's codes past the previous vocabulary
+    sizes = np.array([len(labels) for _, labels in factorized.values()], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    all_codes = [codes + offset for (codes, _), offset in zip(factorized.values(), offsets)]
+    ref_counts = np.bincount(np.concatenate([codes[:n_ref] for codes in all_codes]), minlength=sizes.sum())
+    cur_counts = np.bincount(np.concatenate([codes[n_ref:] for codes in all_codes]), minlength=sizes.sum())
+
+    new_classes_detected = {}
+    new_class_counts = {}
+    for feature, offset, size in zip(factorized, offsets, sizes):
+        labels = factorized[feature][1]
+        unseen = np.flatnonzero((ref_counts[offset:offset + size] == 0) & (cur_counts[offset:offset + size] > 0))
+        if len(unseen):
+            unseen_labels = labels[unseen].astype(str).tolist()
+            new_classes_detected[feature] = unseen_labels
+            new_class_counts[feature] = dict(zip(unseen_labels, cur_counts[offset + unseen].tolist()))
+
+    if new_classes_detected:
+        details = ", ".join([f"{feature}: {classes}" for feature, classes in new_classes_detected.items()])
+        return "yes", details, new_class_counts
+    return "no", "None", new_class_counts
+
+# Function to compute drift and statistics for all features in batched operations
+def compute_drift(reference, current, numerical_features, categorical_features=(), bins=DEFAULT_BINS,
+                  reference_profile=None):
+    """Vectorized counterpart of calculate_statistics, check_for_new_classes and the drift table.
+
+    When a reference profile is given its moments and histogram edges/counts are reused.
+    """
+    numerical_features = list(numerical_features)
+    reference_block = to_block(reference, numerical_features)
+    current_block = to_block(current, numerical_features)
+
+    if reference_profile is not None:
+        profile_moments = [reference_profile["moments"][feature] for feature in numerical_features]
+        reference_moments = {key: np.array([moments[key] for moments in profile_moments])
+                             for key in ("mean", "std", "var")}
+        bin_edges = np.array([reference_profile["histograms"][feature]["bin_edges"] for feature in numerical_features])
+        reference_counts = np.array([reference_profile["histograms"][feature]["counts"]
+                                     for feature in numerical_features])
+    else:
+        reference_moments = block_moments(reference_block)
+        bin_edges = block_bin_edges(reference_block, bins)
+        reference_counts = block_histograms(reference_block, bin_edges)
+
+    current_moments = block_moments(current_block)
+    psi = block_psi(reference_counts, block_histograms(current_block, bin_edges))
+    ks, ks_p_value, wasserstein = block_ks_wasserstein(reference_block, current_block)
+
+    statistics = {}
+    drift_by_columns = {}
+    for j, feature in enumerate(numerical_features):
+        statistics[feature] = {
+            'mean_reference': float(reference_moments["mean"][j]),
+            'std_reference': float(reference_moments["std"][j]),
+            'var_reference': float(reference_moments["var"][j]),
+            'mean_current': float(current_moments["mean"][j]),
+            'std_current': float(current_moments["std"][j]),
+            'var_current': float(current_moments["var"][j])
+        }
+        reference_values = reference_block[:, j][~np.isnan(reference_block[:, j])]
+        current_values = current_block[:, j][~np.isnan(current_block[:, j])]
+        drift_by_columns[feature] = {
+            "column_name": feature,
+            **numerical_drift(reference_values, current_values, wasserstein[j], reference_moments["std"][j]),
+            "psi": float(psi[j]),
+            "ks_statistic": float(ks[j]),
+            "ks_p_value": float(ks_p_value[j]),
+            "wasserstein": float(wasserstein[j]),
+        }
+
+    for feature, (_, reference_counts, current_counts) in class_counts(reference, current,
+                                                                        categorical_features).items():
+        drift_by_columns[feature] = {"column_name": feature, **categorical_drift(reference_counts, current_counts)}
+
+    new_class_flag, new_class_details, new_class_counts = block_new_classes(
+        reference, current, numerical_features + list(categorical_features))
+
+    number_of_drifted_columns = sum(column["drift_detected"] for column in drift_by_columns.values())
+    share_of_drifted_columns = number_of_drifted_columns / len(drift_by_columns) if drift_by_columns else 0.0
+    return {
+        "new_class_detected": new_class_flag,
+        "new_class_details": new_class_details,
+        "new_class_counts": new_class_counts,
+        "data_drift_metrics": {
+            "metrics": [{
+                "metric": "DataDriftTable",
+                "result": {
+                    "number_of_columns": len(drift_by_columns),
+                    "number_of_drifted_columns": number_of_drifted_columns,
+                    "share_of_drifted_columns": share_of_drifted_columns,
+                    "dataset_drift": share_of_drifted_columns >= DRIFT_SHARE,
+                    "drift_by_columns": drift_by_columns,
+                }
+            }]
+        },
+        "statistical_summary": statistics,
+    }
@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import datetime
+import threading
+import contextlib
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Per-stage instrumentation of monitor_model_data.
+#
+# measure() records, for a block of work:
+#   - seconds / cpu_seconds: wall time and CPU time of the thread running the block (so
+#     concurrent stages of the thread executor do not count each other's work);
+#   - peak_rss_mb / rss_growth_mb: the largest resident set size of the process seen while
+#     the block ran, sampled by a background thread every SAMPLE_INTERVAL seconds, and its
+#     growth over the RSS at the start. Stages running concurrently in one process share
+#     the process RSS, so their peaks overlap. Without /proc (macOS, Windows) the process
+#     high-water mark (ru_maxrss) is used, which only shows growth beyond earlier peaks;
+#   - rows / rows_per_second: rows of the DataFrames the block processed.
+# The stage scheduler measures every stage this way; monitor_model_data adds the load,
+# sampling and save steps. write_metrics exports the timings of a run as a Prometheus text
+# or OpenMetrics file (e.g. for the node_exporter textfile collector), and profile_call runs
+# a single call under cProfile or pyinstrument.
+SAMPLE_INTERVAL = 0.01
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+METRICS_FORMATS = ('prometheus', 'openmetrics')
+PROFILERS = ('cprofile', 'pyinstrument')
+# Exported stage metrics: (metric name, timing key, scale, OpenMetrics unit, help text)
+STAGE_METRICS = (
+    ("monitoring_stage_seconds", "seconds", 1, "seconds", "Wall time of a monitoring stage"),
+    ("monitoring_stage_cpu_seconds", "cpu_seconds", 1, "seconds", "CPU time of the thread running a stage"),
+    ("monitoring_stage_peak_rss_bytes", "peak_rss_mb", 1024 ** 2, "bytes", "Peak resident set size during a stage"),
+    ("monitoring_stage_rss_growth_bytes", "rss_growth_mb", 1024 ** 2, "bytes",
+     "Growth of the resident set size during a stage"),
+    ("monitoring_stage_rows", "rows", 1, None, "Rows processed by a stage"),
+    ("monitoring_stage_rows_per_second", "rows_per_second", 1, None, "Rows processed per second of wall time"),
+)
+
+# Function to read the peak resident set size of this process in megabytes
+def peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+# Function to read the current resident set size of this process in megabytes
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE / 1024 ** 2
+    except OSError:
+        return peak_rss_mb()
+
+# Function to count the rows of the DataFrames among some values
+def frame_rows(values):
+    return sum(len(value) for value in values if isinstance(value, pd.DataFrame))
+
+
+class PeakMemorySampler:
+    '''Largest RSS of the process seen by a background thread while the context is active.'''
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_mb = self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+        return False
+
+
+# Context manager to measure a block of work
+@contextlib.contextmanager
+def measure(rows=None):
+    """Yield a timing dict that is completed when the block exits.
+
+    The block may set timing["rows"] (or pass rows) to get rows_per_second.
+    """
+    timing = {"started_at": datetime.datetime.now().isoformat(), "rows": rows}
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    with PeakMemorySampler() as memory:
+        yield timing
+    seconds = time.perf_counter() - wall_start
+    timing.update({
+        "seconds": seconds,
+        "cpu_seconds": time.thread_time() - cpu_start,
+        "peak_rss_mb": memory.peak_mb,
+        "rss_growth_mb": memory.peak_mb - memory.start_mb,
+        "rows_per_second": timing["rows"] / seconds if timing["rows"] is not None and seconds > 0 else None,
+        "pid": os.getpid(),
+    })
+
+# Function to escape a label value of the Prometheus/OpenMetrics text formats
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Function to format a label set
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + '}'
+
+# Function to render the stage timings of a run's metadata as metric lines
+def format_metrics(metadata, format='prometheus'):
+    if format not in METRICS_FORMATS:
+        raise ValueError(f"Unknown metrics format '{format}', expected one of {METRICS_FORMATS}")
+    run_labels = {"model_version": metadata.get("model_version"), "source_system": metadata.get("source_system")}
+    stages = {name: timing for name, timing in metadata.get("stage_timings", {}).items() if name != 'total'}
+
+    lines = []
+
+    def family(name, unit, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}.")
+        lines.append(f"# TYPE {name} gauge")
+        if unit and format == 'openmetrics':
+            lines.append(f"# UNIT {name} {unit}")
+        lines.extend(f"{name}{labels} {value!r}" for labels, value in samples)
+
+    for name, key, scale, unit, help_text in STAGE_METRICS:
+        samples = [(_labels(stage=stage, **run_labels), float(timing[key]) * scale)
+                   for stage, timing in stages.items() if timing.get(key) is not None]
+        if samples:
+            family(name, unit, help_text, samples)
+    family("monitoring_records", None, "Rows of the reference and current data",
+           [(_labels(role=role, **run_labels), float(metadata[f"record_count_{role}"]))
+            for role in ('reference', 'current') if f"record_count_{role}" in metadata])
+    if "event_timestamp" in metadata:
+        timestamp = datetime.datetime.fromisoformat(metadata["event_timestamp"]).timestamp()
+        family("monitoring_run_timestamp_seconds", "seconds", "Start time of the monitoring run",
+               [(_labels(**run_labels), timestamp)])
+    if format == 'openmetrics':
+        lines.append("# EOF")
+    return '\n'.join(lines) + '\n'
+
+# Function to export the stage timings of a run to a Prometheus text or OpenMetrics file
+def write_metrics(metadata, path, format=None):
+    """format defaults to 'openmetrics' for .om files and 'prometheus' otherwise (e.g. .prom)."""
+    if format is None:
+        format = 'openmetrics' if path.endswith('.om') else 'prometheus'
+    text = format_metrics(metadata, format)
+    # Scrapers may read the file at any time: write it under a temporary name, then rename it
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, 'w') as metrics_file:
+        metrics_file.write(text)
+    os.replace(partial, path)
+    return path
+
+# Function to run a single call under a profiler
+def profile_call(profiler, output_path, func, *args, **kwargs):
+    """Return func(*args, **kwargs), writing its profile to output_path.
+
+    'cprofile' writes pstats data (python -m pstats, snakeviz); 'pyinstrument' (optional
+    dependency) writes an HTML call tree. Only the calling thread is profiled, so run the
+    monitoring stages with executor='sequential'.
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}', expected one of {PROFILERS}")
+
+    if profiler == 'cprofile':
+        import cProfile
+
+        session = cProfile.Profile()
+        try:
+            return session.runcall(func, *args, **kwargs)
+        finally:
+            session.dump_stats(output_path)
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError as error:
+        raise ImportError("profiler='pyinstrument' needs the pyinstrument package") from error
+    session = Profiler()
+    session.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        session.stop()
+        with open(output_path, 'w') as html_file:
+            html_file.write(session.output_html())
@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import inspect
+import argparse
+import importlib
+
+# Command-line entry point for the monitoring jobs.
+#
+#   python monitor.py run --config monitor_config_example.json
+#   python monitor.py metrics --input "stats metrics/input_data.csv" [--plot]
+#   python monitor.py serve --config monitor_config_example.json [--port 8765]
+#   python monitor.py distributed --config monitor_config_example.json --partitions 'current/*.parquet'
+#
+# Only the standard library is imported at start-up; every command imports what it needs
+# when it runs, and the pipeline modules import Evidently, scikit-learn and matplotlib
+# inside the functions that use them. The metrics command therefore loads NumPy and pandas
+# only (see benchmarks/bench_import_time.py for the measured budget), and plotting is
+# only loaded with --plot.
+#
+# A run configuration is a JSON object shaped like a batch manifest job:
+#   {"pipeline": "monitoring", "model_version": ..., "source_system": ..., "user": ...,
+#    "reference": {"path": ..., "rows": [start, stop]}, "current": {...},
+#    "column_mapping": {"target": ..., "prediction": ..., "numerical_features": [...],
+#                       "categorical_features": [...]},
+#    "options": {keyword arguments of monitor_model_data, e.g. "executor", "html_mode"}}
+PIPELINES = {
+    'monitoring': 'Monitoring',              # drift reports, statistics, result store, sampling
+    'new_classes': 'monitoring_new_class',   # new-class check, drift reports and statistics
+}
+DEFAULT_CONFIG = 'monitor_config_example.json'
+
+# Function to load and validate a run configuration
+def load_config(path):
+    with open(path) as json_file:
+        config = json.load(json_file)
+    for key in ("model_version", "source_system", "reference", "current", "column_mapping"):
+        if key not in config:
+            raise ValueError(f"The configuration {path} is missing '{key}'")
+    config.setdefault("pipeline", 'monitoring')
+    config.setdefault("user", os.environ.get('USER', 'monitor'))
+    config.setdefault("options", {})
+    return config
+
+# Function to import the monitor_model_data of a configuration's pipeline and check its options
+def resolve_pipeline(config):
+    if config["pipeline"] not in PIPELINES:
+        raise ValueError(f"Unknown pipeline '{config['pipeline']}', expected one of {tuple(PIPELINES)}")
+    monitor_model_data = importlib.import_module(PIPELINES[config["pipeline"]]).monitor_model_data
+    unsupported = set(config["options"]) - set(inspect.signature(monitor_model_data).parameters)
+    if unsupported:
+        raise ValueError(f"The '{config['pipeline']}' pipeline does not support the options {sorted(unsupported)}")
+    return monitor_model_data
+
+# Function to run monitor_model_data for a configuration
+def run(config, profiler=None, profile_output=None):
+    from batch_runner import normalize_source, build_column_mapping
+    from data_loading import load_frame, required_columns
+    from instrumentation import measure, profile_call
+    from reference_profile import load_or_build_reference_profile, file_fingerprint
+
+    monitor_model_data = resolve_pipeline(config)
+    options = config["options"]
+    column_mapping = build_column_mapping(config["column_mapping"])
+    # Segment columns (segmented mode) are loaded along with the columns of the mapping
+    columns = required_columns(column_mapping, options.get("segments") or [])
+    reference_source, current_source = normalize_source(config["reference"]), normalize_source(config["current"])
+    with measure() as load_timing:
+        reference = load_frame(reference_source["path"], column_mapping, rows=reference_source["rows"],
+                               columns=columns)
+        current = load_frame(current_source["path"], column_mapping, rows=current_source["rows"], columns=columns)
+        load_timing["rows"] = len(reference) + len(current)
+
+    # Cached reference profile, keyed by the reference file and rows rather than a hash of the data
+    rows = reference_source["rows"]
+    reference_profile = load_or_build_reference_profile(
+        reference, column_mapping, config["model_version"],
+        fingerprint=file_fingerprint(reference_source["path"], None if rows is None else slice(*rows)))
+
+    args = (reference, current, column_mapping, config["source_system"], config["user"], config["model_version"],
+            reference_profile)
+    kwargs = dict(options, load_timing=load_timing)
+    if profiler:
+        return profile_call(profiler, profile_output, monitor_model_data, *args, **kwargs)
+    return monitor_model_data(*args, **kwargs)
+
+# Function to run the map/reduce mode (distributed.py) on a current window stored as partitions
+def run_distributed(config, partitions, executor='process', max_workers=None, chunksize=None, output_dir='.',
+                    result_store=None, metrics_file=None, include_sketches=False):
+    from batch_runner import normalize_source, build_column_mapping
+    from data_loading import load_frame
+    from distributed import monitor_partitions, DEFAULT_CHUNKSIZE
+    from reference_profile import load_or_build_reference_profile, file_fingerprint
+
+    column_mapping = build_column_mapping(config["column_mapping"])
+    reference_source = normalize_source(config["reference"])
+    # Full precision: the plan's reference cells and centres come from the reference values
+    reference = load_frame(reference_source["path"], column_mapping, rows=reference_source["rows"], compact=False)
+    rows = reference_source["rows"]
+    reference_profile = load_or_build_reference_profile(
+        reference, column_mapping, config["model_version"],
+        fingerprint=file_fingerprint(reference_source["path"], None if rows is None else slice(*rows)))
+    return monitor_partitions(reference, partitions, column_mapping, config["source_system"], config["user"],
+                              config["model_version"], reference_profile, executor, max_workers, output_dir,
+                              result_store, chunksize or DEFAULT_CHUNKSIZE, include_sketches, metrics_file)
+
+# Function to compute the classification metrics of a scored file
+def metrics(input_path, target_col, pred_prob_col, threshold=0.5, output_dir='output', plot=False):
+    from stat_metrics import main as stat_metrics_main
+
+    return stat_metrics_main(input_path, target_col, pred_prob_col, threshold, output_dir, plot)
+
+# Function to build the argument parser
+def build_parser():
+    parser = argparse.ArgumentParser(prog='monitor', description="Model monitoring jobs.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run monitor_model_data for a JSON configuration")
+    run_parser.add_argument('--config', default=DEFAULT_CONFIG, help="JSON run configuration")
+    run_parser.add_argument('--pipeline', choices=list(PIPELINES), default=None,
+                            help="Override the pipeline of the configuration")
+    run_parser.add_argument('--executor', choices=['sequential', 'thread', 'process'], default=None)
+    run_parser.add_argument('--output-dir', default=None)
+    run_parser.add_argument('--html-mode', choices=['always', 'on_drift', 'never', 'summary'], default=None)
+    run_parser.add_argument('--result-store', default=None, help="Append results to this SQLite store")
+    run_parser.add_argument('--tiered', action='store_const', const=True, default=None,
+                            help="Screen features first; run the Evidently data drift tests on drift candidates only")
+    run_parser.add_argument('--metrics-file', default=None,
+                            help="Export stage timings to this Prometheus text (.prom) or OpenMetrics (.om) file")
+    run_parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None,
+                            help="Profile the run (use with the sequential executor)")
+    run_parser.add_argument('--profile-output', default=None,
+                            help="Profile file (default: monitoring_profile.prof or .html)")
+
+    metrics_parser = commands.add_parser('metrics', help="Compute AUC, K-S, PSI, accuracy and F1 of a scored file")
+    metrics_parser.add_argument('--input', default=os.path.join('stats metrics', 'input_data.csv'))
+    metrics_parser.add_argument('--target', default='target')
+    metrics_parser.add_argument('--score', default='predicted_probability')
+    metrics_parser.add_argument('--threshold', type=float, default=0.5)
+    metrics_parser.add_argument('--output-dir', default='output')
+    metrics_parser.add_argument('--plot', action='store_true',
+                                help="Show the PSI distribution plot (interactive runs; imports matplotlib)")
+    distributed_parser = commands.add_parser(
+        'distributed', help="Aggregate a partitioned current window with map/reduce workers (distributed.py)")
+    distributed_parser.add_argument('--config', default=DEFAULT_CONFIG,
+                                    help="JSON run configuration (its reference and column mapping are used)")
+    distributed_parser.add_argument('--partitions', required=True,
+                                    help="Directory of Parquet partitions, or a glob of Parquet/CSV files")
+    distributed_parser.add_argument('--executor', choices=['process', 'sequential'], default='process')
+    distributed_parser.add_argument('--max-workers', type=int, default=None)
+    distributed_parser.add_argument('--chunksize', type=int, default=None, help="Rows read at a time per partition")
+    distributed_parser.add_argument('--output-dir', default='.')
+    distributed_parser.add_argument('--result-store', default=None, help="Append results to this SQLite store")
+    distributed_parser.add_argument('--metrics-file', default=None)
+    distributed_parser.add_argument('--sketches', action='store_true',
+                                    help="Also return mergeable quantile sketches of the current window")
+    serve_parser = commands.add_parser('serve', help="Serve requests over HTTP with warm reference state (service.py)")
+    serve_parser.add_argument('--config', action='append', default=[],
+                              help="Run configuration of a model to register at start-up (repeatable)")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--max-workers', type=int, default=None)
+    serve_parser.add_argument('--max-pending', type=int, default=64)
+    serve_parser.add_argument('--output-root', default='service_output')
+    serve_parser.add_argument('--data-root', action='append', default=[],
+                              help="Directory clients may read data files from (repeatable; default: the working directory)")
+    serve_parser.add_argument('--verbose', action='store_true', help="Log every request")
+    return parser
+
+# Main function of the CLI
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'metrics':
+        metrics(args.input, args.target, args.score, args.threshold, args.output_dir, args.plot)
+        return 0
+    if args.command == 'distributed':
+        try:
+            config = load_config(args.config)
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+        run_distributed(config, args.partitions, args.executor, args.max_workers, args.chunksize, args.output_dir,
+                        args.result_store, args.metrics_file, args.sketches)
+        print("\nFinal Monitoring Results Saved as JSON and Excel Files.")
+        return 0
+    if args.command == 'serve':
+        import service
+
+        configs = []
+        for path in args.config:
+            with open(path) as json_file:
+                configs.append(json.load(json_file))
+        service.serve(args.host, args.port, configs, args.max_workers or service.DEFAULT_MAX_WORKERS,
+                      args.max_pending, args.output_root, args.verbose,
+                      args.data_root or service.DEFAULT_DATA_ROOTS)
+        return 0
+
+    overrides = {"executor": args.executor, "output_dir": args.output_dir, "html_mode": args.html_mode,
+                 "result_store": args.result_store, "metrics_file": args.metrics_file, "tiered": args.tiered}
+    try:
+        config = load_config(args.config)
+        if args.pipeline:
+            config["pipeline"] = args.pipeline
+        config["options"].update({key: value for key, value in overrides.items() if value is not None})
+        resolve_pipeline(config)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    profile_output = args.profile_output
+    if args.profile and profile_output is None:
+        profile_output = 'monitoring_profile.prof' if args.profile == 'cprofile' else 'monitoring_profile.html'
+
+    run(config, args.profile, profile_output)
+    print("\nFinal Monitoring Results Saved as JSON and Excel Files.")
+    if args.profile:
+        print(f"Profile saved to {profile_output}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
 import pandas as pd
 import datetime
 import json
-from evidently.report import Report
-from evidently.metric_preset import DataDriftPreset, TargetDriftPreset, ClassificationPreset
-from evidently import ColumnMapping
+from stage_scheduler import Stage, run_stages
+from new_class_detector import detect_new_classes
+from instrumentation import measure, write_metrics
+
+# Evidently is imported by the report functions that use it, so importing this module is fast
 
 # Function to get metadata
 def get_metadata(event_type, source_system, user, model_version, reference, current):
@@ -20,16 +22,29 @@ def get_metadata(event_type, source_system, user, model_version, reference, curr
     return metadata
 
 # Function to calculate statistical summary for numerical features
-def calculate_statistics(numerical_features, reference, current):
+def calculate_statistics(numerical_features, reference, current, reference_profile=None):
     statistics = {}
+    reference_moments = reference_profile["moments"] if reference_profile else {}
     for feature in numerical_features:
+        # Reuse the precomputed reference moments instead of rescanning the reference data
+        if feature in reference_moments:
+            moments = reference_moments[feature]
+        else:
+            reference_column = reference[feature].astype('float64')
+            moments = {
+                'mean': float(reference_column.mean()),
+                'std': float(reference_column.std()),
+                'var': float(reference_column.var())
+            }
+        # Reduce in float64 whatever the column dtype (e.g. compact float32)
+        current_column = current[feature].astype('float64')
         stats = {
-            'mean_reference': reference[feature].mean(),
-            'std_reference': reference[feature].std(),
-            'var_reference': reference[feature].var(),
-            'mean_current': current[feature].mean(),
-            'std_current': current[feature].std(),
-            'var_current': current[feature].var()
+            'mean_reference': moments['mean'],
+            'std_reference': moments['std'],
+            'var_reference': moments['var'],
+            'mean_current': float(current_column.mean()),
+            'std_current': float(current_column.std()),
+            'var_current': float(current_column.var())
         }
         statistics[feature] = stats
     
@@ -37,6 +52,9 @@ def calculate_statistics(numerical_features, reference, current):
 
 # Function to generate a data drift report
 def generate_data_drift_report(reference, current, column_mapping):
+    from evidently.report import Report
+    from evidently.metric_preset import DataDriftPreset
+
     data_drift_report = Report(metrics=[DataDriftPreset()])
     data_drift_report.run(reference_data=reference, current_data=current, column_mapping=column_mapping)
     # data_drift_report.save_html('data_drift_report1.html')
@@ -44,6 +62,9 @@ def generate_data_drift_report(reference, current, column_mapping):
 
 # Function to generate target drift report
 def generate_target_drift_report(reference, current, column_mapping):
+    from evidently.report import Report
+    from evidently.metric_preset import TargetDriftPreset
+
     target_drift_report = Report(metrics=[TargetDriftPreset()])
     target_drift_report.run(reference_data=reference, current_data=current, column_mapping=column_mapping)
     # target_drift_report.save_html('data_drift_report1.html')
@@ -57,6 +78,9 @@ def generate_target_drift_report(reference, current, column_mapping):
 #     if column_mapping.prediction not in reference.columns or column_mapping.prediction not in current.columns:
 #         raise ValueError(f"Prediction column '{column_mapping.prediction}' is missing in one or both datasets.")
     
+#     from evidently.report import Report
+#     from evidently.metric_preset import ClassificationPreset
+#
 #     # Create a model performance report
 #     performance_report = Report(metrics=[ClassificationPreset()])
 #     performance_report.run(reference_data=reference, current_data=current, column_mapping=column_mapping)
@@ -66,16 +90,21 @@ def generate_target_drift_report(reference, current, column_mapping):
 
 
 # Define function to check for new classes
-def check_for_new_classes(reference, current, all_features):
+def check_for_new_classes(reference, current, all_features, reference_profile=None):
     new_classes_detected = {}
     new_class_flag = False  # Set flag to False by default
+    reference_vocabularies = reference_profile["class_vocabularies"] if reference_profile else {}
 
     for feature in all_features:
         # Make a copy of the columns for comparison as string
-        ref_feature = reference[feature].astype(str).str.strip()
         curr_feature = current[feature].astype(str).str.strip()
 
-        ref_classes = set(ref_feature.unique())
+        # Reuse the precomputed reference classes when the profile has them
+        if feature in reference_vocabularies:
+            ref_classes = set(reference_vocabularies[feature])
+        else:
+            ref_feature = reference[feature].astype(str).str.strip()
+            ref_classes = set(ref_feature.unique())
         curr_classes = set(curr_feature.unique())
         
         # Debugging: Print unique classes in reference and current to verify
@@ -108,7 +137,7 @@ def save_results_as_files(final_results):
 
     # Prepare data for Excel export
     # Flatten metadata, data drift, and target drift for easier export to Excel
-    metadata_df = pd.DataFrame([final_results['metadata']])
+    metadata_df = pd.json_normalize(final_results['metadata'])
 
     # Flatten data drift metrics and target drift metrics (if needed, adjust the structure)
     data_drift_df = pd.json_normalize(final_results['data_drift_metrics'])
@@ -127,7 +156,9 @@ def save_results_as_files(final_results):
         statistics_df.to_excel(writer, sheet_name='Statistical Summary', index=True)
 
 # Main function to execute and collect metadata, drift reports, and statistics
-def monitor_model_data(reference, current, column_mapping, source_system, user, model_version):
+def monitor_model_data(reference, current, column_mapping, source_system, user, model_version,
+                       reference_profile=None, executor='sequential', max_workers=None, load_timing=None,
+                       metrics_file=None):
     # Get Metadata
     metadata = get_metadata(
         event_type='model run',
@@ -138,25 +169,38 @@ def monitor_model_data(reference, current, column_mapping, source_system, user,
         current=current
     )
 
-    # Check for new classes in categorical features
-    new_class_flag, new_class_details = check_for_new_classes(reference, current, all_features)
+    # The new-class check, the drift reports and the statistics are independent, so they can
+    # run concurrently ('thread' or 'process' executor); per-stage timings (wall/CPU time, peak
+    # RSS, rows/sec, see instrumentation.py) go in the metadata
+    numerical_features = column_mapping.numerical_features
+    categorical_features = column_mapping.categorical_features or []
+    stages = [
+        # New classes are only meaningful for categorical features; the detector works on
+        # integer codes and precomputed reference vocabularies
+        Stage('new_classes', detect_new_classes, reference, current, categorical_features, reference_profile),
+        Stage('data_drift', generate_data_drift_report, reference, current, column_mapping),
+        # Stage('model_performance', generate_model_performance_metrics, reference, current, column_mapping),
+        Stage('target_drift', generate_target_drift_report, reference, current, column_mapping),
+        Stage('statistics', calculate_statistics, numerical_features, reference, current, reference_profile),
+    ]
+    stage_results, stage_timings = run_stages(stages, executor=executor, max_workers=max_workers)
 
     # Update the metadata with new class information
+    new_class_flag, new_class_details, new_class_results = stage_results['new_classes']
     metadata["new_class_detected"] = new_class_flag  # Set flag for new class
     metadata["new_class_details"] = new_class_details  # Provide details of new classes
+    metadata["new_class_counts"] = {  # Unseen-class row counts and frequencies per feature
+        feature: {key: result[key] for key in ('unseen_count', 'unseen_frequency', 'unseen_classes')}
+        for feature, result in new_class_results.items()
+    }
+    if load_timing:
+        stage_timings = {"load": load_timing, **stage_timings}
+    metadata["stage_timings"] = stage_timings
 
-    # Generate Data Drift Report
-    data_drift_results = generate_data_drift_report(reference, current, column_mapping)
-
-    # Generate Model Performance Metrics
-    # model_performance_results = generate_model_performance_metrics(reference, current, column_mapping)
-
-    # Generate Target Drift Report
-    target_drift_results = generate_target_drift_report(reference, current, column_mapping)
-
-    # Calculate statistics for numerical features
-    numerical_features = column_mapping.numerical_features
-    statistics = calculate_statistics(numerical_features, reference, current)
+    data_drift_results = stage_results['data_drift']
+    # model_performance_results = stage_results['model_performance']
+    target_drift_results = stage_results['target_drift']
+    statistics = stage_results['statistics']
 
     # Compile all metrics into a single dictionary
     final_results = {
@@ -167,46 +211,22 @@ def monitor_model_data(reference, current, column_mapping, source_system, user,
         "statistical_summary": statistics,
     }
 
-    # Save the results as JSON and Excel files
-    save_results_as_files(final_results)
+    # Save the results as JSON and Excel files (the save timing is only in the returned results
+    # and the metrics file)
+    with measure() as save_timing:
+        save_results_as_files(final_results)
+    stage_timings["save"] = save_timing
+
+    # Export the stage timings as a Prometheus text file (OpenMetrics for a .om path)
+    if metrics_file:
+        write_metrics(metadata, metrics_file)
 
     return final_results
 
 # Example usage
 if __name__ == "__main__":
-    # Load data
-    # data = pd.read_csv('sample_data.csv')
-    data = pd.read_excel('sample_data1.xlsx')
-
-    # Define the data and column mapping
-    target = 'cnt'
-    prediction = 'prediction'
-    numerical_features = ['temp', 'atemp', 'hum', 'windspeed', 'hr', 'weekday']
-    categorical_features = ['season', 'holiday', 'workingday']
-    
-    # Combine both categorical and numerical features
-    all_features = numerical_features + categorical_features
-
-    reference = data.iloc[:12000]  
-    current = data.iloc[12000:17379]
-    # current = data.iloc[12000:-1]
-
-    column_mapping = ColumnMapping()
-    column_mapping.target = target
-    column_mapping.prediction = prediction
-    column_mapping.numerical_features = numerical_features
-    column_mapping.categorical_features = categorical_features
-
-    # Define metadata details
-    source_system = 'ECR'
-    user = 'admin_user'
-    model_version = '1.0.0'
-
-    # Call the monitoring function
-    final_results = monitor_model_data(reference, current, column_mapping, source_system, user, model_version)
-
-    print("\nFinal Monitoring Results Saved as JSON and Excel Files.")
-
-
-
+    # Example usage: the sample configuration through the CLI, i.e.
+    # python monitor.py run --config monitor_config_example.json --pipeline new_classes
+    from monitor import main
 
+    main(['run', '--config', 'monitor_config_example.json', '--pipeline', 'new_classes'])
@@ -0,0 +1,175 @@
+import base64
+import numpy as np
+import pandas as pd
+
+# New-class detection on categorical features.
+#
+# The reference vocabulary of each categorical feature is built once. Current columns are
+# factorized to integer codes, so only their distinct values are normalised (stripped
+# strings, as in check_for_new_classes) and looked up in the vocabulary by hash; per-row
+# strings are never allocated. Vocabularies larger than max_exact fall back to a Bloom filter
+# (no false negatives, a small false-positive rate that can hide a new class). The filter
+# keeps the stored vocabulary and its lookups small; the distinct classes are still
+# collected once (as a compact string array) to size it, and their exact count is kept.
+DEFAULT_MAX_EXACT = 100_000
+DEFAULT_FALSE_POSITIVE_RATE = 0.001
+DEFAULT_MAX_REPORTED_CLASSES = 20
+# Two independent 64-bit hashes for double hashing in the Bloom filter
+HASH_KEYS = ('0123456789123456', 'monitoringbloom2')
+
+# Function to normalise distinct values the same way check_for_new_classes does
+def normalize_values(values):
+    return pd.Index(values).astype(str).str.strip()
+
+# Function to hash normalised values to uint64
+def hash_values(values, hash_key=HASH_KEYS[0]):
+    return pd.util.hash_array(np.asarray(values, dtype=object), hash_key=hash_key)
+
+
+class BloomFilter:
+    '''Fixed-size Bloom filter over uint64 double hashing.'''
+
+    def __init__(self, n_bits, n_hashes, bits=None):
+        self.n_bits = int(n_bits)
+        self.n_hashes = int(n_hashes)
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8) if bits is None else bits
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        n_bits = max(int(-capacity * np.log(false_positive_rate) / np.log(2) ** 2), 8)
+        n_hashes = max(int(round(n_bits / max(capacity, 1) * np.log(2))), 1)
+        return cls(n_bits, n_hashes)
+
+    def _positions(self, values):
+        h1 = hash_values(values, HASH_KEYS[0])
+        h2 = hash_values(values, HASH_KEYS[1]) | np.uint64(1)
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.n_bits)
+
+    def add(self, values):
+        positions = self._positions(values).ravel()
+        np.bitwise_or.at(self.bits, (positions // 8).astype(np.int64),
+                         (np.uint8(1) << (positions % 8).astype(np.uint8)))
+        return self
+
+    def contains(self, values):
+        positions = self._positions(values)
+        hit = (self.bits[(positions // 8).astype(np.int64)] >> (positions % 8).astype(np.uint8)) & 1
+        return hit.all(axis=1)
+
+    def to_dict(self):
+        return {"n_bits": self.n_bits, "n_hashes": self.n_hashes,
+                "bits": base64.b64encode(self.bits.tobytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, state):
+        bits = np.frombuffer(base64.b64decode(state["bits"]), dtype=np.uint8).copy()
+        return cls(state["n_bits"], state["n_hashes"], bits)
+
+
+class ReferenceVocabulary:
+    '''Reference classes of one feature: an exact hash index, or a Bloom filter when too large.'''
+
+    def __init__(self, index=None, bloom=None, cardinality=None):
+        self.index = index
+        self.bloom = bloom
+        self.cardinality = len(index) if index is not None else cardinality
+
+    @property
+    def approximate(self):
+        return self.index is None
+
+    @classmethod
+    def from_values(cls, values, max_exact=DEFAULT_MAX_EXACT, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        '''Build from a reference column (or its distinct values).'''
+        classes = normalize_values(pd.unique(pd.Series(values).to_numpy())).unique()
+        if len(classes) <= max_exact:
+            return cls(index=pd.Index(classes))
+        bloom = BloomFilter.for_capacity(len(classes), false_positive_rate).add(classes)
+        return cls(bloom=bloom, cardinality=len(classes))
+
+    def contains(self, classes):
+        '''Membership of normalised class names (boolean array).'''
+        if self.index is not None:
+            return self.index.get_indexer(classes) >= 0
+        return self.bloom.contains(classes)
+
+    def to_dict(self):
+        if self.index is not None:
+            return {"classes": self.index.tolist()}
+        return {"bloom": self.bloom.to_dict(), "cardinality": self.cardinality}
+
+    @classmethod
+    def from_dict(cls, state):
+        if "classes" in state:
+            return cls(index=pd.Index(state["classes"]))
+        return cls(bloom=BloomFilter.from_dict(state["bloom"]), cardinality=state["cardinality"])
+
+
+class NewClassDetector:
+    '''Detect classes in current categorical columns that the reference vocabularies do not contain.'''
+
+    def __init__(self, vocabularies, max_reported_classes=DEFAULT_MAX_REPORTED_CLASSES):
+        self.vocabularies = vocabularies
+        self.max_reported_classes = max_reported_classes
+
+    @classmethod
+    def from_reference(cls, reference, categorical_features, max_exact=DEFAULT_MAX_EXACT, **kwargs):
+        vocabularies = {feature: ReferenceVocabulary.from_values(reference[feature], max_exact)
+                        for feature in categorical_features}
+        return cls(vocabularies, **kwargs)
+
+    @classmethod
+    def from_profile(cls, reference_profile, categorical_features=None, **kwargs):
+        '''Reuse the class vocabularies precomputed in a reference profile.'''
+        if categorical_features is None:
+            categorical_features = reference_profile["column_mapping"]["categorical_features"] or []
+        vocabularies = {feature: ReferenceVocabulary(index=pd.Index(reference_profile["class_vocabularies"][feature]))
+                        for feature in categorical_features}
+        return cls(vocabularies, **kwargs)
+
+    def detect_feature(self, feature, values):
+        '''Unseen-class counts, frequency and (the most frequent) names for one current column.'''
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        classes = normalize_values(uniques)
+        # Raw values that normalise to the same class (e.g. ' a' and 'a') share one class code
+        class_codes, classes = pd.factorize(classes, use_na_sentinel=False)
+        counts = np.bincount(class_codes[codes], minlength=len(classes)) if len(codes) else np.zeros(len(classes), int)
+
+        unseen = np.flatnonzero(~self.vocabularies[feature].contains(classes))
+        unseen = unseen[np.argsort(-counts[unseen], kind='stable')]
+        unseen_count = int(counts[unseen].sum())
+        reported = unseen[:self.max_reported_classes]
+        return {
+            "new_class_detected": len(unseen) > 0,
+            "unseen_distinct": len(unseen),
+            "unseen_count": unseen_count,
+            "unseen_frequency": unseen_count / len(codes) if len(codes) else 0.0,
+            "unseen_classes": {str(classes[i]): int(counts[i]) for i in reported},
+            "truncated": len(unseen) > len(reported),
+            "approximate": self.vocabularies[feature].approximate,
+        }
+
+    def detect(self, current):
+        return {feature: self.detect_feature(feature, current[feature]) for feature in self.vocabularies}
+
+
+# Function to summarise detector results as the (flag, details) pair of check_for_new_classes
+def summarize_new_classes(results):
+    detected = {feature: list(result["unseen_classes"]) for feature, result in results.items()
+                if result["new_class_detected"]}
+    if detected:
+        return "yes", ", ".join([f"{feature}: {classes}" for feature, classes in detected.items()])
+    return "no", "None"
+
+# Function to detect new classes in categorical features
+def detect_new_classes(reference, current, categorical_features, reference_profile=None):
+    """Return (flag, details, per-feature results) for the categorical features."""
+    if reference_profile is not None:
+        detector = NewClassDetector.from_profile(reference_profile, categorical_features)
+    else:
+        detector = NewClassDetector.from_reference(reference, categorical_features)
+    results = detector.detect(current)
+    new_class_flag, new_class_details = summarize_new_classes(results)
+    return new_class_flag, new_class_details, results
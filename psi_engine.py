@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from drift_engine import DEFAULT_BINS, PSI_EPSILON, to_block, block_bin_edges, block_psi
+
+# PSI engine with bin edges fitted once on the reference.
+#
+# ReferenceBins fits quantile or fixed bin edges per feature on the reference and keeps
+# the reference counts next to them. Current batches are then scored against those
+# edges with np.searchsorted and a single bincount per batch, without copying or
+# modifying the caller's data, for any number of features and batches at once.
+# A value falls in the bin of the last interior edge it reaches (as np.histogram and
+# drift_engine.block_bin_codes do); values outside the reference range go to the end
+# bins and NaNs are ignored. Quantile edges of heavily tied features can repeat; the
+# bins between repeated edges stay empty on both sides and add nothing to the PSI.
+STRATEGIES = ('quantile', 'fixed')
+
+class ReferenceBins:
+    '''Per-feature bin edges fitted on a reference, with the reference counts.'''
+
+    def __init__(self, features, bin_edges, counts, epsilon=PSI_EPSILON):
+        self.features = list(features)
+        self.bin_edges = np.asarray(bin_edges, dtype=float)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.epsilon = epsilon
+
+    @classmethod
+    def fit(cls, reference, features=None, bins=DEFAULT_BINS, strategy='quantile', edges=None,
+            epsilon=PSI_EPSILON):
+        """Fit edges on the reference: 'quantile' (equal-frequency), 'fixed' (equal-width over the
+        reference range) or explicit `edges` shared by all features (e.g. static deciles)."""
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}', expected one of {STRATEGIES}")
+        features = list(reference.columns) if features is None else list(features)
+        block = to_block(reference, features)
+
+        if edges is not None:
+            bin_edges = np.tile(np.asarray(edges, dtype=float), (len(features), 1))
+        elif strategy == 'quantile':
+            bin_edges = np.nanquantile(block, np.linspace(0, 1, bins + 1), axis=0).T
+        else:
+            bin_edges = block_bin_edges(block, bins)
+
+        reference_bins = cls(features, bin_edges, np.zeros((len(features), bin_edges.shape[1] - 1)), epsilon)
+        reference_bins.counts = reference_bins.count_block(block)
+        return reference_bins
+
+    @classmethod
+    def from_profile(cls, reference_profile, features=None):
+        """Reuse the equal-width histograms stored in a reference profile."""
+        histograms = reference_profile["histograms"]
+        if features is None:
+            features = [feature for feature, histogram in histograms.items() if histogram["bin_edges"]]
+        return cls(features, [histograms[feature]["bin_edges"] for feature in features],
+                   [histograms[feature]["counts"] for feature in features])
+
+    @property
+    def n_bins(self):
+        return self.bin_edges.shape[1] - 1
+
+    def count_block(self, block):
+        """Counts (features x bins) of a (rows x features) block on the fitted edges."""
+        n_features = len(self.features)
+        offsets = np.arange(n_features) * self.n_bins
+        codes = np.empty(block.shape, dtype=np.int64)
+        for j in range(n_features):
+            codes[:, j] = np.searchsorted(self.bin_edges[j, 1:-1], block[:, j], side='right') + offsets[j]
+        valid = ~np.isnan(block)
+        return np.bincount(codes[valid], minlength=n_features * self.n_bins).reshape(n_features, self.n_bins)
+
+    def count(self, current):
+        """Counts (features x bins) of a current DataFrame."""
+        return self.count_block(to_block(current, self.features))
+
+    def psi(self, current):
+        """PSI of every feature of one current batch, as a Series."""
+        return pd.Series(block_psi(self.counts, self.count(current), self.epsilon), index=self.features,
+                         name='psi')
+
+    def score(self, batches):
+        """PSI of every (batch, feature): one row per batch of a list or dict of DataFrames."""
+        if isinstance(batches, pd.DataFrame):
+            batches = [batches]
+        keys = list(batches) if isinstance(batches, dict) else list(range(len(batches)))
+        frames = batches.values() if isinstance(batches, dict) else batches
+        current_counts = np.stack([self.count(frame) for frame in frames]) if keys else \
+            np.zeros((0, len(self.features), self.n_bins))
+        psi = block_psi(np.broadcast_to(self.counts, current_counts.shape), current_counts, self.epsilon)
+        return pd.DataFrame(psi, index=pd.Index(keys, name='batch'), columns=self.features)
+
+    def to_dict(self):
+        return {"features": self.features, "bin_edges": self.bin_edges.tolist(), "counts": self.counts.tolist(),
+                "epsilon": self.epsilon}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["features"], state["bin_edges"], state["counts"], state.get("epsilon", PSI_EPSILON))
+
+
+# Example usage
+if __name__ == "__main__":
+    data = pd.read_csv('sample_data.csv')
+    features = ['temp', 'atemp', 'hum', 'windspeed']
+
+    reference_bins = ReferenceBins.fit(data.iloc[:12000], features, strategy='quantile')
+    # Score each month of the current period against the same reference edges
+    current = data.iloc[12000:17379]
+    months = {month: frame for month, frame in current.groupby(current.iloc[:, 0].str[:7])}
+    print(reference_bins.score(months).round(4))
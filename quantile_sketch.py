@@ -0,0 +1,345 @@
+import json
+import zlib
+import numpy as np
+import pandas as pd
+from streaming import WelfordMoments, psi_from_counts
+
+# Mergeable quantile sketches for drift on streamed or unbounded features.
+#
+# A KLL sketch keeps a stack of compactors: level h holds values that each stand for 2^h
+# rows. When a level is over its capacity it is sorted and every other value (from a
+# random offset) is promoted to the next level, so the sketch keeps O(k log(n / k))
+# values for n rows while count, min and max stay exact. Sketches of separate partitions
+# (chunks, workers, days) merge by concatenating their levels and compacting again, and
+# serialize to plain JSON (to_dict / from_dict), so partitions never need to be re-read.
+#
+# Each compaction at level h moves the rank of any value by 0 or +-2^h with equal
+# probability, so the rank error of one query is bounded with probability 1 - delta by
+# sqrt(2 * sum(4^h) * ln(2 / delta)) / n (Hoeffding); rank_error reports it from the
+# compactions the sketch (and everything merged into it) actually made. A sketch that
+# never compacted is exact. Each coin flip is seeded from (seed, compaction number, CRC of
+# the compacted values): the sketch is deterministic for the same partitions merged in
+# the same order, while partitions sketched with the same seed still flip independently.
+#
+# Drift from two sketches needs no rescaling or value range:
+#   - sketch_psi: PSI on quantile bins of the reference sketch (deciles by default);
+#   - sketch_ks: KS distance between the sketch CDFs, with bounds from both rank errors;
+#   - sketch_wasserstein: area between the sketch CDFs (normed by the exact reference std).
+DEFAULT_K = 200
+DEFAULT_DELTA = 0.01
+DEFAULT_BINS = 10
+# Capacity of a level relative to the level above it
+CAPACITY_DECAY = 2 / 3
+MIN_CAPACITY = 2
+# Evidently's floor on the reference standard deviation of Wasserstein distance (normed)
+MIN_NORM = 0.001
+SKETCH_VERSION = 1
+
+class KLLSketch:
+    '''Mergeable, serializable KLL quantile sketch of one numeric feature.'''
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        if k < MIN_CAPACITY:
+            raise ValueError(f"k must be at least {MIN_CAPACITY}, got {k}")
+        self.k = int(k)
+        self.seed = int(seed)
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.compactions = 0
+        # Sum of the squared weights of all compactions, for the rank error bound
+        self.squared_error_weight = 0.0
+        self.levels = [np.empty(0)]
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(MIN_CAPACITY, int(np.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def update(self, values):
+        '''Add a batch of values (NaNs are ignored like pandas does).'''
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        return self.compress()
+
+    def merge(self, other):
+        '''Fold another sketch (e.g. of another partition) into this one.'''
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches with k={self.k} and k={other.k}")
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compactions += other.compactions
+        self.squared_error_weight += other.squared_error_weight
+        return self.compress()
+
+    def compress(self):
+        '''Compact levels over capacity, lowest first, until every level fits.'''
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                values = np.sort(values)
+                # An odd value out stays at this level so the total weight is unchanged
+                keep = values[-1:] if len(values) % 2 else values[:0]
+                values = values[:len(values) - len(keep)]
+                coin = (self.seed, self.compactions, zlib.crc32(values.tobytes()))
+                offset = int(np.random.default_rng(coin).integers(2))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], values[offset::2]])
+                self.levels[level] = keep
+                self.compactions += 1
+                self.squared_error_weight += 4.0 ** level
+                # Promoting may have changed the capacities (new top level); start over
+                level = 0
+                continue
+            level += 1
+        return self
+
+    @property
+    def exact(self):
+        return self.compactions == 0
+
+    @property
+    def size(self):
+        '''Number of values retained.'''
+        return sum(len(values) for values in self.levels)
+
+    def weighted_values(self):
+        '''(sorted retained values, cumulative weights), the step function of the sketch CDF.'''
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 2.0 ** level) for level, values in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], np.cumsum(weights[order])
+
+    def cdf(self, x):
+        '''Estimated share of values <= x.'''
+        if self.count == 0:
+            return np.full(np.shape(x), np.nan)
+        values, cumulative = self.weighted_values()
+        positions = np.searchsorted(values, x, side='right')
+        ranks = np.where(positions > 0, cumulative[np.maximum(positions - 1, 0)], 0.0)
+        return ranks / cumulative[-1]
+
+    def quantile(self, q):
+        '''Estimated q-quantiles; q=0 and q=1 give the exact min and max.'''
+        q = np.asarray(q, dtype=float)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        values, cumulative = self.weighted_values()
+        positions = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        result = values[np.clip(positions, 0, len(values) - 1)]
+        return np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+
+    def rank_error(self, delta=DEFAULT_DELTA):
+        '''Bound on the normalized rank error of one query, holding with probability 1 - delta.'''
+        if self.count == 0 or self.exact:
+            return 0.0
+        return float(min(1.0, np.sqrt(2 * self.squared_error_weight * np.log(2 / delta)) / self.count))
+
+    def to_dict(self):
+        return {
+            "version": SKETCH_VERSION, "k": self.k, "seed": self.seed, "count": self.count,
+            "min": self.min if self.count else None, "max": self.max if self.count else None,
+            "compactions": self.compactions, "squared_error_weight": self.squared_error_weight,
+            "levels": [values.tolist() for values in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get("version") != SKETCH_VERSION:
+            raise ValueError(f"Unsupported sketch version {state.get('version')}, expected {SKETCH_VERSION}")
+        sketch = cls(state["k"], state["seed"])
+        sketch.count = state["count"]
+        if sketch.count:
+            sketch.min, sketch.max = state["min"], state["max"]
+        sketch.compactions = state["compactions"]
+        sketch.squared_error_weight = state["squared_error_weight"]
+        sketch.levels = [np.asarray(values, dtype=float) for values in state["levels"]]
+        return sketch
+
+
+class FeatureSketches:
+    '''A KLL sketch and exact moments per feature of one dataset or partition.'''
+
+    def __init__(self, features, k=DEFAULT_K, seed=0):
+        self.features = list(features)
+        self.k = k
+        self.row_count = 0
+        # Every feature gets its own coin flips
+        self.sketches = {feature: KLLSketch(k, seed + i) for i, feature in enumerate(self.features)}
+        self.moments = {feature: WelfordMoments() for feature in self.features}
+
+    def update(self, chunk):
+        self.row_count += len(chunk)
+        for feature in self.features:
+            values = chunk[feature].to_numpy(dtype=float)
+            self.sketches[feature].update(values)
+            self.moments[feature].update(values)
+        return self
+
+    def merge(self, other):
+        if other.features != self.features:
+            raise ValueError(f"Cannot merge sketches of {other.features} into sketches of {self.features}")
+        self.row_count += other.row_count
+        for feature in self.features:
+            self.sketches[feature].merge(other.sketches[feature])
+            self.moments[feature].merge(other.moments[feature])
+        return self
+
+    def to_dict(self):
+        return {
+            "features": self.features, "k": self.k, "row_count": self.row_count,
+            "sketches": {feature: sketch.to_dict() for feature, sketch in self.sketches.items()},
+            "moments": {feature: moments.to_dict() for feature, moments in self.moments.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketches = cls(state["features"], state["k"])
+        sketches.row_count = state["row_count"]
+        sketches.sketches = {feature: KLLSketch.from_dict(sketch) for feature, sketch in state["sketches"].items()}
+        sketches.moments = {feature: WelfordMoments.from_dict(moments) for feature, moments in state["moments"].items()}
+        return sketches
+
+    def save(self, path):
+        with open(path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as json_file:
+            return cls.from_dict(json.load(json_file))
+
+
+# Function to build the sketches of a DataFrame, optionally chunk by chunk
+def build_sketches(df, features, k=DEFAULT_K, seed=0, chunksize=None):
+    sketches = FeatureSketches(features, k, seed)
+    if chunksize is None:
+        return sketches.update(df)
+    for start in range(0, len(df), chunksize):
+        sketches.update(df.iloc[start:start + chunksize])
+    return sketches
+
+# Function to merge the sketches of several partitions
+def merge_sketches(partitions):
+    '''Merge FeatureSketches (or their to_dict states) in the given order.'''
+    partitions = [FeatureSketches.from_dict(p) if isinstance(p, dict) else p for p in partitions]
+    if not partitions:
+        raise ValueError("No sketches to merge")
+    merged = FeatureSketches.from_dict(partitions[0].to_dict())
+    for partition in partitions[1:]:
+        merged.merge(partition)
+    return merged
+
+# Function to compute quantile bin edges of a reference sketch
+def quantile_bin_edges(sketch, bins=DEFAULT_BINS):
+    '''Distinct reference quantiles with open outer edges, e.g. bin_edges for DriftMetrics.'''
+    inner = np.unique(sketch.quantile(np.linspace(0, 1, bins + 1)[1:-1]))
+    return np.concatenate([[-np.inf], inner, [np.inf]])
+
+# Function to calculate PSI on the quantile bins of the reference sketch
+def sketch_psi(reference, current, bins=DEFAULT_BINS):
+    '''Bins are (e_i, e_i+1]; the shares come from the CDFs of both sketches.'''
+    edges = quantile_bin_edges(reference, bins)
+    inner = edges[1:-1]
+    reference_shares = np.diff(np.concatenate([[0.0], reference.cdf(inner), [1.0]]))
+    current_shares = np.diff(np.concatenate([[0.0], current.cdf(inner), [1.0]]))
+    return psi_from_counts(reference_shares, current_shares)
+
+# Function to evaluate both sketch CDFs on the union of their retained values
+def _joint_cdfs(reference, current):
+    points = np.union1d(reference.weighted_values()[0], current.weighted_values()[0])
+    return points, reference.cdf(points), current.cdf(points)
+
+# Function to estimate the KS distance between two sketches, with bounds
+def sketch_ks(reference, current, delta=DEFAULT_DELTA):
+    '''(estimate, lower bound, upper bound) of the two-sample KS statistic.
+
+    The estimate is the largest gap between the sketch CDFs (exact when neither sketch
+    compacted). The bounds add and subtract both rank errors, each taken with a union
+    bound over the evaluated points, so together they hold with probability >= 1 - delta.
+    '''
+    if reference.count == 0 or current.count == 0:
+        return float('nan'), float('nan'), float('nan')
+    points, reference_cdf, current_cdf = _joint_cdfs(reference, current)
+    statistic = float(np.max(np.abs(reference_cdf - current_cdf)))
+    per_point_delta = delta / (2 * len(points))
+    error = reference.rank_error(per_point_delta) + current.rank_error(per_point_delta)
+    return statistic, max(0.0, statistic - error), min(1.0, statistic + error)
+
+# Function to estimate the Wasserstein-1 distance between two sketches
+def sketch_wasserstein(reference, current):
+    '''Area between the two sketch CDFs (exact when neither sketch compacted).'''
+    if reference.count == 0 or current.count == 0:
+        return float('nan')
+    points, reference_cdf, current_cdf = _joint_cdfs(reference, current)
+    return float(np.sum(np.abs(reference_cdf - current_cdf)[:-1] * np.diff(points)))
+
+# Main function to compute drift between reference and current sketches
+def sketch_drift(reference, current, bins=DEFAULT_BINS, delta=DEFAULT_DELTA):
+    '''PSI, KS estimate and bounds, Wasserstein distance (normed) and exact moments per feature.
+
+    reference and current are FeatureSketches (or their to_dict states). Returns a DataFrame
+    with one row per feature common to both.
+    '''
+    reference = FeatureSketches.from_dict(reference) if isinstance(reference, dict) else reference
+    current = FeatureSketches.from_dict(current) if isinstance(current, dict) else current
+    rows = []
+    for feature in [feature for feature in reference.features if feature in current.sketches]:
+        reference_sketch, current_sketch = reference.sketches[feature], current.sketches[feature]
+        reference_moments, current_moments = reference.moments[feature], current.moments[feature]
+        ks_statistic, ks_lower, ks_upper = sketch_ks(reference_sketch, current_sketch, delta)
+        wasserstein = sketch_wasserstein(reference_sketch, current_sketch)
+        reference_std = reference_moments.std if reference_moments.count > 1 else np.nan
+        rows.append({
+            "feature": feature,
+            "reference_rows": reference_sketch.count,
+            "current_rows": current_sketch.count,
+            "mean_reference": reference_moments.mean if reference_moments.count else np.nan,
+            "mean_current": current_moments.mean if current_moments.count else np.nan,
+            "std_reference": reference_std,
+            "std_current": current_moments.std if current_moments.count > 1 else np.nan,
+            "psi": sketch_psi(reference_sketch, current_sketch, bins),
+            "ks_statistic": ks_statistic,
+            "ks_lower": ks_lower,
+            "ks_upper": ks_upper,
+            "wasserstein": wasserstein,
+            "wasserstein_normed": wasserstein / max(reference_std, MIN_NORM),
+            "exact": reference_sketch.exact and current_sketch.exact,
+        })
+    return pd.DataFrame(rows)
+
+
+# Example usage
+if __name__ == "__main__":
+    from scipy import stats
+
+    data = pd.read_csv('sample_data.csv')
+    features = ['temp', 'atemp', 'hum', 'windspeed', 'cnt']
+    reference, current = data.iloc[:12000], data.iloc[12000:17379]
+
+    # Sketch the reference in four partitions (e.g. four workers), serialize, then merge
+    partitions = [build_sketches(reference.iloc[rows], features).to_dict()
+                  for rows in np.array_split(np.arange(len(reference)), 4)]
+    reference_sketches = merge_sketches(json.loads(json.dumps(partitions)))
+    current_sketches = build_sketches(current, features, chunksize=1000)
+
+    results = sketch_drift(reference_sketches, current_sketches)
+    results["ks_exact"] = [stats.ks_2samp(reference[f], current[f]).statistic for f in results["feature"]]
+    results["wasserstein_exact"] = [stats.wasserstein_distance(reference[f], current[f]) for f in results["feature"]]
+    print(results[['feature', 'psi', 'ks_statistic', 'ks_lower', 'ks_upper', 'ks_exact',
+                   'wasserstein', 'wasserstein_exact']].to_string())
+    print(f"Retained values per feature: {reference_sketches.sketches['cnt'].size} of {len(reference)} (reference)")
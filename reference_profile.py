@@ -0,0 +1,188 @@
+import os
+import json
+import hashlib
+import datetime
+import numpy as np
+import pandas as pd
+
+# Bump whenever the profile layout or the way its contents are computed changes;
+# cached profiles written with another version are rebuilt on load.
+PROFILE_VERSION = 2
+DEFAULT_BINS = 10
+DEFAULT_CACHE_DIR = 'reference_profiles'
+
+# Function to fingerprint the contents of a DataFrame
+def dataset_fingerprint(df):
+    """Hash the values, index, columns and dtypes of a DataFrame.
+
+    Every row is hashed: a fingerprint of a sample would miss edits between the sampled
+    rows and silently reuse a stale profile. Callers that read the reference from a file
+    can pass file_fingerprint() instead, which does not read the data.
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(json.dumps([str(col) for col in df.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in df.dtypes]).encode())
+    return digest.hexdigest()
+
+# Function to fingerprint a source file without reading it
+def file_fingerprint(path, rows=None):
+    """Cheap fingerprint from the file path, size, mtime and the row range used as reference."""
+    stat = os.stat(path)
+    key = {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "rows": None if rows is None else [rows.start, rows.stop],
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+# Function to describe a column mapping as a plain dictionary
+def column_mapping_to_dict(column_mapping):
+    """Extract the fields of a ColumnMapping that affect the reference profile."""
+    def as_list(value):
+        return None if value is None else list(value)
+
+    return {
+        "target": column_mapping.target,
+        "prediction": column_mapping.prediction,
+        "numerical_features": as_list(column_mapping.numerical_features),
+        "categorical_features": as_list(column_mapping.categorical_features),
+    }
+
+# Function to list the dtypes of the columns a profile is built from
+def profile_dtypes(reference, column_mapping):
+    """{column: dtype name} of the mapped columns, e.g. float32 after data_loading's compaction."""
+    mapping = column_mapping_to_dict(column_mapping)
+    columns = [mapping["target"], mapping["prediction"]] + (mapping["numerical_features"] or []) \
+        + (mapping["categorical_features"] or [])
+    return {column: str(reference[column].dtype) for column in columns
+            if isinstance(column, str) and column in reference.columns}
+
+# Function to build the cache key of a reference profile
+def profile_cache_key(fingerprint, column_mapping, model_version, bins=DEFAULT_BINS, dtypes=None):
+    """Key a profile by dataset fingerprint, column mapping, model version, column dtypes and layout version.
+
+    A file fingerprint does not say how the file was loaded, so the dtypes (compact or full
+    precision) are part of the key: a float32 load and a float64 load of the same rows get
+    separate profiles.
+    """
+    key = {
+        "profile_version": PROFILE_VERSION,
+        "fingerprint": fingerprint,
+        "column_mapping": column_mapping_to_dict(column_mapping),
+        "model_version": model_version,
+        "bins": bins,
+        "dtypes": dtypes,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+# Function to normalise a column the same way check_for_new_classes does
+def class_values(series):
+    """Return the unique stripped string values of a column."""
+    return series.astype(str).str.strip().unique()
+
+# Function to compute the moments of a numerical column
+def column_moments(series):
+    """Count, mean, standard deviation and variance (pandas semantics, ddof=1), reduced in float64."""
+    series = series.astype('float64')
+    return {
+        "count": int(series.count()),
+        "mean": float(series.mean()),
+        "std": float(series.std()),
+        "var": float(series.var()),
+    }
+
+# Function to compute fixed-width histogram edges and counts of a numerical column
+def column_histogram(series, bins=DEFAULT_BINS):
+    """Equal-width bins spanning the reference range, with the counts of the reference."""
+    values = series.dropna().to_numpy(dtype=float)
+    if len(values) == 0:
+        return {"bin_edges": [], "counts": []}
+    counts, bin_edges = np.histogram(values, bins=bins)
+    return {"bin_edges": bin_edges.tolist(), "counts": counts.tolist()}
+
+# Function to build a reference profile
+def build_reference_profile(reference, column_mapping, model_version, bins=DEFAULT_BINS, fingerprint=None):
+    """Precompute everything monitor_model_data needs from the reference data."""
+    numerical_features = list(column_mapping.numerical_features or [])
+    categorical_features = list(column_mapping.categorical_features or [])
+    histogram_columns = numerical_features + [
+        col for col in (column_mapping.target, column_mapping.prediction)
+        if col is not None and col in reference.columns and pd.api.types.is_numeric_dtype(reference[col])
+    ]
+
+    if fingerprint is None:
+        fingerprint = dataset_fingerprint(reference)
+
+    profile = {
+        "profile_version": PROFILE_VERSION,
+        "model_version": model_version,
+        "fingerprint": fingerprint,
+        "column_mapping": column_mapping_to_dict(column_mapping),
+        "dtypes": profile_dtypes(reference, column_mapping),
+        "bins": bins,
+        "created_at": datetime.datetime.now().isoformat(),
+        "record_count": len(reference),
+        "moments": {feature: column_moments(reference[feature]) for feature in numerical_features},
+        "class_vocabularies": {
+            feature: sorted(class_values(reference[feature]).tolist())
+            for feature in numerical_features + categorical_features
+        },
+        "histograms": {feature: column_histogram(reference[feature], bins) for feature in histogram_columns},
+    }
+    return profile
+
+# Function to save a reference profile as JSON
+def save_reference_profile(profile, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so a concurrent reader never sees a partial profile
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as json_file:
+        json.dump(profile, json_file)
+    os.replace(tmp_path, path)
+
+# Function to load a reference profile, returning None if it is missing or stale
+def load_reference_profile(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as json_file:
+        profile = json.load(json_file)
+    if profile.get("profile_version") != PROFILE_VERSION:
+        return None
+    return profile
+
+# Function to load a cached reference profile or build and cache a new one
+def load_or_build_reference_profile(reference, column_mapping, model_version, cache_dir=DEFAULT_CACHE_DIR,
+                                    bins=DEFAULT_BINS, fingerprint=None):
+    """Return the cached profile for this reference, building it on the first call."""
+    if fingerprint is None:
+        fingerprint = dataset_fingerprint(reference)
+    key = profile_cache_key(fingerprint, column_mapping, model_version, bins, profile_dtypes(reference, column_mapping))
+    path = os.path.join(cache_dir, f"{key}.json")
+
+    profile = load_reference_profile(path)
+    if profile is None:
+        profile = build_reference_profile(reference, column_mapping, model_version, bins, fingerprint)
+        save_reference_profile(profile, path)
+    return profile
+
+# Function to drop cached profiles, e.g. after a model release
+def invalidate_reference_profiles(cache_dir=DEFAULT_CACHE_DIR, model_version=None):
+    """Delete cached profiles for one model version (or all of them). Returns the number removed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(cache_dir, name)
+        if model_version is not None:
+            with open(path) as json_file:
+                if json.load(json_file).get("model_version") != model_version:
+                    continue
+        os.remove(path)
+        removed += 1
+    return removed
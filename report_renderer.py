@@ -0,0 +1,228 @@
+import os
+import html
+import zlib
+import struct
+import numpy as np
+from result_store import extract_feature_drift
+from reference_profile import column_histogram
+from streaming import FixedBinHistogram, psi_from_counts
+
+# Lightweight summary report rendered from binned aggregates.
+#
+# The Evidently HTML reports embed the data they plot (about 3 MB each for the sample
+# data). This renderer only ever sees per-feature bin edges and reference/current counts
+# (binned_aggregates reduces the frames to those; the reference side comes from the
+# reference profile) plus the drift scores and statistics already in final_results, so no
+# raw row reaches the output and its size does not grow with the data. Plots are inline
+# SVG written by hand (or a PNG of the bars, encoded with zlib), so neither matplotlib nor
+# seaborn is imported and a report renders in milliseconds.
+#
+# The output is kept within a byte budget: the run header and the summary table come
+# first, then one histogram panel per feature, drifted and highest-scoring features
+# first. A panel that does not fit is retried with its bins merged down to
+# DOWNSAMPLED_BINS; what still does not fit is listed as omitted at the end.
+DEFAULT_BYTE_BUDGET = 150_000
+DOWNSAMPLED_BINS = 5
+REFERENCE_COLOR = '#4c72b0'
+CURRENT_COLOR = '#dd8452'
+PANEL_WIDTH, PANEL_HEIGHT = 320, 150
+# Room kept for the closing tags and the omitted-features note
+FOOTER_BYTES = 400
+SUMMARY_COLUMNS = ('drift_score', 'drift_detected', 'psi', 'mean_reference', 'mean_current', 'std_reference',
+                   'std_current')
+
+# Function to reduce reference and current frames to per-feature bin counts
+def binned_aggregates(reference, current, features, reference_profile=None):
+    """{feature: {"bin_edges", "reference", "current"}} on the reference profile's bins (or
+    equal-width reference bins); the reference counts come from the profile when it has them."""
+    histograms = reference_profile["histograms"] if reference_profile else {}
+    aggregates = {}
+    for feature in features:
+        histogram = histograms.get(feature) or column_histogram(reference[feature])
+        if not histogram["bin_edges"]:
+            continue
+        current_histogram = FixedBinHistogram(histogram["bin_edges"]).update(current[feature].to_numpy(dtype=float))
+        aggregates[feature] = {"bin_edges": list(histogram["bin_edges"]), "reference": list(histogram["counts"]),
+                               "current": current_histogram.counts.tolist()}
+    return aggregates
+
+# Function to merge adjacent bins until at most max_bins are left
+def downsample(aggregate, max_bins):
+    edges = np.asarray(aggregate["bin_edges"], dtype=float)
+    reference, current = np.asarray(aggregate["reference"]), np.asarray(aggregate["current"])
+    while len(reference) > max_bins:
+        pairs = np.arange(0, len(reference), 2)
+        reference, current = np.add.reduceat(reference, pairs), np.add.reduceat(current, pairs)
+        edges = np.concatenate([edges[:-1][::2], edges[-1:]])
+    return {"bin_edges": edges.tolist(), "reference": reference.tolist(), "current": current.tolist()}
+
+# Function to format a number compactly for labels and tables
+def format_number(value):
+    if value is None:
+        return '-'
+    if isinstance(value, str):
+        return html.escape(value)
+    if isinstance(value, (bool, np.bool_)):
+        return 'yes' if value else 'no'
+    if isinstance(value, (int, np.integer)):
+        return str(value)
+    if not np.isfinite(value):
+        return '-'
+    return f"{value:.4g}"
+
+# Function to draw the reference and current shares of one feature as an SVG bar chart
+def svg_histogram(feature, aggregate, caption=''):
+    reference, current = np.asarray(aggregate["reference"], float), np.asarray(aggregate["current"], float)
+    shares = [counts / counts.sum() if counts.sum() else counts for counts in (reference, current)]
+    top = max(float(np.max(shares[0], initial=0)), float(np.max(shares[1], initial=0))) or 1.0
+    n_bins = len(reference)
+    left, bottom, plot_width, plot_height = 8, PANEL_HEIGHT - 18, PANEL_WIDTH - 16, PANEL_HEIGHT - 40
+    bar = plot_width / max(n_bins, 1) / 2
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{PANEL_WIDTH}" height="{PANEL_HEIGHT}">',
+             f'<text x="{left}" y="13" font-size="12">{html.escape(str(feature))} {html.escape(caption)}</text>']
+    for side, color in ((0, REFERENCE_COLOR), (1, CURRENT_COLOR)):
+        for i, share in enumerate(shares[side]):
+            height = share / top * plot_height
+            parts.append(f'<rect x="{left + (2 * i + side) * bar:.1f}" y="{bottom - height:.1f}" '
+                         f'width="{bar:.1f}" height="{height:.1f}" fill="{color}"/>')
+    edges = aggregate["bin_edges"]
+    parts.append(f'<text x="{left}" y="{PANEL_HEIGHT - 4}" font-size="10">{format_number(edges[0])}</text>')
+    parts.append(f'<text x="{left + plot_width}" y="{PANEL_HEIGHT - 4}" font-size="10" text-anchor="end">'
+                 f'{format_number(edges[-1])}</text></svg>')
+    return ''.join(parts)
+
+# Function to collect the per-feature summary rows, most drifted first
+def summary_rows(final_results, aggregates):
+    rows = {}
+    for report in ('data_drift_metrics', 'target_drift_metrics'):
+        for feature, _, _, _, drift_score, drift_detected in extract_feature_drift(final_results.get(report, {})):
+            rows.setdefault(feature, {"drift_score": drift_score, "drift_detected": bool(drift_detected)})
+    for feature, statistics in final_results.get('statistical_summary', {}).items():
+        rows.setdefault(feature, {}).update(statistics)
+    for feature, aggregate in aggregates.items():
+        rows.setdefault(feature, {})["psi"] = psi_from_counts(aggregate["reference"], aggregate["current"])
+    return sorted(rows.items(), key=lambda item: (not item[1].get("drift_detected", False),
+                                                   -(item[1].get("drift_score") or 0.0), str(item[0])))
+
+# Main function to render the summary as HTML within a byte budget
+def render_summary_html(final_results, aggregates, byte_budget=DEFAULT_BYTE_BUDGET, title='Monitoring summary'):
+    metadata = final_results.get('metadata', {})
+    head = ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>' + html.escape(title) + '</title><style>'
+            'body{font-family:sans-serif;font-size:13px}table{border-collapse:collapse}'
+            'td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}'
+            f'.r{{color:{REFERENCE_COLOR}}}.c{{color:{CURRENT_COLOR}}}svg{{margin:4px}}</style></head><body>'
+            f'<h2>{html.escape(title)}</h2><p>')
+    head += ' | '.join(f'{html.escape(key)}: {format_number(metadata[key])}' for key in
+                       ('model_version', 'source_system', 'event_timestamp', 'record_count_reference',
+                        'record_count_current', 'new_class_detected') if key in metadata)
+    head += (f'</p><p><span class="r">&#9632; reference</span> <span class="c">&#9632; current</span></p>'
+             '<table><tr><th>feature</th>' + ''.join(f'<th>{column}</th>' for column in SUMMARY_COLUMNS) + '</tr>')
+    used = len(head.encode()) + FOOTER_BYTES
+    if used > byte_budget:
+        raise ValueError(f"A byte budget of {byte_budget} is too small for the report header ({used} bytes)")
+
+    parts, omitted_rows, omitted_panels = [head], [], []
+    rows = summary_rows(final_results, aggregates)
+    for feature, values in rows:
+        row = f'<tr><th>{html.escape(str(feature))}</th>' + ''.join(
+            f'<td>{format_number(values.get(column))}</td>' for column in SUMMARY_COLUMNS) + '</tr>'
+        if used + len(row.encode()) > byte_budget:
+            omitted_rows.append(feature)
+            continue
+        parts.append(row)
+        used += len(row.encode())
+    parts.append('</table><div>')
+
+    for feature, values in rows:
+        if feature not in aggregates:
+            continue
+        caption = f"(drift score {format_number(values.get('drift_score'))}, PSI {format_number(values.get('psi'))})"
+        panel = svg_histogram(feature, aggregates[feature], caption)
+        if used + len(panel.encode()) > byte_budget:
+            panel = svg_histogram(feature, downsample(aggregates[feature], DOWNSAMPLED_BINS), caption)
+        if used + len(panel.encode()) > byte_budget:
+            omitted_panels.append(feature)
+            continue
+        parts.append(panel)
+        used += len(panel.encode())
+
+    parts.append('</div>')
+    if omitted_rows or omitted_panels:
+        note = f'Omitted to stay within {byte_budget} bytes: {len(omitted_rows)} table rows, ' \
+               f'{len(omitted_panels)} plots.'
+        parts.append(f'<p>{html.escape(note)}</p>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+# Function to encode an RGB image (rows x columns x 3, uint8) as PNG
+def encode_png(image):
+    height, width, _ = image.shape
+    raw = b''.join(b'\x00' + image[row].tobytes() for row in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 9)) + chunk(b'IEND', b''))
+
+# Function to render the histogram panels as one PNG (bars only; labels are in the HTML)
+def render_summary_png(final_results, aggregates, byte_budget=DEFAULT_BYTE_BUDGET, columns=3,
+                       panel_size=(160, 80)):
+    features = [feature for feature, _ in summary_rows(final_results, aggregates) if feature in aggregates]
+    colors = [np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)], dtype=np.uint8)
+              for color in (REFERENCE_COLOR, CURRENT_COLOR)]
+    panel_width, panel_height = panel_size
+
+    def draw(selected):
+        n_rows = max(1, -(-len(selected) // columns))
+        image = np.full((n_rows * panel_height, columns * panel_width, 3), 255, dtype=np.uint8)
+        for index, feature in enumerate(selected):
+            top, left = (index // columns) * panel_height, (index % columns) * panel_width
+            counts = [np.asarray(aggregates[feature][side], float) for side in ('reference', 'current')]
+            shares = [c / c.sum() if c.sum() else c for c in counts]
+            peak = max(float(np.max(shares[0], initial=0)), float(np.max(shares[1], initial=0))) or 1.0
+            bar = max(1, (panel_width - 8) // (2 * max(len(shares[0]), 1)))
+            for side in (0, 1):
+                for i, share in enumerate(shares[side]):
+                    height = int(round(share / peak * (panel_height - 8)))
+                    x = left + 4 + (2 * i + side) * bar
+                    image[top + panel_height - 4 - height:top + panel_height - 4, x:x + bar] = colors[side]
+        return encode_png(image)
+
+    # Drop the lowest-priority panels until the image fits the budget
+    while True:
+        png = draw(features)
+        if len(png) <= byte_budget or not features:
+            return png
+        features = features[:-1]
+
+# Function to write the summary report (.html or .png by extension)
+def save_summary(final_results, aggregates, path, byte_budget=DEFAULT_BYTE_BUDGET):
+    """Write the report and return its size in bytes."""
+    if os.path.splitext(path)[1].lower() == '.png':
+        content = render_summary_png(final_results, aggregates, byte_budget)
+    else:
+        content = render_summary_html(final_results, aggregates, byte_budget).encode()
+    with open(path, 'wb') as output_file:
+        output_file.write(content)
+    return len(content)
+
+
+# Example usage
+if __name__ == "__main__":
+    import json
+    import time
+    import pandas as pd
+
+    data = pd.read_csv('sample_data.csv')
+    reference, current = data.iloc[:12000], data.iloc[12000:17379]
+    features = ['temp', 'atemp', 'hum', 'windspeed', 'hr', 'weekday', 'cnt']
+    with open('monitoring_results.json') as json_file:
+        final_results = json.load(json_file)
+
+    start = time.perf_counter()
+    aggregates = binned_aggregates(reference, current, features)
+    html_bytes = save_summary(final_results, aggregates, 'summary_report.html')
+    png_bytes = save_summary(final_results, aggregates, 'summary_report.png')
+    print(f"summary_report.html ({html_bytes} bytes) and summary_report.png ({png_bytes} bytes) "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
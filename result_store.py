@@ -0,0 +1,207 @@
+import os
+import json
+import zlib
+import sqlite3
+import argparse
+import pandas as pd
+
+# Append-only result store for monitoring runs.
+#
+# Every run of monitor_model_data is appended to a SQLite database with a typed schema:
+#   runs               - one row per run (metadata and dataset-level drift);
+#   feature_drift      - one row per (run, report, feature) with the drift test outcome;
+#   feature_statistics - one row per (run, feature) with the statistical summary;
+#   raw_results        - the full nested results, zlib-compressed, for offline export.
+# History is kept across runs and can be queried with SQL; JSON/Excel files are produced
+# offline with export_run instead of on every run.
+DEFAULT_STORE_PATH = 'monitoring_results.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_timestamp TEXT NOT NULL,
+    event_type TEXT,
+    load_date TEXT,
+    source_system TEXT,
+    user TEXT,
+    model_version TEXT,
+    record_count_reference INTEGER,
+    record_count_current INTEGER,
+    new_class_detected TEXT,
+    new_class_details TEXT,
+    dataset_drift INTEGER,
+    number_of_drifted_columns INTEGER,
+    share_of_drifted_columns REAL,
+    metadata_json TEXT
+);
+CREATE TABLE IF NOT EXISTS feature_drift (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    report TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    column_type TEXT,
+    stattest_name TEXT,
+    stattest_threshold REAL,
+    drift_score REAL,
+    drift_detected INTEGER
+);
+CREATE TABLE IF NOT EXISTS feature_statistics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    feature TEXT NOT NULL,
+    mean_reference REAL,
+    std_reference REAL,
+    var_reference REAL,
+    mean_current REAL,
+    std_current REAL,
+    var_current REAL
+);
+CREATE TABLE IF NOT EXISTS raw_results (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(run_id),
+    results BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_model_time ON runs (model_version, event_timestamp);
+CREATE INDEX IF NOT EXISTS feature_drift_feature ON feature_drift (feature, run_id);
+CREATE INDEX IF NOT EXISTS feature_statistics_feature ON feature_statistics (feature, run_id);
+"""
+
+STATISTIC_COLUMNS = ['mean_reference', 'std_reference', 'var_reference', 'mean_current', 'std_current', 'var_current']
+
+# Function to open (and create if needed) the result store
+def open_result_store(path=DEFAULT_STORE_PATH):
+    # A generous timeout lets concurrent batch workers append to the same store
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+# Function to extract per-feature drift rows from an Evidently report dictionary
+def extract_feature_drift(report_results):
+    rows = []
+    for metric in report_results.get('metrics', []):
+        result = metric.get('result', {})
+        if 'drift_by_columns' in result:
+            columns = result['drift_by_columns'].values()
+        elif 'drift_score' in result and 'column_name' in result:
+            columns = [result]
+        else:
+            continue
+        for column in columns:
+            rows.append((column['column_name'], column.get('column_type'), column.get('stattest_name'),
+                         column.get('stattest_threshold'), column.get('drift_score'),
+                         None if column.get('drift_detected') is None else int(column['drift_detected'])))
+    return rows
+
+# Function to extract the dataset-level drift result of the data drift report
+def extract_dataset_drift(report_results):
+    for metric in report_results.get('metrics', []):
+        result = metric.get('result', {})
+        if 'dataset_drift' in result:
+            return int(result['dataset_drift']), result.get('number_of_drifted_columns'), \
+                result.get('share_of_drifted_columns')
+    return None, None, None
+
+# Function to append the results of one run to the store
+def append_results(final_results, path=DEFAULT_STORE_PATH, keep_raw=True):
+    """Append a run and return its run_id."""
+    metadata = final_results['metadata']
+    dataset_drift, number_of_drifted_columns, share_of_drifted_columns = \
+        extract_dataset_drift(final_results.get('data_drift_metrics', {}))
+
+    connection = open_result_store(path)
+    try:
+        with connection:
+            cursor = connection.execute(
+                """INSERT INTO runs (event_timestamp, event_type, load_date, source_system, user, model_version,
+                                     record_count_reference, record_count_current, new_class_detected,
+                                     new_class_details, dataset_drift, number_of_drifted_columns,
+                                     share_of_drifted_columns, metadata_json)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (metadata.get('event_timestamp'), metadata.get('event_type'), metadata.get('load_date'),
+                 metadata.get('source_system'), metadata.get('user'), metadata.get('model_version'),
+                 metadata.get('record_count_reference'), metadata.get('record_count_current'),
+                 metadata.get('new_class_detected'), metadata.get('new_class_details'), dataset_drift,
+                 number_of_drifted_columns, share_of_drifted_columns, json.dumps(metadata, default=str)))
+            run_id = cursor.lastrowid
+
+            for report in ('data_drift', 'target_drift'):
+                rows = extract_feature_drift(final_results.get(f'{report}_metrics', {}))
+                connection.executemany(
+                    """INSERT INTO feature_drift (run_id, report, feature, column_type, stattest_name,
+                                                  stattest_threshold, drift_score, drift_detected)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    [(run_id, report) + row for row in rows])
+
+            connection.executemany(
+                f"""INSERT INTO feature_statistics (run_id, feature, {', '.join(STATISTIC_COLUMNS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(run_id, feature) + tuple(float(stats[column]) for column in STATISTIC_COLUMNS)
+                 for feature, stats in final_results.get('statistical_summary', {}).items()])
+
+            if keep_raw:
+                raw = zlib.compress(json.dumps(final_results, default=str, separators=(',', ':')).encode())
+                connection.execute("INSERT INTO raw_results (run_id, results) VALUES (?, ?)", (run_id, raw))
+    finally:
+        connection.close()
+    return run_id
+
+# Function to run a query against the store and return a DataFrame
+def query(sql, params=(), path=DEFAULT_STORE_PATH):
+    connection = open_result_store(path)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+# Function to list runs, optionally filtered by model version and start time
+def query_runs(path=DEFAULT_STORE_PATH, model_version=None, since=None):
+    sql = "SELECT * FROM runs WHERE (? IS NULL OR model_version = ?) AND (? IS NULL OR event_timestamp >= ?) " \
+          "ORDER BY run_id"
+    return query(sql, (model_version, model_version, since, since), path)
+
+# Function to get the drift history of features across runs
+def query_feature_drift(path=DEFAULT_STORE_PATH, feature=None, model_version=None, report='data_drift'):
+    sql = """SELECT r.run_id, r.event_timestamp, r.model_version, r.source_system, d.report, d.feature,
+                    d.stattest_name, d.drift_score, d.drift_detected
+             FROM feature_drift d JOIN runs r ON r.run_id = d.run_id
+             WHERE d.report = ? AND (? IS NULL OR d.feature = ?) AND (? IS NULL OR r.model_version = ?)
+             ORDER BY r.run_id, d.feature"""
+    return query(sql, (report, feature, feature, model_version, model_version), path)
+
+# Function to load the full results of a run
+def load_run_results(run_id, path=DEFAULT_STORE_PATH):
+    connection = open_result_store(path)
+    try:
+        row = connection.execute("SELECT results FROM raw_results WHERE run_id = ?", (run_id,)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        raise KeyError(f"No stored results for run_id {run_id}")
+    return json.loads(zlib.decompress(row[0]))
+
+# Function to export a stored run as the JSON and Excel files of save_results_as_files
+def export_run(run_id, output_dir='.', path=DEFAULT_STORE_PATH):
+    from Monitoring import save_results_as_files
+
+    os.makedirs(output_dir, exist_ok=True)
+    save_results_as_files(load_run_results(run_id, path), output_dir)
+    return output_dir
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or export the monitoring result store.")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    runs_parser = subparsers.add_parser('runs', help="List stored runs")
+    runs_parser.add_argument('--model-version', default=None)
+    drift_parser = subparsers.add_parser('drift', help="Drift history of the features")
+    drift_parser.add_argument('--feature', default=None)
+    drift_parser.add_argument('--model-version', default=None)
+    export_parser = subparsers.add_parser('export', help="Export a run as JSON and Excel files")
+    export_parser.add_argument('run_id', type=int)
+    export_parser.add_argument('--output-dir', default='.')
+    args = parser.parse_args()
+
+    if args.command == 'runs':
+        print(query_runs(args.store, args.model_version).drop(columns=['metadata_json']).to_string(index=False))
+    elif args.command == 'drift':
+        print(query_feature_drift(args.store, args.feature, args.model_version).to_string(index=False))
+    else:
+        print(f"Run {args.run_id} exported to {export_run(args.run_id, args.output_dir, args.store)}")
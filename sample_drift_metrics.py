@@ -1,99 +1,115 @@
 import pandas as pd
 import numpy as np
-from scipy import stats
+from drift_engine import block_psi
+from ks_engine import ks_from_counts
+
+# Static bin ranges of the score deciles (adjust these based on your needs)
+STATIC_BIN_EDGES = [0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 1.0]
+PSI_EPSILON = 1e-6
 
 class DriftMetrics:
-    def __init__(self, reference_df, current_df, col='probabilities_score'):
-        '''Initialize the class with reference and current datasets.'''
-        self.reference_df = reference_df
-        self.current_df = current_df
-        self.col = col
-    
-    # Instance method for assigning static deciles based on fixed bin ranges
-    def assign_static_deciles(self):
-        '''This function assigns static deciles based on predefined bin ranges.'''
-
-        # Define static bin ranges (adjust these based on your needs)
-        bin_edges = [0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 1.0]
-        bin_labels = [f'Decile_{i+1}' for i in range(len(bin_edges)-1)]
-
-        # Assign deciles based on static bin ranges
-        self.reference_df['decile'] = pd.cut(self.reference_df[self.col], bins=bin_edges, labels=bin_labels, include_lowest=True)
-        self.current_df['decile'] = pd.cut(self.current_df[self.col], bins=bin_edges, labels=bin_labels, include_lowest=True)
-
-        return self.reference_df, self.current_df
-
-    # Instance method for calculating KS Statistic for drift detection
-    def calculate_ks_stat(self, p_value_threshold=0.05):
-        '''This function performs the KS test on the decile column of two datasets to detect drift.'''
-
-        test = stats.ks_2samp(self.reference_df['decile'].cat.codes, self.current_df['decile'].cat.codes)
-        if test[1] < p_value_threshold:
-            print(f"Significant drift detected in column: {self.col} as KS Statistic: {test[0]:.4f}, p-value: {test[1]:.4f}")
-            return True
-        else:
-            print(f"No significant drift detected in column: {self.col} as KS Statistic: {test[0]:.4f}, p-value: {test[1]:.4f}")
-            return False
-
-    # Instance method for calculating Population Stability Index (PSI)
-    def calculate_psi(self):
-        '''Calculates the PSI based on the decile column between two datasets.'''
-
-        # Calculate decile distributions (proportions) for reference and current datasets
-        reference_dist = self.reference_df['decile'].value_counts(normalize=True).sort_index()
-        current_dist = self.current_df['decile'].value_counts(normalize=True).sort_index()
-
-        # Ensure both distributions have all deciles represented (if missing, fill with 0)
-        all_deciles = pd.Series([f'Decile_{i+1}' for i in range(10)])
-        reference_dist = reference_dist.reindex(all_deciles, fill_value=0)
-        current_dist = current_dist.reindex(all_deciles, fill_value=0)
-
-        # Replace zeroes to avoid division by zero or log of zero errors
-        reference_dist = np.where(reference_dist == 0, 1e-6, reference_dist)
-        current_dist = np.where(current_dist == 0, 1e-6, current_dist)
-
-        # Calculate PSI using the formula
-        psi_values = (current_dist - reference_dist) * np.log(current_dist / reference_dist)
-        psi = np.sum(psi_values)
-
-        return psi
-
-
-# Sample data
-data = {
-    'probabilities_score': [0.0192, 0.05, 0.1537, 0.2141, 0.35, 0.65, 0.79, 0.101, 0.27, 0.6]
-}
-
-current1 = {
-    'probabilities_score': [0.0192, 0.05, 0.1537, 0.2141, 0.35, 0.65, 0.79, 0.101, 0.27, 0.6]
-}
-current2 = {
-    'probabilities_score': [0.06, 0.16, 0.24, 0.34, 0.44, 0.35, 0.66, 0.58, 0.28, 0.9]
-}
-
-# Create DataFrames
-reference = pd.DataFrame(data)
-current1 = pd.DataFrame(current1)
-current2 = pd.DataFrame(current2)
-
-# Create DriftMetrics instance
-drift_metrics1 = DriftMetrics(reference, current1)
-drift_metrics2 = DriftMetrics(reference, current2)
-
-# Assign deciles
-reference, current1 = drift_metrics1.assign_static_deciles()
-reference, current2 = drift_metrics2.assign_static_deciles()
-
-# Calculate KS Statistic
-print("KS Test for current dataset 1:")
-drift_metrics1.calculate_ks_stat()
-
-print("KS Test for current dataset 2:")
-drift_metrics2.calculate_ks_stat()
-
-# Calculate PSI
-psi_value1 = drift_metrics1.calculate_psi()
-psi_value2 = drift_metrics2.calculate_psi()
-
-print("PSI value for current1 dataset:", psi_value1)
-print("PSI value for current2 dataset:", psi_value2)
+    '''Binned drift metrics (KS and PSI) of score columns against a reference.
+
+    The reference columns are binned once into a compact int8 code array (rows x columns)
+    and reduced to per-bin counts; current datasets are only reduced to their counts. No
+    column is added to the reference or current DataFrames. For scores outside [0, 1] (or
+    unbounded ones), pass bin_edges=quantile_sketch.quantile_bin_edges(reference_sketch):
+    the reference deciles with open outer bins.
+    '''
+
+    def __init__(self, reference_df, cols=('probabilities_score',), bin_edges=STATIC_BIN_EDGES):
+        '''Bin the reference columns once.'''
+        self.cols = [cols] if isinstance(cols, str) else list(cols)
+        self.bin_edges = np.asarray(bin_edges, dtype=float)
+        self.n_bins = len(self.bin_edges) - 1
+        if self.n_bins > np.iinfo(np.int8).max:
+            raise ValueError(f"At most {np.iinfo(np.int8).max} bins fit in int8 codes, got {self.n_bins}")
+        self.bin_labels = [f'Decile_{i+1}' for i in range(self.n_bins)]
+        self.reference_codes = self.bin_codes(reference_df)
+        self.reference_counts = self.code_counts(self.reference_codes)
+
+    # Instance method for assigning static bins (deciles) to every score column
+    def bin_codes(self, df):
+        '''int8 bin codes (rows x columns), like pd.cut(include_lowest=True); values outside the
+        bin ranges and NaNs get -1.'''
+        values = df[self.cols].to_numpy(dtype=float)
+        codes = np.searchsorted(self.bin_edges, values, side='left') - 1
+        codes[values == self.bin_edges[0]] = 0
+        codes[(codes >= self.n_bins) | np.isnan(values)] = -1
+        return codes.astype(np.int8)
+
+    # Instance method for counting the codes of every column
+    def code_counts(self, codes):
+        '''Counts (columns x bins) of a code array; -1 codes are ignored.'''
+        flat = codes.astype(np.int64) + np.arange(len(self.cols)) * self.n_bins
+        counts = np.bincount(flat[codes >= 0], minlength=len(self.cols) * self.n_bins)
+        return counts.reshape(len(self.cols), self.n_bins)
+
+    # Instance method for calculating KS and PSI of many current datasets at once
+    def evaluate(self, current_dfs, p_value_threshold=0.05, ks_method='auto'):
+        '''KS statistic, p-value, drift flag and PSI of every (current dataset, column).
+
+        current_dfs is a DataFrame, a list of DataFrames or a dict of named DataFrames.
+        KS comes from the bin counts (ks_engine.ks_from_counts: exact p-value for small
+        samples, asymptotic otherwise). Returns a DataFrame with one row per (dataset, column).
+        '''
+        if isinstance(current_dfs, pd.DataFrame):
+            current_dfs = [current_dfs]
+        names = list(current_dfs) if isinstance(current_dfs, dict) else list(range(len(current_dfs)))
+        frames = current_dfs.values() if isinstance(current_dfs, dict) else current_dfs
+        current_counts = np.stack([self.code_counts(self.bin_codes(frame)) for frame in frames])
+        reference_counts = np.broadcast_to(self.reference_counts, current_counts.shape)
+
+        ks_statistic, p_value = ks_from_counts(reference_counts, current_counts, ks_method)
+        psi = block_psi(reference_counts, current_counts, PSI_EPSILON)
+        return pd.DataFrame({
+            "dataset": np.repeat(names, len(self.cols)),
+            "column": np.tile(self.cols, len(names)),
+            "ks_statistic": ks_statistic.ravel(),
+            "p_value": p_value.ravel(),
+            "drift_detected": (p_value < p_value_threshold).ravel(),
+            "psi": psi.ravel(),
+        })
+
+    # Instance method for the decile distribution of the reference and a current dataset
+    def distribution(self, current_df):
+        '''Share of rows per bin for the reference and a current dataset, per column.'''
+        current_counts = self.code_counts(self.bin_codes(current_df))
+        rows = []
+        for j, col in enumerate(self.cols):
+            rows.append(pd.DataFrame({
+                "column": col,
+                "decile": self.bin_labels,
+                "reference": self.reference_counts[j] / max(self.reference_counts[j].sum(), 1),
+                "current": current_counts[j] / max(current_counts[j].sum(), 1),
+            }))
+        return pd.concat(rows, ignore_index=True)
+
+
+# Example usage
+if __name__ == "__main__":
+    # Sample data
+    data = {
+        'probabilities_score': [0.0192, 0.05, 0.1537, 0.2141, 0.35, 0.65, 0.79, 0.101, 0.27, 0.6]
+    }
+
+    current1 = {
+        'probabilities_score': [0.0192, 0.05, 0.1537, 0.2141, 0.35, 0.65, 0.79, 0.101, 0.27, 0.6]
+    }
+    current2 = {
+        'probabilities_score': [0.06, 0.16, 0.24, 0.34, 0.44, 0.35, 0.66, 0.58, 0.28, 0.9]
+    }
+
+    # Create DataFrames
+    reference = pd.DataFrame(data)
+    current1 = pd.DataFrame(current1)
+    current2 = pd.DataFrame(current2)
+
+    # Bin the reference once and evaluate both current datasets in one call
+    drift_metrics = DriftMetrics(reference, cols='probabilities_score')
+    results = drift_metrics.evaluate({'current1': current1, 'current2': current2})
+
+    for row in results.itertuples():
+        status = "Significant drift" if row.drift_detected else "No significant drift"
+        print(f"{row.dataset}: {status} detected in column: {row.column} as KS Statistic: {row.ks_statistic:.4f}, "
+              f"p-value: {row.p_value:.4f}, PSI: {row.psi:.4f}")
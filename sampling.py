@@ -0,0 +1,204 @@
+import math
+import numpy as np
+import pandas as pd
+
+# Sampling mode for the drift reports of monitor_model_data.
+#
+# The Evidently drift tests run on samples of the reference and current data instead of
+# the full frames. The sample size comes from the Dvoretzky-Kiefer-Wolfowitz inequality:
+# with n = ln(2 / delta) / (2 * error_bound**2) rows, the empirical CDF of a sample is
+# within error_bound of the CDF of the full data with probability 1 - delta, whatever the
+# input size, so the cost of the drift tests is roughly constant. delta is split between
+# the reference and the current sample, so both bounds hold together at `confidence`.
+# Every drift score is then reported with the sample sizes and a confidence interval
+# derived from those bounds:
+#   - Wasserstein distance (normed): the sampled distance is within
+#     eps_ref * range_ref + eps_cur * range_cur (over the reference std) of the full one;
+#   - Jensen-Shannon distance: a metric, bounded through the L1 deviation of the sampled
+#     class shares (Weissman et al.) and JSD <= ln(2) * total variation;
+#   - p-value based tests get the sample sizes only (no interval).
+# The statistical summary and the new-class check stay exact on the full data.
+SAMPLING_METHODS = ('reservoir', 'stratified')
+DEFAULT_ERROR_BOUND = 0.01
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 42
+# Evidently switches to different stat tests at 1000 rows or fewer; samples stay above that
+MIN_SAMPLE_SIZE = 1001
+
+# Function to complete a sampling spec ({"method": ..., "error_bound": ..., ...}) with defaults
+def normalize_sampling(sampling):
+    if isinstance(sampling, str):
+        sampling = {"method": sampling}
+    spec = {"method": "reservoir", "error_bound": DEFAULT_ERROR_BOUND, "confidence": DEFAULT_CONFIDENCE,
+            "seed": DEFAULT_SEED, "strata": None, "sample_size": None}
+    spec.update(sampling or {})
+    if spec["method"] not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method '{spec['method']}', expected one of {SAMPLING_METHODS}")
+    if spec["method"] == 'stratified' and not spec["strata"]:
+        raise ValueError("Stratified sampling needs 'strata' columns")
+    return spec
+
+# Function to compute the DKW sample size for an error bound on the empirical CDF
+def dkw_sample_size(error_bound=DEFAULT_ERROR_BOUND, delta=1 - DEFAULT_CONFIDENCE):
+    return max(int(math.ceil(math.log(2 / delta) / (2 * error_bound ** 2))), MIN_SAMPLE_SIZE)
+
+# Function to compute the DKW error bound of an empirical CDF of n rows
+def dkw_error_bound(n, delta=1 - DEFAULT_CONFIDENCE):
+    return math.sqrt(math.log(2 / delta) / (2 * n)) if n else float('inf')
+
+# Function to bound the L1 deviation of the sampled shares of k classes (Weissman et al.)
+def l1_error_bound(n, k, delta=1 - DEFAULT_CONFIDENCE):
+    if not n:
+        return float('inf')
+    return math.sqrt(2 / n * (math.log(max(2 ** k - 2, 1)) + math.log(1 / delta)))
+
+# Function to draw a uniform sample of rows without replacement
+def reservoir_sample(df, n, seed=DEFAULT_SEED):
+    """Uniform sample of n rows (all rows when there are fewer), in the original row order."""
+    if len(df) <= n:
+        return df
+    rows = np.sort(np.random.default_rng(seed).choice(len(df), n, replace=False))
+    return df.iloc[rows]
+
+# Function to draw a stratified sample with proportional allocation
+def stratified_sample(df, n, strata, seed=DEFAULT_SEED):
+    """Sample n rows so every stratum keeps its share (largest-remainder rounding, at least
+    one row per stratum), drawing uniformly within each stratum."""
+    if len(df) <= n:
+        return df
+    codes = df.groupby(strata, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    sizes = np.bincount(codes)
+    quota = sizes * n / len(df)
+    allocation = np.minimum(np.maximum(np.floor(quota).astype(np.int64), 1), sizes)
+    remainder = n - allocation.sum()
+    if remainder > 0:
+        # Give the leftover rows to the strata with the largest fractional quotas that have room
+        order = np.argsort(-(quota - np.floor(quota)), kind='stable')
+        order = order[allocation[order] < sizes[order]]
+        allocation[order[:remainder]] += 1
+
+    # Random keys sorted within each stratum: the first `allocation` rows of a stratum are a uniform sample
+    keys = np.random.default_rng(seed).random(len(df))
+    order = np.lexsort((keys, codes))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.arange(len(df)) - starts[codes[order]]
+    rows = np.sort(order[rank < allocation[codes[order]]])
+    return df.iloc[rows]
+
+
+class ReservoirSampler:
+    '''Uniform sample of a stream of chunks: every row gets a random key and the n smallest
+    keys are kept, which is a sample without replacement. States of several streams merge.'''
+
+    def __init__(self, n, seed=DEFAULT_SEED):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.sample = None
+        self.keys = np.empty(0)
+        self.rows_seen = 0
+
+    def update(self, chunk):
+        keys = self.rng.random(len(chunk))
+        self.rows_seen += len(chunk)
+        return self._keep(chunk, keys)
+
+    def merge(self, other):
+        self.rows_seen += other.rows_seen
+        return self._keep(other.sample, other.keys) if other.sample is not None else self
+
+    def _keep(self, chunk, keys):
+        frame = chunk if self.sample is None else pd.concat([self.sample, chunk])
+        keys = np.concatenate([self.keys, keys])
+        if len(keys) > self.n:
+            keep = np.sort(np.argpartition(keys, self.n)[:self.n])
+            frame, keys = frame.iloc[keep], keys[keep]
+        self.sample, self.keys = frame, keys
+        return self
+
+# Function to sample one frame according to a sampling spec
+def sample_frame(df, spec, n):
+    if spec["method"] == 'stratified':
+        return stratified_sample(df, n, spec["strata"], spec["seed"])
+    return reservoir_sample(df, n, spec["seed"])
+
+# Function to sample the reference and current data for the drift reports
+def sample_for_drift(reference, current, column_mapping, sampling):
+    """Return (reference sample, current sample, sampling summary)."""
+    spec = normalize_sampling(sampling)
+    # Half of the error probability for each of the two samples
+    delta = (1 - spec["confidence"]) / 2
+    n = spec["sample_size"] or dkw_sample_size(spec["error_bound"], delta)
+    reference_sample = sample_frame(reference, spec, n)
+    current_sample = sample_frame(current, {**spec, "seed": spec["seed"] + 1}, n)
+
+    # Exact ranges of the numerical columns on the full data, for the Wasserstein bound
+    numerical = [column for column in (column_mapping.numerical_features or []) if column in reference]
+    for column in (column_mapping.target, column_mapping.prediction):
+        if isinstance(column, str) and column in reference and pd.api.types.is_numeric_dtype(reference[column]):
+            numerical.append(column)
+    ranges = {}
+    for role, frame in (("reference", reference), ("current", current)):
+        values = frame[numerical]
+        ranges[role] = (values.max() - values.min()).astype(float).to_dict()
+
+    summary = {
+        "method": spec["method"],
+        "seed": spec["seed"],
+        "strata": spec["strata"],
+        "confidence": spec["confidence"],
+        "target_error_bound": spec["error_bound"],
+        "reference": {"rows": len(reference), "sample_size": len(reference_sample),
+                      "ecdf_error_bound": 0.0 if len(reference_sample) == len(reference)
+                      else dkw_error_bound(len(reference_sample), delta),
+                      "ranges": ranges["reference"]},
+        "current": {"rows": len(current), "sample_size": len(current_sample),
+                    "ecdf_error_bound": 0.0 if len(current_sample) == len(current)
+                    else dkw_error_bound(len(current_sample), delta),
+                    "ranges": ranges["current"]},
+    }
+    return reference_sample, current_sample, summary
+
+# Function to compute the confidence interval of one drift score computed on samples
+def drift_score_interval(column, reference_sample, current_sample, summary):
+    stattest = column.get("stattest_name") or ''
+    score = column.get("drift_score")
+    name = column["column_name"]
+    reference, current = summary["reference"], summary["current"]
+    delta = (1 - summary["confidence"]) / 2
+    if score is None:
+        return None
+
+    if stattest.startswith("Wasserstein") and name in reference["ranges"]:
+        # W(sample) is within W(F_ref, sample_ref) + W(F_cur, sample_cur) of W(full)
+        norm = max(float(np.std(reference_sample[name])), 0.001)
+        half_width = (reference["ecdf_error_bound"] * reference["ranges"][name]
+                      + current["ecdf_error_bound"] * current["ranges"][name]) / norm
+    elif stattest.startswith("Jensen-Shannon"):
+        k = int(pd.concat([reference_sample[name], current_sample[name]]).nunique())
+        half_width = 0.0
+        for frame, part in ((reference_sample, reference), (current_sample, current)):
+            if part["ecdf_error_bound"]:
+                total_variation = min(l1_error_bound(len(frame), k, delta) / 2, 1.0)
+                half_width += math.sqrt(math.log(2) * total_variation)
+    else:
+        return None
+    return [max(score - half_width, 0.0), score + half_width]
+
+# Function to attach sample sizes and confidence intervals to the drift scores of a report
+def annotate_report(report_results, reference_sample, current_sample, summary):
+    sample_size = {"reference": summary["reference"]["sample_size"], "current": summary["current"]["sample_size"]}
+    for metric in report_results.get('metrics', []):
+        result = metric.get('result', {})
+        if 'drift_by_columns' in result:
+            columns = result['drift_by_columns'].values()
+        elif 'drift_score' in result and 'column_name' in result:
+            columns = [result]
+        else:
+            columns = []
+        for column in columns:
+            column["sample_size"] = sample_size
+            column["confidence"] = summary["confidence"]
+            column["confidence_interval"] = drift_score_interval(column, reference_sample, current_sample, summary)
+        if 'dataset_drift' in result or 'share_of_drifted_columns' in result:
+            result["sample_size"] = sample_size
+    return report_results
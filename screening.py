@@ -0,0 +1,126 @@
+import copy
+import numpy as np
+from drift_engine import to_block, block_moments, block_psi, factorize_columns
+from psi_engine import ReferenceBins
+
+# Cheap drift screening for the tiered evaluation of monitor_model_data.
+#
+# Every feature is scored against the reference without Evidently:
+#   - numerical features: PSI on the fixed reference bins (the cached reference profile
+#     counts, or equal-width bins fitted on the reference), the mean shift in reference
+#     standard deviations and the relative change of the standard deviation;
+#   - categorical features: PSI of the class shares and the share of current rows in
+#     classes the reference has never seen.
+# A feature reaching any threshold is a drift candidate; only candidates (plus the target
+# and prediction) go on to the Evidently reports. The thresholds are deliberately low, so
+# a feature Evidently would flag (Wasserstein distance (normed) >= 0.1 moves the mean or
+# the bin shares) is screened in; screening only has to be cheap, not final.
+SCREENING_THRESHOLDS = {
+    "psi": 0.1,           # PSI of the reference bins (0.1 is the usual "moderate shift")
+    "mean_shift": 0.1,    # |mean_current - mean_reference| / std_reference
+    "std_change": 0.1,    # |std_current / std_reference - 1|
+    "unseen_share": 0.0,  # share of current rows in classes the reference has never seen
+}
+# Floor on the reference standard deviation, as for Wasserstein distance (normed)
+MIN_NORM = 0.001
+
+# Function to merge user thresholds with the defaults
+def screening_thresholds(thresholds=None):
+    thresholds = dict(SCREENING_THRESHOLDS, **(thresholds or {}))
+    unknown = set(thresholds) - set(SCREENING_THRESHOLDS)
+    if unknown:
+        raise ValueError(f"Unknown screening thresholds {sorted(unknown)}, expected {sorted(SCREENING_THRESHOLDS)}")
+    return thresholds
+
+# Function to score the numerical features
+def screen_numerical(reference, current, features, reference_profile=None):
+    profile_histograms = reference_profile["histograms"] if reference_profile else {}
+    if features and all(profile_histograms.get(feature, {}).get("bin_edges") for feature in features):
+        reference_bins = ReferenceBins.from_profile(reference_profile, features)
+        reference_moments = {key: np.array([reference_profile["moments"][feature][key] for feature in features])
+                             for key in ("mean", "std")}
+    else:
+        reference_bins = ReferenceBins.fit(reference, features, strategy='fixed')
+        reference_moments = block_moments(to_block(reference, features))
+
+    current_block = to_block(current, features)
+    current_moments = block_moments(current_block)
+    psi = block_psi(reference_bins.counts, reference_bins.count_block(current_block))
+    reference_std = np.maximum(reference_moments["std"], MIN_NORM)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_shift = np.abs(current_moments["mean"] - reference_moments["mean"]) / reference_std
+        std_change = np.abs(current_moments["std"] / reference_std - 1)
+    return {feature: {"column_type": "num", "psi": float(psi[j]), "mean_shift": float(mean_shift[j]),
+                      "std_change": float(std_change[j])}
+            for j, feature in enumerate(features)}
+
+# Function to score the categorical features
+def screen_categorical(reference, current, features):
+    scores = {}
+    n_reference = len(reference)
+    for feature, (codes, labels) in factorize_columns(reference, current, features).items():
+        reference_counts = np.bincount(codes[:n_reference], minlength=len(labels))
+        current_counts = np.bincount(codes[n_reference:], minlength=len(labels))
+        unseen = current_counts[reference_counts == 0].sum()
+        scores[feature] = {"column_type": "cat", "psi": float(block_psi(reference_counts, current_counts)),
+                           "unseen_share": float(unseen / max(current_counts.sum(), 1))}
+    return scores
+
+# Main function to screen every feature for drift
+def screen_features(reference, current, column_mapping, reference_profile=None, thresholds=None):
+    """Screening scores per feature, with "candidate" and the thresholds it reached ("reasons")."""
+    thresholds = screening_thresholds(thresholds)
+    numerical_features = list(column_mapping.numerical_features or [])
+    categorical_features = list(column_mapping.categorical_features or [])
+    scores = {}
+    if numerical_features:
+        scores.update(screen_numerical(reference, current, numerical_features, reference_profile))
+    if categorical_features:
+        scores.update(screen_categorical(reference, current, categorical_features))
+
+    for feature, feature_scores in scores.items():
+        # NaN scores (e.g. an empty column) cannot clear a feature, so they make it a candidate
+        reasons = [name for name, threshold in thresholds.items()
+                   if name in feature_scores and not feature_scores[name] <= threshold]
+        feature_scores["candidate"] = bool(reasons)
+        feature_scores["reasons"] = reasons
+    return scores
+
+# Function to restrict a column mapping to the drift candidates
+def candidate_column_mapping(column_mapping, scores):
+    """Copy of the column mapping with only the candidate features; target and prediction are kept."""
+    candidates = {feature for feature, feature_scores in scores.items() if feature_scores["candidate"]}
+    mapping = copy.copy(column_mapping)
+    # Empty lists, not None: Evidently would otherwise detect the features itself
+    mapping.numerical_features = [f for f in column_mapping.numerical_features or [] if f in candidates]
+    mapping.categorical_features = [f for f in column_mapping.categorical_features or [] if f in candidates]
+    return mapping
+
+# Function to summarise a screening for the run results
+def screening_summary(scores, thresholds=None):
+    return {
+        "thresholds": screening_thresholds(thresholds),
+        "candidates": {feature: feature_scores for feature, feature_scores in scores.items()
+                       if feature_scores["candidate"]},
+        "skipped": {feature: feature_scores for feature, feature_scores in scores.items()
+                    if not feature_scores["candidate"]},
+    }
+
+
+# Example usage
+if __name__ == "__main__":
+    import pandas as pd
+    from evidently import ColumnMapping
+
+    column_mapping = ColumnMapping()
+    column_mapping.target = 'cnt'
+    column_mapping.numerical_features = ['temp', 'atemp', 'hum', 'windspeed', 'hr', 'weekday']
+    column_mapping.categorical_features = ['season', 'holiday', 'workingday']
+
+    data = pd.read_csv('sample_data.csv')
+    reference = data.iloc[:12000]
+    # A resample of the reference itself (nothing changed), then the later period
+    for name, current in (("stable", reference.sample(n=4000, random_state=0)), ("later", data.iloc[12000:17379])):
+        scores = screen_features(reference, current, column_mapping)
+        summary = screening_summary(scores)
+        print(f"{name}: candidates {list(summary['candidates'])}, skipped {list(summary['skipped'])}")
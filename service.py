@@ -0,0 +1,365 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from batch_runner import normalize_source, build_column_mapping
+from data_loading import load_frame
+from instrumentation import measure
+from reference_profile import load_or_build_reference_profile, file_fingerprint
+from psi_engine import ReferenceBins
+from ks_engine import SortedReference
+from new_class_detector import NewClassDetector, summarize_new_classes
+
+# Long-running monitoring service with warm reference state.
+#
+# Models are registered once with a run configuration (as for monitor.py run, without the
+# current window): the reference data is loaded and kept in memory together with its
+# column mapping, reference profile, PSI bin edges (psi_engine.ReferenceBins), sorted
+# reference values (ks_engine.SortedReference) and new-class vocabularies. Requests then
+# only carry a current window (an Arrow IPC, Parquet or CSV path with optional rows):
+#   POST /models   register (or replace) a model             -> model summary
+#   POST /metrics  metrics-only path: PSI, KS, statistics and new classes (about 20 ms of
+#                  CPU for a few hundred rows; under load, latency grows with the queue)
+#   POST /run      full monitor_model_data run (Evidently reports) on the warm reference
+#   GET  /models, GET /health
+# Clients only name files and a few report options: every path (current windows, and the
+# reference of a model registered over HTTP) must lie under one of the service's data
+# roots, a /run request may only set RUN_OPTIONS, and every file a run writes goes to a
+# directory the service creates under its output root (SERVER_OPTIONS of the model
+# configuration are not used as given; a model id must match MODEL_ID_PATTERN).
+# Requests are queued on a bounded worker pool: at most max_workers run at a time and at
+# most max_pending more wait; beyond that the service answers 503 so clients back off
+# instead of piling up work. Workers are threads sharing the resident state (NumPy,
+# pandas and Arrow release the GIL in the heavy loops); Evidently is imported once, on
+# the first /run, and stays loaded.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_WORKERS = os.cpu_count() or 4
+DEFAULT_MAX_PENDING = 64
+DEFAULT_OUTPUT_ROOT = 'service_output'
+DEFAULT_DATA_ROOTS = ('.',)
+# monitor_model_data options a /run request may set; anything else comes from the model configuration
+RUN_OPTIONS = ('html_mode', 'tiered', 'sampling')
+# Options that name files: the model configuration's values are replaced by the service
+SERVER_OPTIONS = ('output_dir', 'result_store', 'metrics_file', 'load_timing')
+P_VALUE_THRESHOLD = 0.05
+# Model ids name a directory under the output root, so they are kept to a plain file name
+MODEL_ID_PATTERN = re.compile(r'[A-Za-z0-9_.-]+')
+
+
+class ServiceError(Exception):
+    '''A request the service rejects, with the HTTP status to answer.'''
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ModelState:
+    '''Reference data of a registered model and everything precomputed from it.'''
+
+    def __init__(self, model_id, config, resolve_path=os.path.abspath):
+        self.model_id = model_id
+        self.config = config
+        self.column_mapping = build_column_mapping(config["column_mapping"])
+        source = normalize_source(config["reference"])
+        source["path"] = resolve_path(source["path"])
+        with measure() as self.load_timing:
+            self.reference = load_frame(source["path"], self.column_mapping, rows=source["rows"])
+            self.load_timing["rows"] = len(self.reference)
+        rows = source["rows"]
+        self.reference_profile = load_or_build_reference_profile(
+            self.reference, self.column_mapping, config["model_version"],
+            fingerprint=file_fingerprint(source["path"], None if rows is None else slice(*rows)))
+
+        # Numerical features plus a numeric target/prediction get PSI and KS
+        self.numerical_features = list(self.column_mapping.numerical_features or [])
+        self.categorical_features = list(self.column_mapping.categorical_features or [])
+        self.drift_features = self.numerical_features + [
+            column for column in (self.column_mapping.target, self.column_mapping.prediction)
+            if isinstance(column, str) and column in self.reference
+            and self.reference[column].dtype.kind in 'iuf' and column not in self.numerical_features
+        ]
+        self.reference_bins = ReferenceBins.fit(self.reference, self.drift_features)
+        self.sorted_reference = SortedReference.fit(self.reference, self.drift_features)
+        self.new_class_detector = NewClassDetector.from_profile(self.reference_profile, self.categorical_features)
+        self.registered_at = time.time()
+
+    def summary(self):
+        return {"model_id": self.model_id, "model_version": self.config["model_version"],
+                "source_system": self.config["source_system"], "record_count_reference": len(self.reference),
+                "drift_features": self.drift_features, "categorical_features": self.categorical_features,
+                "load_seconds": self.load_timing["seconds"]}
+
+    def metrics(self, current):
+        '''PSI, KS, statistics and new classes of a current window against the warm reference.'''
+        from Monitoring import get_metadata, calculate_statistics
+
+        metadata = get_metadata('service metrics', self.config["source_system"], self.config.get("user", "service"),
+                                self.config["model_version"], self.reference, current)
+        psi = self.reference_bins.psi(current)
+        ks = self.sorted_reference.ks(current)
+        new_class_results = self.new_class_detector.detect(current)
+        metadata["new_class_detected"], metadata["new_class_details"] = summarize_new_classes(new_class_results)
+        return {
+            "metadata": metadata,
+            "drift_metrics": {
+                feature: {"psi": float(psi[feature]), "ks_statistic": float(ks.at[feature, 'ks_statistic']),
+                          "p_value": float(ks.at[feature, 'p_value']),
+                          "drift_detected": bool(ks.at[feature, 'p_value'] < P_VALUE_THRESHOLD)}
+                for feature in self.drift_features
+            },
+            "new_classes": new_class_results,
+            "statistical_summary": calculate_statistics(self.numerical_features, self.reference, current,
+                                                        self.reference_profile),
+        }
+
+
+class MonitoringService:
+    '''Registered models and a bounded pool of workers serving their requests.'''
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 output_root=DEFAULT_OUTPUT_ROOT, data_roots=DEFAULT_DATA_ROOTS):
+        self.models = {}
+        self.output_root = output_root
+        self.data_roots = [os.path.realpath(root) for root in data_roots]
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='monitoring-worker')
+        # One slot per running or queued request; a request without a slot is rejected
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.lock = threading.Lock()
+        self.counters = {"accepted": 0, "rejected": 0, "failed": 0, "completed": 0}
+
+    def register(self, config):
+        for key in ("model_version", "source_system", "reference", "column_mapping"):
+            if key not in config:
+                raise ServiceError(400, f"The model configuration is missing '{key}'")
+        model_id = str(config.get("model_id") or f"{config['model_version']}_{config['source_system']}")
+        if not MODEL_ID_PATTERN.fullmatch(model_id) or '..' in model_id:
+            raise ServiceError(400, f"The model id '{model_id}' may only use letters, digits, '_', '.' and '-' "
+                                    f"(and no '..')")
+        # Build outside the lock, then swap: requests keep using the previous state until then
+        model = self.submit(ModelState, model_id, config, self.resolve_path)
+        with self.lock:
+            self.models[model_id] = model
+        return model.summary()
+
+    def list_models(self):
+        with self.lock:
+            return [model.summary() for model in self.models.values()]
+
+    def model(self, model_id):
+        with self.lock:
+            if model_id not in self.models:
+                raise ServiceError(404, f"Unknown model '{model_id}'")
+            return self.models[model_id]
+
+    def resolve_path(self, path):
+        '''Absolute path of a data file, which must lie under one of the data roots (403 otherwise).'''
+        if not isinstance(path, str):
+            raise ServiceError(400, "A data path must be a string")
+        resolved = os.path.realpath(path)
+        if not any(os.path.commonpath([resolved, root]) == root for root in self.data_roots):
+            raise ServiceError(403, f"The path {path} is outside the data roots of the service")
+        return resolved
+
+    def output_path(self, *parts):
+        '''Path under the output root; anything resolving outside of it is refused (400).'''
+        root = os.path.realpath(self.output_root)
+        path = os.path.join(root, *parts)
+        if os.path.commonpath([os.path.realpath(path), root]) != root:
+            raise ServiceError(400, f"The output directory {path} is outside the output root of the service")
+        return path
+
+    def load_current(self, model, request):
+        if "current" not in request:
+            raise ServiceError(400, "The request is missing 'current'")
+        source = normalize_source(request["current"])
+        return load_frame(self.resolve_path(source["path"]), model.column_mapping, rows=source["rows"])
+
+    def metrics(self, request):
+        model = self.model(request.get("model_id"))
+        return self.submit(lambda: model.metrics(self.load_current(model, request)))
+
+    def run(self, request):
+        from monitor import resolve_pipeline
+
+        model = self.model(request.get("model_id"))
+        request_options = request.get("options") or {}
+        if not isinstance(request_options, dict):
+            raise ServiceError(400, "'options' must be an object")
+        unsupported = sorted(set(request_options) - set(RUN_OPTIONS))
+        if unsupported:
+            raise ServiceError(400, f"A run request may only set the options {list(RUN_OPTIONS)}, not {unsupported}")
+        config_options = model.config.get("options", {})
+        options = {key: value for key, value in config_options.items() if key not in SERVER_OPTIONS}
+        options.update(request_options)
+        # Every run writes into its own directory so concurrent runs never share files; a
+        # configured metrics file is written there too, under its own file name
+        options["output_dir"] = self.output_path(model.model_id, uuid.uuid4().hex)
+        if config_options.get("metrics_file"):
+            options["metrics_file"] = os.path.join(options["output_dir"],
+                                                   os.path.basename(config_options["metrics_file"]))
+        monitor_model_data = resolve_pipeline({"pipeline": model.config.get("pipeline", 'monitoring'),
+                                               "options": options})
+
+        def run_model():
+            with measure() as load_timing:
+                current = self.load_current(model, request)
+                load_timing["rows"] = len(current)
+            return monitor_model_data(model.reference, current, model.column_mapping, model.config["source_system"],
+                                      model.config.get("user", "service"), model.config["model_version"],
+                                      model.reference_profile, load_timing=load_timing, **options)
+
+        return self.submit(run_model)
+
+    def submit(self, func, *args):
+        '''Run func(*args) on the worker pool and wait for it; 503 when the queue is full.'''
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.counters["rejected"] += 1
+            raise ServiceError(503, "The service is busy, retry later")
+        with self.lock:
+            self.counters["accepted"] += 1
+        queued_at = time.perf_counter()
+        try:
+            future = self.pool.submit(lambda: (time.perf_counter() - queued_at, func(*args)))
+            queue_seconds, result = future.result()
+        except Exception:
+            with self.lock:
+                self.counters["failed"] += 1
+            raise
+        finally:
+            self.slots.release()
+        with self.lock:
+            self.counters["completed"] += 1
+        if isinstance(result, dict):
+            result["service_timing"] = {"queue_seconds": queue_seconds,
+                                        "seconds": time.perf_counter() - queued_at}
+        return result
+
+    def health(self):
+        with self.lock:
+            return {"status": "ok", "models": sorted(self.models), "max_workers": self.max_workers,
+                    **self.counters}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+# Function to build the HTTP request handler of a service
+def make_handler(service, verbose=False):
+
+    class MonitoringRequestHandler(BaseHTTPRequestHandler):
+        routes = {
+            ('GET', '/health'): lambda body: service.health(),
+            ('GET', '/models'): lambda body: service.list_models(),
+            ('POST', '/models'): service.register,
+            ('POST', '/metrics'): service.metrics,
+            ('POST', '/run'): service.run,
+        }
+
+        def handle_request(self, method):
+            route = self.routes.get((method, self.path.split('?')[0].rstrip('/') or '/'))
+            try:
+                if route is None:
+                    raise ServiceError(404, f"No route for {method} {self.path}")
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError as error:
+                    raise ServiceError(400, f"Invalid JSON body: {error}")
+                status, payload = 200, route(body)
+            except ServiceError as error:
+                status, payload = error.status, {"error": str(error)}
+            except (OSError, KeyError, ValueError, TypeError) as error:
+                status, payload = 400, {"error": f"{type(error).__name__}: {error}"}
+            except Exception as error:
+                status, payload = 500, {"error": f"{type(error).__name__}: {error}"}
+
+            data = json.dumps(payload, default=str).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            if status == 503:
+                self.send_header('Retry-After', '1')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.handle_request('GET')
+
+        def do_POST(self):
+            self.handle_request('POST')
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return MonitoringRequestHandler
+
+# Function to start the HTTP service (port 0 picks a free port); returns the server
+def start_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False, background=False):
+    server = ThreadingHTTPServer((host, port), make_handler(service, verbose))
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, name='monitoring-service', daemon=True).start()
+    return server
+
+# Function to run the service until interrupted
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, configs=(), max_workers=DEFAULT_MAX_WORKERS,
+          max_pending=DEFAULT_MAX_PENDING, output_root=DEFAULT_OUTPUT_ROOT, verbose=False,
+          data_roots=DEFAULT_DATA_ROOTS):
+    service = MonitoringService(max_workers, max_pending, output_root, data_roots)
+    for config in configs:
+        print(f"Registered model {service.register(config)['model_id']}")
+    server = start_server(service, host, port, verbose)
+    print(f"Monitoring service listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+class MonitoringClient:
+    '''Minimal JSON client of the monitoring service (standard library only).'''
+
+    def __init__(self, base_url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=300):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            message = json.loads(error.read() or b'{}').get("error", error.reason)
+            raise ServiceError(error.code, message) from None
+
+    def health(self):
+        return self.request('GET', '/health')
+
+    def models(self):
+        return self.request('GET', '/models')
+
+    def register(self, config):
+        return self.request('POST', '/models', config)
+
+    def metrics(self, model_id, current):
+        '''current is a path or {"path": ..., "rows": [start, stop]}.'''
+        return self.request('POST', '/metrics', {"model_id": model_id, "current": current})
+
+    def run(self, model_id, current, options=None):
+        return self.request('POST', '/run', {"model_id": model_id, "current": current, "options": options or {}})
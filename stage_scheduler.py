@@ -0,0 +1,146 @@
+import os
+import time
+import uuid
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from instrumentation import measure, frame_rows
+
+# Stage scheduler for monitor_model_data.
+#
+# The monitoring stages (data drift report, target drift report, statistics, new-class
+# check) do not depend on each other, so they can run concurrently:
+#   - 'sequential': run in the calling thread, in order (the previous behaviour);
+#   - 'thread': a thread pool; workers see the caller's DataFrames directly;
+#   - 'process': a process pool; DataFrames are written once to shared memory as an
+#     Arrow IPC file (SharedFrame) and each worker memory-maps that file instead of
+#     receiving a pickled copy of the frame.
+# Every stage is measured with instrumentation.measure (wall and CPU time, peak RSS, rows
+# and rows/sec); load_seconds is the part spent resolving shared frames.
+EXECUTORS = ('sequential', 'thread', 'process')
+# RAM-backed tmpfs on Linux; elsewhere fall back to the temp directory
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+class Stage:
+    '''A named unit of work: func(*args, **kwargs).'''
+
+    def __init__(self, name, func, *args, **kwargs):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+
+class SharedFrame:
+    '''A DataFrame written once to shared memory as an Arrow IPC file.
+
+    Pickling a SharedFrame only sends the file path. Workers memory-map the file, so the
+    Arrow buffers are shared between processes rather than serialized into each of them;
+    see to_pandas for which columns are views and which are copied.
+    '''
+
+    def __init__(self, df):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        self.path = os.path.join(SHARED_MEMORY_DIR, f"monitoring-frame-{uuid.uuid4().hex}.arrow")
+        with pa.OSFile(self.path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        self._owner = True
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._owner = False
+
+    def to_pandas(self):
+        '''Memory-map the shared file and read the frame back.
+
+        Numerical columns without missing values become read-only NumPy views of the
+        mapped file (split_blocks keeps one block per column instead of consolidating
+        them). Columns with missing values (Arrow nulls), string and categorical columns
+        and the index are still copied into the worker. The mapped buffers keep the map
+        open for as long as the frame uses them.
+        '''
+        import pyarrow as pa
+
+        table = pa.ipc.open_file(pa.memory_map(self.path, 'r')).read_all()
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def release(self):
+        '''Remove the shared file (creator side); workers that mapped it keep their view.'''
+        if self._owner and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# Function to replace SharedFrame arguments with the frames they hold
+def _resolve(value):
+    return value.to_pandas() if isinstance(value, SharedFrame) else value
+
+# Function executed by workers: run one stage and measure it
+def _run_stage(name, func, args, kwargs):
+    with measure() as timing:
+        start = time.perf_counter()
+        args = [_resolve(arg) for arg in args]
+        kwargs = {key: _resolve(value) for key, value in kwargs.items()}
+        timing["load_seconds"] = time.perf_counter() - start
+        timing["rows"] = frame_rows(args + list(kwargs.values()))
+        result = func(*args, **kwargs)
+    return name, result, timing
+
+# Function to run independent stages, optionally in parallel
+def run_stages(stages, executor='sequential', max_workers=None):
+    """Run stages and return (results, timings), both keyed by stage name.
+
+    With executor='process', DataFrame arguments are shared through SharedFrame and the
+    stage functions must be importable (module-level) so they can be sent to workers.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}', expected one of {EXECUTORS}")
+
+    results = {}
+    timings = {}
+    start = time.perf_counter()
+
+    if executor == 'sequential':
+        for stage in stages:
+            name, result, timing = _run_stage(stage.name, stage.func, stage.args, stage.kwargs)
+            results[name], timings[name] = result, timing
+    elif executor == 'thread':
+        with ThreadPoolExecutor(max_workers=max_workers or len(stages)) as pool:
+            futures = [pool.submit(_run_stage, stage.name, stage.func, stage.args, stage.kwargs) for stage in stages]
+            for future in as_completed(futures):
+                name, result, timing = future.result()
+                results[name], timings[name] = result, timing
+    else:
+        import pandas as pd
+
+        # Share each distinct DataFrame once, however many stages use it
+        shared = {}
+
+        def share(value):
+            if isinstance(value, pd.DataFrame):
+                if id(value) not in shared:
+                    shared[id(value)] = SharedFrame(value)
+                return shared[id(value)]
+            return value
+
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers or len(stages)) as pool:
+                futures = [
+                    pool.submit(_run_stage, stage.name, stage.func,
+                                [share(arg) for arg in stage.args],
+                                {key: share(value) for key, value in stage.kwargs.items()})
+                    for stage in stages
+                ]
+                for future in as_completed(futures):
+                    name, result, timing = future.result()
+                    results[name], timings[name] = result, timing
+        finally:
+            for frame in shared.values():
+                frame.release()
+
+    timings["total"] = {"seconds": time.perf_counter() - start, "executor": executor}
+    return results, timings
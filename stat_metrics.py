@@ -1,25 +1,41 @@
 import pandas as pd
-from sklearn.metrics import accuracy_score, f1_score, roc_auc_score, roc_curve
 import numpy as np
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+# scikit-learn and matplotlib take seconds to import, so they are imported by the
+# functions that need them (calculate_ks_statistic, visualize_psi_distribution); the metrics
+# path (compute_metrics, classification_metrics, PSI) only loads NumPy and pandas.
 
 # Functions for PSI and K-S statistic
-def calculate_psi(expected, actual, bins=10, epsilon=1e-10):
-    """Calculate psi"""
-    
+def psi_histograms(expected, actual, bins=10):
+    """Bin breakpoints and the share of each array per bin, after rescaling each array to
+    [0, 1] on its own range (the histograms calculate_psi compares)"""
+
     def scale_range(input, min_val, max_val):
-        """scales the input array to a specified range"""
-        input += -(np.min(input))  # Shifts the input data so that the minimum value is 0.
-        input /= np.max(input) / (max_val - min_val) 
-        input += min_val          # Shifts the scaled data to start from min_val
+        """scales a copy of the input array to a specified range (the caller's data is not modified)"""
+        input = np.asarray(input, dtype=float)
+        input = input - np.min(input)  # Shifts the input data so that the minimum value is 0.
+        input = input / (np.max(input) / (max_val - min_val))
+        input = input + min_val        # Shifts the scaled data to start from min_val
         return input
 
     breakpoints = np.linspace(0, 1, bins + 1)
     expected_percents = np.histogram(scale_range(expected, 0, 1), bins=breakpoints)[0] / len(expected)
     actual_percents = np.histogram(scale_range(actual, 0, 1), bins=breakpoints)[0] / len(actual)
+    return breakpoints, expected_percents, actual_percents
+
+def calculate_psi(expected, actual, bins=10, epsilon=1e-10):
+    """Calculate psi
 
+    Each array is rescaled to [0, 1] on its own range. To compare against bins fitted once
+    on the reference, use psi_engine.ReferenceBins; for streamed or unbounded features,
+    use quantile_sketch.sketch_psi on mergeable sketches.
+    """
+    _, expected_percents, actual_percents = psi_histograms(expected, actual, bins)
+    return psi_from_percents(expected_percents, actual_percents, epsilon)
+
+def psi_from_percents(expected_percents, actual_percents, epsilon=1e-10):
+    """PSI of two aligned histograms given as shares per bin"""
     # Add epsilon to prevent log(0) and division by zero
     expected_percents = np.where(expected_percents == 0, epsilon, expected_percents)
     actual_percents = np.where(actual_percents == 0, epsilon, actual_percents)
@@ -28,26 +44,30 @@ def calculate_psi(expected, actual, bins=10, epsilon=1e-10):
     return psi_value
 
 def visualize_psi_distribution(expected, actual, bins=10):
-    """Visualize the distributions of expected and actual probabilities."""
-    # Bin the data for both expected and actual
-    breakpoints = np.linspace(0, 1, bins + 1)
-    expected_percents = np.histogram(expected, bins=breakpoints, density=True)[0]
-    actual_percents = np.histogram(actual, bins=breakpoints, density=True)[0]
+    """Visualize the distributions of expected and actual probabilities.
+
+    The histograms are computed once and used for both the bars and the PSI, so the plot
+    shows exactly the bins the PSI compares. For reports without matplotlib, see
+    report_renderer.py.
+    """
+    import matplotlib.pyplot as plt
+
+    # Bin the data for both expected and actual (once) and calculate PSI from the same bins
+    breakpoints, expected_percents, actual_percents = psi_histograms(expected, actual, bins)
+    psi_value = psi_from_percents(expected_percents, actual_percents)
+    widths = np.diff(breakpoints)
 
     # Visualization
     plt.figure(figsize=(10, 6))
     
-    # Create a bar plot for the expected distribution
-    sns.histplot(expected, bins=breakpoints, color='blue', alpha=0.6, label='Expected (Training)', stat='density')
-    
-    # Create a bar plot for the actual distribution
-    sns.histplot(actual, bins=breakpoints, color='orange', alpha=0.6, label='Actual (Testing)', stat='density')
-    
-    # Calculate PSI
-    psi_value = calculate_psi(expected, actual, bins)
+    # Bar plots of the expected and actual densities
+    plt.bar(breakpoints[:-1], expected_percents / widths, width=widths, align='edge', color='blue', alpha=0.6,
+            label='Expected (Training)')
+    plt.bar(breakpoints[:-1], actual_percents / widths, width=widths, align='edge', color='orange', alpha=0.6,
+            label='Actual (Testing)')
     
     # Add labels and title
-    plt.xlabel("Probability Scores")
+    plt.xlabel("Probability Scores (rescaled to [0, 1])")
     plt.ylabel("Density")
     plt.title(f"Distribution Comparison (PSI: {psi_value:.4f})")
     plt.legend()
@@ -59,28 +79,220 @@ def visualize_psi_distribution(expected, actual, bins=10):
 
 def calculate_ks_statistic(y_true, y_pred_prob):
     """Calculate KS stats"""
+    from sklearn.metrics import roc_curve
+
     fpr, tpr, _ = roc_curve(y_true, y_pred_prob)
     ks_stat = np.max(tpr - fpr)
     return ks_stat
 
-def compute_metrics(df, target_col, pred_prob_col):
+def classification_kernel(y_true, y_pred_prob, thresholds=(0.5,), segment_codes=None, n_segments=1):
+    """Fused classification metrics: sort the scores once (per segment) and derive AUC, the
+    K-S statistic and accuracy/F1 at every threshold from the cumulative TP/FP counts.
+
+    Labels equal to 1 are positives and a row is predicted positive when its score is above
+    the threshold. Segments are given as integer codes 0..n_segments-1. Returns a dict of
+    arrays: count, positives, auc and ks per segment, accuracy and f1 per (segment, threshold).
+    AUC and KS are NaN for segments that do not contain both classes.
+    """
+    y = np.asarray(y_true) == 1
+    score = np.asarray(y_pred_prob, dtype=float)
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+    # The only sort: by segment, then by descending score
+    if segment_codes is None:
+        codes = np.zeros(len(score), dtype=np.int64)
+        order = np.argsort(-score, kind='stable')
+    else:
+        codes = np.asarray(segment_codes, dtype=np.int64)
+        order = np.lexsort((-score, codes))
+    score, y, codes = score[order], y[order], codes[order]
+
+    count = np.bincount(codes, minlength=n_segments)
+    positives = np.bincount(codes, weights=y, minlength=n_segments)
+    negatives = count - positives
+    starts = np.concatenate([[0], np.cumsum(count)[:-1]])
+
+    # Cumulative true/false positives within each segment, row by row
+    cumulative_tp = np.cumsum(y)
+    tp = cumulative_tp - np.concatenate([[0], cumulative_tp])[starts][codes]
+    fp = np.arange(1, len(score) + 1) - starts[codes] - tp
+
+    # ROC points sit at the last row of each run of tied scores
+    last = np.ones(len(score), dtype=bool)
+    last[:-1] = (score[1:] != score[:-1]) | (codes[1:] != codes[:-1])
+    point_codes = codes[last]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = tp[last] / positives[point_codes]
+        fpr = fp[last] / negatives[point_codes]
+    first = np.ones(len(point_codes), dtype=bool)
+    first[1:] = point_codes[1:] != point_codes[:-1]
+    previous_tpr = np.where(first, 0.0, np.concatenate([[0.0], tpr[:-1]]))
+    previous_fpr = np.where(first, 0.0, np.concatenate([[0.0], fpr[:-1]]))
+
+    valid = (positives > 0) & (negatives > 0)
+    # Trapezoidal area under the ROC curve and the largest TPR - FPR gap, per segment
+    auc = np.bincount(point_codes, weights=(fpr - previous_fpr) * (tpr + previous_tpr) / 2, minlength=n_segments)
+    ks = np.zeros(n_segments)
+    np.maximum.at(ks, point_codes, np.nan_to_num(tpr - fpr))
+    auc = np.where(valid, auc, np.nan)
+    ks = np.where(valid, ks, np.nan)
+
+    # Rows above each threshold are a prefix of their segment, so TP is read off the cumulative counts
+    above = score[:, None] > thresholds[None, :]
+    flat = codes[:, None] * len(thresholds) + np.arange(len(thresholds))[None, :]
+    predicted = np.bincount(flat[above], minlength=n_segments * len(thresholds)).reshape(n_segments, -1)
+    index = np.clip(starts[:, None] + predicted - 1, 0, max(len(score) - 1, 0))
+    true_positive = np.where(predicted > 0, tp[index] if len(score) else 0, 0)
+    false_positive = predicted - true_positive
+    false_negative = positives[:, None] - true_positive
+    true_negative = negatives[:, None] - false_positive
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = (true_positive + true_negative) / count[:, None]
+        f1_denominator = 2 * true_positive + false_positive + false_negative
+        # F1 is 0 when there are no positives at all, as in sklearn
+        f1 = np.where(f1_denominator > 0, 2 * true_positive / f1_denominator, 0.0)
+
+    return {"count": count, "positives": positives, "auc": auc, "ks": ks, "thresholds": thresholds,
+            "accuracy": accuracy, "f1": f1}
+
+def classification_metrics(y_true, y_pred_prob, thresholds=(0.5,)):
+    """AUC, K-S statistic and accuracy/F1 per threshold from a single sort."""
+    kernel = classification_kernel(y_true, y_pred_prob, thresholds)
+    return {
+        "AUC": float(kernel["auc"][0]),
+        "K-S Statistic": float(kernel["ks"][0]),
+        "thresholds": {float(threshold): {"Accuracy": float(kernel["accuracy"][0, j]),
+                                          "F1 Score": float(kernel["f1"][0, j])}
+                       for j, threshold in enumerate(kernel["thresholds"])},
+    }
+
+def segment_metrics(df, target_col, pred_prob_col, segment_cols, thresholds=(0.5,)):
+    """Per-segment metrics in one pass: one row per (segment, threshold)."""
+    groups = df.groupby(segment_cols, sort=True, observed=True, dropna=False)
+    keys = groups.size().index
+    kernel = classification_kernel(df[target_col], df[pred_prob_col], thresholds, groups.ngroup().to_numpy(),
+                                   len(keys))
+
+    n_thresholds = len(kernel["thresholds"])
+    metrics = pd.DataFrame({
+        "threshold": np.tile(kernel["thresholds"], len(keys)),
+        "count": np.repeat(kernel["count"], n_thresholds),
+        "positives": np.repeat(kernel["positives"].astype(int), n_thresholds),
+        "Accuracy": kernel["accuracy"].ravel(),
+        "F1 Score": kernel["f1"].ravel(),
+        "AUC": np.repeat(kernel["auc"], n_thresholds),
+        "K-S Statistic": np.repeat(kernel["ks"], n_thresholds),
+    }, index=keys.repeat(n_thresholds))
+    return metrics.reset_index()
+
+class ScoreHistogramAccumulator:
+    """Streaming confusion matrices: per-class histograms of the scores on fixed bins.
+
+    Batches of labels and scores are folded into two count arrays (positives, negatives),
+    so any number of thresholds can be evaluated in O(bins) without keeping the
+    predictions. Cell 0 holds scores <= edges[0] and cell i holds scores in
+    (edges[i-1], edges[i]], so counts of "score > threshold" are exact at every bin
+    edge; other thresholds are snapped to the nearest edge. AUC and KS are approximate:
+    scores within one bin are treated as ties.
+    """
+
+    def __init__(self, bins=1000, score_range=(0.0, 1.0), positives=None, negatives=None):
+        self.edges = np.linspace(score_range[0], score_range[1], bins + 1)
+        self.positives = np.zeros(bins + 1, dtype=np.int64) if positives is None else np.asarray(positives)
+        self.negatives = np.zeros(bins + 1, dtype=np.int64) if negatives is None else np.asarray(negatives)
+
+    def update(self, y_true, y_pred_prob):
+        """Fold a batch of labels (1 is positive) and scores into the histograms."""
+        positive = np.asarray(y_true) == 1
+        cells = np.searchsorted(self.edges, np.asarray(y_pred_prob, dtype=float), side='left')
+        # Scores above the range are counted in the top cell
+        cells = np.minimum(cells, len(self.edges) - 1)
+        self.positives += np.bincount(cells[positive], minlength=len(self.edges))
+        self.negatives += np.bincount(cells[~positive], minlength=len(self.edges))
+        return self
+
+    def merge(self, other):
+        """Combine with the state of another accumulator with the same bins."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge accumulators with different bin edges")
+        self.positives += other.positives
+        self.negatives += other.negatives
+        return self
+
+    def confusion_matrices(self, thresholds=None):
+        """TP, FP, TN and FN arrays for the thresholds (default: every bin edge)."""
+        if thresholds is None:
+            index = np.arange(len(self.edges))
+        else:
+            index = np.abs(self.edges[None, :] - np.atleast_1d(thresholds)[:, None]).argmin(axis=1)
+        # Rows above edge k are the cells after k: reverse cumulative sums, shifted by one cell
+        above_positives = np.concatenate([np.cumsum(self.positives[::-1])[::-1][1:], [0]])
+        above_negatives = np.concatenate([np.cumsum(self.negatives[::-1])[::-1][1:], [0]])
+        tp, fp = above_positives[index], above_negatives[index]
+        return {"threshold": self.edges[index], "tp": tp, "fp": fp,
+                "tn": self.negatives.sum() - fp, "fn": self.positives.sum() - tp}
+
+    def sweep(self, thresholds=None):
+        """Accuracy, precision, recall and F1 at every threshold, as a DataFrame."""
+        matrices = self.confusion_matrices(thresholds)
+        tp, fp, tn, fn = (matrices[key].astype(float) for key in ("tp", "fp", "tn", "fn"))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+            recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+            f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+            accuracy = (tp + tn) / (tp + fp + tn + fn)
+        sweep = pd.DataFrame(matrices)
+        sweep["Accuracy"], sweep["Precision"], sweep["Recall"], sweep["F1 Score"] = accuracy, precision, recall, f1
+        return sweep
+
+    def roc(self):
+        """FPR and TPR at every bin edge, from the highest threshold down."""
+        matrices = self.confusion_matrices()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tpr = np.concatenate([[0.0], matrices["tp"][::-1] / self.positives.sum(), [1.0]])
+            fpr = np.concatenate([[0.0], matrices["fp"][::-1] / self.negatives.sum(), [1.0]])
+        return fpr, tpr
+
+    def auc(self):
+        fpr, tpr = self.roc()
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def ks_statistic(self):
+        fpr, tpr = self.roc()
+        return float(np.max(tpr - fpr))
+
+    def metrics(self, threshold=0.5):
+        """The metrics of compute_metrics (without PSI) at one threshold."""
+        row = self.sweep([threshold]).iloc[0]
+        return {"Accuracy": row["Accuracy"], "F1 Score": row["F1 Score"], "Precision": row["Precision"],
+                "Recall": row["Recall"], "AUC": self.auc(), "K-S Statistic": self.ks_statistic()}
+
+    def to_dict(self):
+        return {"edges": [float(self.edges[0]), float(self.edges[-1])], "bins": len(self.edges) - 1,
+                "positives": self.positives.tolist(), "negatives": self.negatives.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["bins"], tuple(state["edges"]), state["positives"], state["negatives"])
+
+
+def compute_metrics(df, target_col, pred_prob_col, threshold=0.5):
     """Compute metrics."""
     
-    # Step 1: Create binary prediction from probabilities
-    df['prediction'] = np.where(df[pred_prob_col] > 0.5, 1, 0)
+    # Step 1: Create binary prediction from probabilities (the caller's frame is not modified)
+    y_pred = pd.Series(np.where(df[pred_prob_col] > threshold, 1, 0), index=df.index, name='prediction')
     
     # Step 2: Extract true labels and predicted probabilities
     y_true = df[target_col]
-    y_pred = df['prediction']
     y_pred_prob = df[pred_prob_col]
     
-    # Step 3: Compute performance metrics
-    accuracy = accuracy_score(y_true, y_pred)
-    f1 = f1_score(y_true, y_pred)
-    auc = roc_auc_score(y_true, y_pred_prob)
+    # Step 3: Compute performance metrics (AUC, KS, accuracy and F1 share a single sort)
+    fused = classification_metrics(y_true, y_pred_prob, [threshold])
+    accuracy = fused["thresholds"][threshold]["Accuracy"]
+    f1 = fused["thresholds"][threshold]["F1 Score"]
+    auc = fused["AUC"]
     # psi = calculate_psi(y_true, y_pred_prob)
     psi = calculate_psi(y_true, y_pred)
-    ks_stat = calculate_ks_statistic(y_true, y_pred_prob)
+    ks_stat = fused["K-S Statistic"]
     
     # Print or return the metrics
     metrics = {
@@ -138,28 +350,30 @@ def generate_sample_data(sample_size=100):
     return df
 
 
-def save_dataframe(df, filename):
+def save_dataframe(df, filename, output_dir="output"):
     """Save a DataFrame to a CSV file."""
-    output_path = os.path.join("output", filename)
+    output_path = os.path.join(output_dir, filename)
     df.to_csv(output_path, index=False)
     print(f"Data saved to {output_path}")
 
-def main():
-    # Generate sample data
+def main(input_path=os.path.join("stats metrics", "input_data.csv"), target_col='target',
+         pred_prob_col='predicted_probability', threshold=0.5, output_dir="output", plot=False):
+    """Compute the metrics of a scored file and save them; plot the PSI distribution only
+    when plot=True (interactive runs), so batch runs never import matplotlib."""
+    os.makedirs(output_dir, exist_ok=True)  # Create the output directory if it doesn't exist
+
+    # Load the scored data (or generate sample data)
     # df = generate_random_sample_data()
-    df = generate_sample_data()
-    df = pd.read_csv("input_data")
-    
-    # Define target column and predicted probability column
-    target_col = 'target'
-    pred_prob_col = 'predicted_probability'
+    # df = generate_sample_data()
+    df = pd.read_csv(input_path)
     
     # Save the original input data
     # save_dataframe(df, "input_random_data.csv")
-    save_dataframe(df, "input_data.csv")
+    save_dataframe(df, "input_data.csv", output_dir)
     
     # Compute and display the metrics
-    metrics = compute_metrics(df, target_col, pred_prob_col)
+    metrics = compute_metrics(df, target_col, pred_prob_col, threshold)
+    df['prediction'] = np.where(df[pred_prob_col] > threshold, 1, 0)
     
     print("Performance Metrics:")
     for metric, value in metrics.items():
@@ -170,16 +384,20 @@ def main():
     
     # Save the output metrics to a CSV file
     # save_dataframe(metrics_df, "outputrandom_metrics.csv")
-    save_dataframe(metrics_df, "output_metrics.csv")
+    save_dataframe(metrics_df, "output_metrics.csv", output_dir)
     
     # Save the DataFrame with predictions and true labels
     # save_dataframe(df, "output_random_predictions.csv")
-    save_dataframe(df, "output_predictions.csv")
+    save_dataframe(df, "output_predictions.csv", output_dir)
     
-    # Visualize the PSI distribution
-    visualize_psi_distribution(df[pred_prob_col], df[target_col])
+    # Visualize the PSI distribution (interactive runs only)
+    if plot:
+        visualize_psi_distribution(df[pred_prob_col], df[target_col])
 
+    return metrics
+
+# Example usage: python monitor.py metrics --input "stats metrics/input_data.csv" --plot
 if __name__ == "__main__":
-    if not os.path.exists('output'):
-        os.makedirs('output')  # Create the output directory if it doesn't exist
-    main()
+    from monitor import main as monitor_main
+
+    monitor_main(['metrics', '--plot'])
@@ -0,0 +1,312 @@
+import os
+import numpy as np
+import pandas as pd
+from reference_profile import class_values
+from sampling import ReservoirSampler, normalize_sampling, dkw_sample_size, dkw_error_bound
+
+# Streaming ingestion of the current window.
+#
+# The current data is read chunk by chunk and folded into mergeable per-feature
+# state, so peak memory is bounded by the chunk size rather than the window size.
+# Compared with the in-memory path (calculate_statistics / check_for_new_classes):
+#   - histogram counts, PSI and new classes are exact (identical results);
+#   - mean/std/var come from Welford/Chan updates and agree with pandas to a
+#     relative tolerance of STREAMING_RTOL (floating point summation order differs).
+# With sampling, the chunks also feed a ReservoirSampler, which keeps a uniform sample of
+# the window (DKW-sized, as in sampling.py) for the drift reports within the same pass.
+STREAMING_RTOL = 1e-9
+DEFAULT_CHUNKSIZE = 100_000
+PSI_EPSILON = 1e-10
+
+class WelfordMoments:
+    '''Mergeable running count, mean and sum of squared deviations.'''
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, values):
+        '''Fold a batch of values into the running moments (NaNs are ignored like pandas does).'''
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        batch_mean = values.mean()
+        batch = WelfordMoments(len(values), batch_mean, float(np.sum((values - batch_mean) ** 2)))
+        return self.merge(batch)
+
+    def merge(self, other):
+        '''Combine with another partial state (Chan et al. parallel update).'''
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def var(self):
+        # Sample variance (ddof=1) to match pandas
+        return self.m2 / (self.count - 1) if self.count > 1 else float('nan')
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.var))
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["count"], state["mean"], state["m2"])
+
+
+class FixedBinHistogram:
+    '''Mergeable histogram over fixed bin edges (normally the reference edges).'''
+
+    def __init__(self, bin_edges, counts=None):
+        self.bin_edges = np.asarray(bin_edges, dtype=float)
+        n_bins = len(self.bin_edges) - 1
+        self.counts = np.zeros(n_bins, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    def update(self, values):
+        '''Count a batch of values. Values outside the edges go to the first/last bin.'''
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        n_bins = len(self.counts)
+        if len(values) == 0 or n_bins == 0:
+            return self
+        # side='right' with the last bin closed matches np.histogram for in-range values
+        bins = np.clip(np.searchsorted(self.bin_edges, values, side='right') - 1, 0, n_bins - 1)
+        self.counts += np.bincount(bins, minlength=n_bins)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def to_dict(self):
+        return {"bin_edges": self.bin_edges.tolist(), "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["bin_edges"], state["counts"])
+
+
+class CategorySet:
+    '''Mergeable set of the distinct (stripped, string) values of a column.'''
+
+    def __init__(self, values=None):
+        self.values = set(values or ())
+
+    def update(self, series):
+        self.values.update(class_values(pd.Series(series)))
+        return self
+
+    def merge(self, other):
+        self.values |= other.values
+        return self
+
+    def to_dict(self):
+        return {"values": sorted(self.values)}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["values"])
+
+
+# Function to calculate PSI from two aligned histograms
+def psi_from_counts(expected_counts, actual_counts, epsilon=PSI_EPSILON):
+    """PSI between two histograms sharing the same bin edges."""
+    expected_counts = np.asarray(expected_counts, dtype=float)
+    actual_counts = np.asarray(actual_counts, dtype=float)
+    if expected_counts.sum() == 0 or actual_counts.sum() == 0:
+        return float('nan')
+    expected_percents = expected_counts / expected_counts.sum()
+    actual_percents = actual_counts / actual_counts.sum()
+
+    # Add epsilon to prevent log(0) and division by zero
+    expected_percents = np.where(expected_percents == 0, epsilon, expected_percents)
+    actual_percents = np.where(actual_percents == 0, epsilon, actual_percents)
+
+    return float(np.sum((expected_percents - actual_percents) * np.log(expected_percents / actual_percents)))
+
+
+class StreamingWindowState:
+    '''Per-feature mergeable state of a current window, keyed on a reference profile.'''
+
+    def __init__(self, reference_profile):
+        self.reference_profile = reference_profile
+        self.row_count = 0
+        self.moments = {feature: WelfordMoments() for feature in reference_profile["moments"]}
+        self.histograms = {
+            feature: FixedBinHistogram(histogram["bin_edges"])
+            for feature, histogram in reference_profile["histograms"].items()
+            if histogram["bin_edges"]
+        }
+        self.categories = {feature: CategorySet() for feature in reference_profile["class_vocabularies"]}
+
+    def columns(self):
+        '''Columns that must be read from the source.'''
+        return sorted(set(self.moments) | set(self.histograms) | set(self.categories))
+
+    def update(self, chunk):
+        self.row_count += len(chunk)
+        for feature, moments in self.moments.items():
+            moments.update(chunk[feature].to_numpy(dtype=float))
+        for feature, histogram in self.histograms.items():
+            histogram.update(chunk[feature].to_numpy(dtype=float))
+        for feature, categories in self.categories.items():
+            categories.update(chunk[feature])
+        return self
+
+    def merge(self, other):
+        self.row_count += other.row_count
+        for feature in self.moments:
+            self.moments[feature].merge(other.moments[feature])
+        for feature in self.histograms:
+            self.histograms[feature].merge(other.histograms[feature])
+        for feature in self.categories:
+            self.categories[feature].merge(other.categories[feature])
+        return self
+
+    def statistical_summary(self):
+        '''Same shape as calculate_statistics, with the reference side taken from the profile.'''
+        statistics = {}
+        for feature, moments in self.moments.items():
+            reference_moments = self.reference_profile["moments"][feature]
+            statistics[feature] = {
+                'mean_reference': reference_moments['mean'],
+                'std_reference': reference_moments['std'],
+                'var_reference': reference_moments['var'],
+                'mean_current': moments.mean if moments.count else float('nan'),
+                'std_current': moments.std,
+                'var_current': moments.var
+            }
+        return statistics
+
+    def psi(self):
+        return {
+            feature: psi_from_counts(self.reference_profile["histograms"][feature]["counts"], histogram.counts)
+            for feature, histogram in self.histograms.items()
+        }
+
+    def new_classes(self):
+        '''Same (flag, details) pair as check_for_new_classes.'''
+        new_classes_detected = {}
+        for feature, categories in self.categories.items():
+            new_classes = categories.values - set(self.reference_profile["class_vocabularies"][feature])
+            if new_classes:
+                new_classes_detected[feature] = sorted(new_classes)
+
+        if new_classes_detected:
+            return "yes", ", ".join([f"{feature}: {classes}" for feature, classes in new_classes_detected.items()])
+        return "no", "None"
+
+    def results(self):
+        new_class_flag, new_class_details = self.new_classes()
+        return {
+            "record_count_current": self.row_count,
+            "new_class_detected": new_class_flag,
+            "new_class_details": new_class_details,
+            "psi": self.psi(),
+            "statistical_summary": self.statistical_summary(),
+        }
+
+
+# Function to read a CSV or Parquet file in bounded-size chunks
+def iter_chunks(path, columns=None, chunksize=DEFAULT_CHUNKSIZE, rows=None, dtype=None):
+    """Yield DataFrame chunks of at most `chunksize` rows, restricted to `rows` (a slice) if given.
+
+    Pass `dtype` for CSV input so every chunk parses a column the same way; otherwise
+    pandas infers types per chunk and e.g. an int column may read as float in one chunk.
+    """
+    start = 0 if rows is None or rows.start is None else rows.start
+    stop = None if rows is None else rows.stop
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        position = 0
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            batch_start, batch_stop = position, position + batch.num_rows
+            position = batch_stop
+            if batch_stop <= start:
+                continue
+            if stop is not None and batch_start >= stop:
+                break
+            lo = max(start - batch_start, 0)
+            hi = batch.num_rows if stop is None else min(stop - batch_start, batch.num_rows)
+            yield batch.slice(lo, hi - lo).to_pandas()
+    elif extension == '.csv':
+        nrows = None if stop is None else max(stop - start, 0)
+        reader = pd.read_csv(path, usecols=columns, chunksize=chunksize, dtype=dtype,
+                             skiprows=range(1, start + 1) if start else None, nrows=nrows)
+        with reader:
+            for chunk in reader:
+                yield chunk
+    else:
+        raise ValueError(f"Unsupported file type for streaming: '{path}' (expected .csv or .parquet)")
+
+
+# Function to compute current-window metrics in streaming mode
+def monitor_current_stream(path, reference_profile, chunksize=DEFAULT_CHUNKSIZE, rows=None, dtype=None,
+                           sampling=None):
+    """Stream the current window from `path` and return statistics, PSI and new-class results.
+
+    sampling (opt-in, a reservoir spec of sampling.py, e.g. {"error_bound": 0.01}) also keeps
+    a uniform sample of the window, returned as "current_sample" with its "sampling" details.
+    """
+    state = StreamingWindowState(reference_profile)
+    sampler = None
+    if sampling:
+        spec = normalize_sampling(sampling)
+        if spec["method"] != 'reservoir':
+            raise ValueError("Streaming windows support reservoir sampling only")
+        delta = 1 - spec["confidence"]
+        sampler = ReservoirSampler(spec["sample_size"] or dkw_sample_size(spec["error_bound"], delta), spec["seed"])
+    for chunk in iter_chunks(path, state.columns(), chunksize, rows, dtype):
+        state.update(chunk)
+        if sampler:
+            sampler.update(chunk)
+    results = state.results()
+    if sampler:
+        sample = sampler.sample if sampler.sample is not None else pd.DataFrame(columns=state.columns())
+        results["current_sample"] = sample
+        results["sampling"] = {
+            "method": spec["method"], "seed": spec["seed"], "confidence": spec["confidence"],
+            "rows": sampler.rows_seen, "sample_size": len(sample),
+            "ecdf_error_bound": 0.0 if len(sample) == sampler.rows_seen else dkw_error_bound(len(sample), delta),
+        }
+    return results
+
+
+# Example usage
+if __name__ == "__main__":
+    import json
+    from evidently import ColumnMapping
+    from reference_profile import load_or_build_reference_profile, file_fingerprint
+
+    column_mapping = ColumnMapping()
+    column_mapping.target = 'cnt'
+    column_mapping.prediction = 'prediction'
+    column_mapping.numerical_features = ['temp', 'atemp', 'hum', 'windspeed', 'hr', 'weekday']
+    column_mapping.categorical_features = ['season', 'holiday', 'workingday']
+
+    # Build (or load the cached) reference profile
+    reference_rows = slice(0, 12000)
+    reference = pd.read_csv('sample_data.csv', nrows=reference_rows.stop)
+    reference_profile = load_or_build_reference_profile(
+        reference, column_mapping, '1.0.0', fingerprint=file_fingerprint('sample_data.csv', reference_rows))
+
+    results = monitor_current_stream('sample_data.csv', reference_profile, chunksize=1000,
+                                     rows=slice(12000, 17379), dtype=reference.dtypes.to_dict())
+    print(json.dumps(results, indent=4))